@@ -8,7 +8,8 @@ Features Implemented:
 1. Populate Jira with outlook tasks
 2. Check if the task is already present on Kanban board. If not, add.
 3. Transit tasks from NS to DONE if marked completed in outlook.
-4. Archive tasks from DONE to ARCHIVE which are older than a week.
+4. Archive tasks from DONE to ARCHIVE which were resolved more than a week ago.
+5. Mark outlook tasks completed when their issues were completed in Jira.
 
 '''
 
@@ -19,98 +20,726 @@ from jira.exceptions import JIRAError
 import logging
 # In-built Python module for sys.exit()
 import sys
-# Official Python module from windows for accessing certain windows applications
-import win32com.client
+# In-built Python modules for the command line and adapter_config.ini
+import argparse
+import json
+from configparser import ConfigParser
 # In-built Python module for suppressig the insecure request warning.
 import urllib3
 import re
+import threading
+from collections import Counter, deque, OrderedDict
+from datetime import datetime, timedelta, timezone
+# In-built Python module for running independent Jira requests at the same time
+from concurrent.futures import ThreadPoolExecutor
+# In-built Python module for attaching texts without writing them to disk
+import io
+# In-built Python modules for spooling outlook attachments to disk and hashing them
+import hashlib
+import os
+import shutil
+import tempfile
+# Local sync state kept between runs
+from syncstate import SyncState, content_hash, field_hashes, text_hash
+# Retry policy shared by all the Jira calls
+from retrypolicy import RetryPolicy, RetryingJira
+# Read-only snapshots of the outlook tasks
+from tasksource import OutlookTaskSource, SnapshotTaskSource, find_folder
+# Jira metadata cached between runs, to create and move issues by ID
+from jirameta import MetadataCache
+# Local mirror of the board's issues kept between runs
+from issuemirror import IssueMirror, mirror_scope
+# Issue cache kept fresh by Jira webhooks
+from webhooks import IssueCache, WebhookReceiver, parse_jira_time, WEBHOOK_HOST, WEBHOOK_PORT
+# Board profiles for syncing several boards from one process
+from boards import BoardProfile, DEFAULT_LABEL, DEFAULT_PROFILE, read_profiles, route_tasks
+# Local matching of task subjects against issue summaries
+from subjectmatch import SubjectMatcher, normalize_subject, MATCH_THRESHOLD
+# Timing and request metrics of each sync cycle
+from metrics import SyncMetrics, METRICS_FILE, PROMETHEUS_FILE
+# The change plan of a sync cycle
+from syncplan import SyncPlan, PlannedCreate, PlannedRecord, PlannedUpdate, PlannedMove, PlannedCompletion
+# Issue descriptions made from task bodies
+from description import DEFAULT_FORMAT, FULL_BODY_FILENAME, render_description, read_description_format
+# Queued, rotating logging of the adapter
+from adapterlog import setup_logging, LOGFILE, LOG_MAX_BYTES, LOG_BACKUP_COUNT
 
-# This function is the main function running other functions
-def syncTasksToJira(jiraID, jiraUsername, jiraPassword, boardName, boardID, jiraLink):
-	# Configuration Start xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx
-	LOGFORMAT= '[%(asctime)s - %(levelname)s: %(funcName)20s()] %(message)s'
-	logging.basicConfig(filename="jira-adapter.log",level = logging.INFO, format = LOGFORMAT)
-	logger = logging.getLogger('JiraOutAdapter')
-	urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+# Fields fetched when indexing existing issues. Only what the sync needs.
+INDEX_FIELDS = 'summary,status,resolutiondate,updated'
+# Fields fetched for the issues changed in Jira since the last cycle
+CHANGED_FIELDS = 'status,updated'
+# Page size used when walking search results
+SEARCH_PAGE_SIZE = 100
+# Number of issues sent per bulk create request
+CREATE_CHUNK_SIZE = 50
+# Bytes of outlook attachments uploaded per cycle
+ATTACHMENT_BUDGET = 20 * 1024 * 1024
+# Number of Jira requests run at the same time
+MAX_WORKERS = 8
+
+# Default Kanban workflow. Maps each status to the transitions leaving it and the status each one leads to.
+DEFAULT_WORKFLOW = {
+	'NS': {'Move From NS to WIP': 'WIP'},
+	'Deferred': {'Deferred to WIP': 'WIP'},
+	'WIP': {'WIP to Ready': 'Ready'},
+	'Ready': {'Ready to Done': 'Done'},
+	'Done': {'Done to Archive': 'Archive'},
+}
+DONE_STATUS = 'Done'
+ARCHIVE_STATUS = 'Archive'
+# Number of issues archived per batch
+ARCHIVE_BATCH_SIZE = 50
+# Done issues are archived once resolved this long ago
+ARCHIVE_AGE = timedelta(weeks=1)
+
+# Date format understood by Outlook's Items.Restrict
+OUTLOOK_DATE_FORMAT = '%m/%d/%Y %I:%M %p'
+# Restrict only compares to the minute, so the watermark is moved back a little to not miss edits
+WATERMARK_OVERLAP = timedelta(minutes=5)
+# Date format of absolute times in JQL, which Jira reads in the user's time zone
+JQL_DATE_FORMAT = '%Y/%m/%d %H:%M'
+# All tasks are read again after this long, in case a change was missed by the delta filter
+FULL_SWEEP_INTERVAL = timedelta(hours=24)
 
+# Outlook's default To-Do folder
+OL_FOLDER_TODO = 28
+# Configuration file written by the UI
+CONFIG_FILE = 'adapter_config.ini'
+
+# This function logs in to Jira. Retries are left to the adapter's own policy.
+def jira_login(jiraLink, jiraUsername, jiraPassword):
 	options = {
 		'server' : jiraLink,
 		'verify' : False,
 	}
-	
-	# Establishing the connecetio to JIRA
-	try:
-		jira = JIRA(options=options, basic_auth=(jiraUsername, jiraPassword))
-	except JIRAError as jex:
-		errorText = jex.text.split(';')
-		logger.exception('\t\t[JIRA EXCEPTION] - Connection Failure {0} - {1}\n'.format(jex.status_code, errorText[0]))
-		print('\t\t[JIRA EXCEPTION] - Connection Failure {0} - {1}\n'.format(jex.status_code, jex.text))
-		sys.exit(-1)
-	except Exception as ex:
-		logger.exception('\t\t[EXCEPTION] - Connection Failure - {0}'.format(ex))
-		sys.exit(-1)
-	# Initialising Board
-	BOARD = {}
-	BOARD['ID'] = boardID 
-	BOARD['Name'] = boardName
-	# Fetching the outlook tasks
-	olFolderTodo = 28
-	outlook = win32com.client.Dispatch("Outlook.Application")
-	ns = outlook.GetNamespace("MAPI")
-	todo_folder = ns.GetDefaultFolder(olFolderTodo)
-	todo_items = todo_folder.Items
-	tasks = todo_items.Restrict("[Complete] = FALSE")
-	
-	logger.info('Found {0} tasks for {1} board.'.format(len(todo_items), "BOARD"))
-	# Initialising config values
-	defaulttaskvalues = {}
-	defaulttaskvalues['assigneeID'] = jiraID
-	defaulttaskvalues['labels'] = ['OutlookTasks']
-
-	for taskSN, task in enumerate(tasks):
-		task.Subject = cleanse(task.Subject)
-		print(u'\tToDo Task {0}: {1} '.format(taskSN, task.Subject))
-		logger.info(u'ToDo Task {0}: {1} '.format(taskSN, task.Subject))
-		existingIssue = get_existing_workitem(jira, BOARD['ID'], task, defaulttaskvalues, customJQL=None)
-		if not existingIssue:
-			# This creates a new Incident work item on the board
-			newIssue = create_workitem_tasks(jira, BOARD['ID'], task, defaulttaskvalues)
-			#task.Subject = u'{1} -{0} '.format(newIssue, task.Subject)
-			#task.Save()
-	
-	archive_tasks_from_done_stage(jira, BOARD['ID'], defaulttaskvalues)
-	transit_tasks_to_done_stage(jira, BOARD['ID'], defaulttaskvalues, todo_items)
-	print('Synced')
-	logger.info('Synced')	
-	# We are done. kthnxbye
+	return JiraClient(options=options, basic_auth=(jiraUsername, jiraPassword), max_retries=0)
 
+# Jira client of the adapter, with the calls the jira module lacks
+class JiraClient(JIRA):
+	# Updates an issue by key in one request. Issue.update needs the issue fetched before and fetches it again after.
+	# update holds operations like {'comment': [{'add': {'body': text}}]}.
+	def update_issue_fields(self, key, fields=None, update=None):
+		data = {'fields': fields or {}, 'update': update or {}}
+		self._session.put(self._get_url('issue/{0}'.format(key)), data=json.dumps(data))
 
-# This function archives DONE tasks older than a week
-def archive_tasks_from_done_stage(jira, project, defaulttaskvalues):
-	logger = logging.getLogger('JiraOutAdapter')
-	print("\nArchiving Tasks")
-	# Custom JQL to get all the issues in Done stage older than a week
-	customJQL = "project={0} and assignee={1} and labels={2} and status in (Done) and createdDate <= -1w".format( str(project), defaulttaskvalues['assigneeID'], "".join(defaulttaskvalues['labels']))
-	try:
-		issues = jira.search_issues(customJQL, startAt=0, maxResults=1000)
-		if not issues:
-			logger.info('\TFound {0} existing issues. Checking again...'.format(len(issues)))
-			issues = jira.search_issues(customJQL, startAt=0, maxResults=1000)
+# This function creates the engine for the settings, one syncing several boards when board profiles are given.
+# settings are the arguments of SyncEngine, a dict of its keyword options like the description format, and the board profiles.
+def create_engine(settings):
+	engineSettings, options, profiles = settings[:-2], settings[-2], settings[-1]
+	if profiles:
+		return MultiBoardEngine(*engineSettings, profiles=profiles, **options)
+	return SyncEngine(*engineSettings, **options)
+
+# This class owns everything that lives longer than one sync cycle: the authenticated Jira session,
+# the outlook namespace, the sync state and the transition ID cache.
+class SyncEngine(object):
+	def __init__(self, jiraID, jiraUsername, jiraPassword, boardName, boardID, jiraLink, workflow=None, maxWorkers=MAX_WORKERS, matchThreshold=MATCH_THRESHOLD, source=None,
+					jira=None, retryPolicy=None, state=None, label=DEFAULT_LABEL, metaSuffix='', descriptionFormat=DEFAULT_FORMAT,
+					attachmentBudget=ATTACHMENT_BUDGET):
+		self.settings = (jiraID, jiraUsername, jiraPassword, boardName, boardID, jiraLink, workflow, maxWorkers, matchThreshold)
+		self.matchThreshold = matchThreshold
+		# How issue descriptions are made from task bodies
+		self.descriptionFormat = descriptionFormat
+		# Bytes of outlook attachments uploaded per cycle, 0 to not upload attachments
+		self.attachmentBudget = attachmentBudget
+		self.jiraUsername = jiraUsername
+		self.jiraPassword = jiraPassword
+		self.jiraLink = jiraLink
+		self.maxWorkers = maxWorkers
+		self.workflow = workflow
+		# Initialising Board
+		self.board = {'ID': boardID, 'Name': boardName}
+		# Initialising config values
+		self.defaulttaskvalues = {}
+		self.defaulttaskvalues['assigneeID'] = jiraID
+		self.defaulttaskvalues['labels'] = [label]
+		# The Jira session, retry policy and sync state can be shared with the engines of other boards
+		self.retryPolicy = retryPolicy or RetryPolicy()
+		self.jira = jira
+		self.planner = None
+		# Issue types, priorities, components and transitions of the board's project, by ID
+		self.metadata = None
+		# Outlook tasks are read through the source. Another source, like a fake one, can be passed in.
+		self.source = source
+		self.state = state
+		self.ownsState = state is None
+		# Appended to the names of the run values in the sync state, so that boards sharing it keep their own
+		self.metaSuffix = metaSuffix
+		# Open issues of the board, mirrored in the sync state between runs
+		self.mirror = None
+		# (since, issues) of the last search of the issues changed since a time, or None after a full search
+		self.changedIssues = None
+		# Time outlook was read at for the next cycle, when the tasks were read before it by the caller
+		self.readStarted = None
+		# Open issues of the board, kept by the webhook receiver when it is enabled
+		self.issueCache = None
+		self.receiver = None
+		# Set from another thread to stop the running cycle at the next task or phase
+		self.cancelEvent = threading.Event()
+		# Metrics of the running cycle, written to these files after every cycle
+		self.metrics = None
+		self.metricsFile = METRICS_FILE
+		self.prometheusFile = PROMETHEUS_FILE
+		self.logger = setup_logging()
+		urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+	# This method logs in to Jira. Used on the first cycle and again when the session has expired.
+	def login(self):
+		client = jira_login(self.jiraLink, self.jiraUsername, self.jiraPassword)
+		# Every response is counted in the metrics of the running cycle
+		client._session.hooks['response'].append(self.record_response)
+		return client
+
+	def record_response(self, response, *args, **kwargs):
+		if self.metrics is not None:
+			self.metrics.record_response(response)
+
+	# This method sets up the Jira session and outlook handles, unless they are already set up
+	def connect(self):
+		if self.jira is None:
+			# Establishing the connecetio to JIRA
+			try:
+				self.jira = RetryingJira(self.login(), self.retryPolicy, reconnect=self.login)
+			except JIRAError as jex:
+				errorText = jex.text.split(';')
+				self.logger.exception('\t\t[JIRA EXCEPTION] - Connection Failure %s - %s', jex.status_code, errorText[0])
+				raise
+			except Exception as ex:
+				self.logger.exception('\t\t[EXCEPTION] - Connection Failure - %s', ex)
+				raise
+		if self.source is None:
+			# Official Python module from windows for accessing certain windows applications.
+			# Imported here so that the engine also runs on a fake task source without outlook.
+			import win32com.client
+			# Fetching the outlook tasks
+			outlook = win32com.client.Dispatch("Outlook.Application")
+			ns = outlook.GetNamespace("MAPI")
+			todo_folder = ns.GetDefaultFolder(OL_FOLDER_TODO)
+			self.source = OutlookTaskSource(todo_folder, ns)
+		if self.state is None:
+			self.state = SyncState()
+		if self.metadata is None:
+			self.metadata = MetadataCache(self.jira, self.state, self.board['ID'])
+		if self.planner is None:
+			self.planner = TransitionPlanner(self.jira, self.workflow, metadata=self.metadata)
+		if self.mirror is None:
+			self.mirror = IssueMirror(self.state, mirror_scope(self.board['ID'], self.defaulttaskvalues['assigneeID'], self.defaulttaskvalues['labels'][0]))
+
+	def cancel(self):
+		self.cancelEvent.set()
+
+	def close(self):
+		if self.issueCache is not None:
+			self.receiver.unregister(self.issueCache)
+			self.issueCache = None
+		self.mirror = None
+		# Both keep their metadata in the sync state
+		self.metadata = None
+		self.planner = None
+		if self.state is not None and self.ownsState:
+			self.state.close()
+			self.state = None
+
+	# This method gives the start of the cycle and the time from which tasks are read, None for a full sweep.
+	# Only tasks modified since the last run are read, with a periodic full sweep as a safety net.
+	def cycle_window(self):
+		runStarted = self.readStarted or datetime.now()
+		watermark = self.state.get_time('watermark' + self.metaSuffix)
+		lastFullSweep = self.state.get_time('last_full_sweep' + self.metaSuffix)
+		if watermark is None or lastFullSweep is None or runStarted - lastFullSweep >= FULL_SWEEP_INTERVAL:
+			return runStarted, None
+		return runStarted, watermark - WATERMARK_OVERLAP
+
+	# This method runs one sync cycle. Returns False when the cycle was stopped early.
+	# progress is called with a short text at every phase.
+	def sync(self, progress=None):
+		if progress is None:
+			progress = lambda text: None
+		self.metrics = metrics = SyncMetrics()
+		retriesBefore = self.retryPolicy.retries
+		success = False
+		try:
+			success = self.run_cycle(progress)
+			return success
+		finally:
+			self.write_metrics(metrics, success, retriesBefore)
+
+	def write_metrics(self, metrics, success, retriesBefore):
+		metrics.finish(success)
+		metrics.retries = self.retryPolicy.retries - retriesBefore
+		self.logger.info('Cycle metrics: %s', metrics.to_json())
+		try:
+			metrics.write(self.metricsFile, self.prometheusFile)
+		except (IOError, OSError) as ex:
+			self.logger.error('Could not write the cycle metrics - %s', ex)
+
+	# Attachments are uploaded from the outlook source, so board engines running on other threads leave them to the caller
+	def run_cycle(self, progress, uploads=True):
+		self.cancelEvent.clear()
+		progress('Connecting')
+		with self.metrics.phase('connect'):
+			self.connect()
+		plan = self.plan_cycle(progress)
+		if plan is None:
+			return self.stop_cycle('Sync cancelled.' if self.cancelEvent.is_set() else 'Jira is unavailable.')
+		if not self.apply_plan(plan, progress):
+			return False
+		if uploads:
+			return self.upload_attachments(self.source, self.metrics, progress)
+		return True
+
+	# This method uploads the queued attachments within the budget of the cycle, of the boards of scopes and with maxWorkers if given.
+	# Returns False when the cycle was stopped early.
+	def upload_attachments(self, source, metrics, progress, scopes=None, maxWorkers=None):
+		if not self.attachmentBudget:
+			return True
+		progress('Uploading attachments')
+		with metrics.phase('attachments'):
+			upload_attachments(self.jira, self.state, source, self.attachmentBudget, maxWorkers or self.maxWorkers, metrics, stop=self.should_stop,
+								scopes=scopes or (self.metaSuffix,))
+		if self.retryPolicy.open:
+			return self.stop_cycle()
+		if self.cancelEvent.is_set():
+			return self.stop_cycle('Sync cancelled.')
+		return True
+
+	# This method plans the cycle and returns the plan, without changing anything in Jira or the sync state
+	def dry_run(self, progress=None):
+		if progress is None:
+			progress = lambda text: None
+		self.metrics = SyncMetrics()
+		self.cancelEvent.clear()
+		progress('Connecting')
+		self.connect()
+		try:
+			return self.plan_cycle(progress)
+		finally:
+			self.rollback()
+
+	# This method drops what planning wrote to the sync state, like the refreshed mirror of the board's issues and the fetched metadata
+	def rollback(self):
+		self.state.rollback()
+		if self.mirror is not None:
+			self.mirror.unload()
+
+	# This method diffs the outlook tasks against the sync state and Jira into the plan of the cycle.
+	# Only reads are made. Returns None when the planning was cancelled or Jira is unavailable.
+	def plan_cycle(self, progress):
+		metrics = self.metrics
+		jira = self.jira
+		logger = self.logger
+		state = self.state
+		source = self.source
+		BOARD = self.board
+		defaulttaskvalues = self.defaulttaskvalues
+		maxWorkers = self.maxWorkers
+		self.retryPolicy.reset()
+		runStarted, since = self.cycle_window()
+		if since is None:
+			logger.info('Running a full sweep of the outlook tasks.')
+		else:
+			logger.info('Reading outlook tasks modified since %s.', since)
+		plan = SyncPlan(BOARD['ID'], runStarted, since)
+		plan.retries = state.queued_retries(self.metaSuffix)
+		with metrics.phase('outlook'):
+			tasks = source.snapshot(outlook_filter("[Complete] = FALSE", since))
+			completedTasks = source.snapshot(outlook_filter("[Complete] = TRUE", since))
+			# Tasks that failed to sync are planned again, even when they were not modified since
+			missing = set(plan.retries) - set(task.entryID for task in tasks)
+			if missing and since is not None:
+				tasks += [task for task in source.snapshot("[Complete] = FALSE") if task.entryID in missing]
+		if plan.retries:
+			logger.info('Retrying %s tasks that failed to sync.', len(plan.retries))
 		
-		if issues:
-			logger.info('\tFound {0} issues in Done stage. Checking for archive transition.'.format(len(issues)))
-			for i, issue in enumerate(issues):
-				print('\tArchiving [{0}] {1}'.format(i, issue))
-				jira.transition_issue(issue, 'Done to Archive')
-				logger.info('Issue {0} has been archived '
-								'in Kanban board.'.format(issue))
-	except JIRAError as jex:
-		logger.exception('\t\t[JIRA EXCEPTION] - Archive Issues {0} - {1}\n'.format(jex.status_code, jex.text))
-		print('\t\t[JIRA EXCEPTION] - Archive Issues {0} - {1}\n'.format(jex.status_code, jex.text))
-	except Exception as ex:
-		logger.exception('\t\t[EXCEPTION] - Archive Search Issue {0}'.format(ex))
-		print(ex)
-	# Done
+		logger.info('Found %s tasks for %s board.', source.count(), BOARD['Name'])
+
+		progress('Checking tasks')
+		# One paginated search replaces the per-task summary searches
+		with metrics.phase('index'):
+			issues = self.board_issues(runStarted)
+			issueIndex = index_issues(issues, self.matchThreshold) if issues is not None else None
+		pendingSubjects = set()
+
+		with metrics.phase('check'):
+			for taskSN, task in enumerate(tasks):
+				if self.cancelEvent.is_set():
+					return None
+				task = task._replace(subject=cleanse(task.subject))
+				logger.info(u'\tToDo Task %s: %s ', taskSN, task.subject)
+				metrics.count('processed')
+				record = state.get(task.entryID, self.metaSuffix)
+				if record and state.is_unchanged(task.entryID, task.lastModified, self.metaSuffix):
+					# Not modified since it was synced, the body doesn't need to be read
+					metrics.count('skipped')
+					continue
+				task = source.with_body(task)
+				taskHash = content_hash(task.subject, task.body)
+				description = render_description(task.body, self.descriptionFormat)
+				fields = field_hashes(issue_summary(task.subject), description.text)
+				if record:
+					# Task was synced before, its issue is known by key. Only the fields that changed are sent.
+					if record['content_hash'] != taskHash:
+						issueFields, comment = plan_issue_update(record.get('fields'), issue_summary(task.subject), description.text)
+						original = description.original if 'description' in issueFields else None
+						plan.updates.append(PlannedUpdate(task.entryID, record['jira_key'], taskHash, fields, issueFields, comment, original))
+					else:
+						# Recorded again, so its body isn't read on the next cycle and its attachments are checked
+						plan.refreshes.append(PlannedRecord(task.entryID, record['jira_key'], taskHash, record.get('fields') or fields))
+					metrics.count('known')
+					continue
+				existingIssue = get_existing_workitem(jira, BOARD['ID'], task, defaulttaskvalues, customJQL=None, issueIndex=issueIndex)
+				if existingIssue == 'None':
+					# The search failed, the task may have an issue already. It is looked up again on the next cycle.
+					plan.failed.append(task.entryID)
+					metrics.count('lookup_failed')
+				elif hasattr(existingIssue, 'key'):
+					plan.links.append(PlannedRecord(task.entryID, existingIssue.key, taskHash, fields))
+					metrics.count('existing')
+				elif not existingIssue and normalize_subject(task.subject) not in pendingSubjects:
+					# New tasks are collected and created in bulk once all tasks are checked
+					pendingSubjects.add(normalize_subject(task.subject))
+					plan.creates.append(PlannedCreate(task.entryID, task.subject, description.text, taskHash, description.original))
+
+			if self.retryPolicy.open or self.cancelEvent.is_set():
+				return None
+			# Issues of completed tasks go to Done, Done issues resolved more than a week ago to Archive
+			for issue in find_completed_issues(jira, BOARD['ID'], defaulttaskvalues, completedTasks, issueIndex=issueIndex, state=state,
+												scope=self.metaSuffix):
+				move = planned_move(self.planner, issue, self.planner.doneStatus)
+				if move:
+					plan.transitions.append(move)
+			# The board's issues include the Done ones, so no search is needed for them
+			if issues is not None:
+				doneIssues = resolved_before(issues)
+			else:
+				doneIssues = find_done_issues(jira, BOARD['ID'], defaulttaskvalues, maxWorkers)
+			for issue in doneIssues:
+				move = planned_move(self.planner, issue, ARCHIVE_STATUS)
+				if move:
+					plan.archives.append(move)
+
+		if self.retryPolicy.open or self.cancelEvent.is_set():
+			return None
+		progress('Reading Jira changes')
+		# Only the issues completed since the last cycle are searched, so the cost follows the activity in Jira
+		with metrics.phase('reverse'):
+			jiraSince = state.get_time('jira_watermark' + self.metaSuffix)
+			# The first cycle looks back as far as Done issues stay on the board
+			jiraSince = jiraSince - WATERMARK_OVERLAP if jiraSince else runStarted - ARCHIVE_AGE
+			statuses = (self.planner.doneStatus, 'Closed', ARCHIVE_STATUS)
+			if self.changedIssues is not None and self.changedIssues[0] <= jiraSince:
+				# The mirror was refreshed with the issues changed since then, no search is needed
+				changedIssues = [issue for issue in self.changedIssues[1] if issue.fields.status.name in statuses]
+			else:
+				changedIssues = find_completed_in_jira(jira, BOARD['ID'], defaulttaskvalues, statuses, jiraSince, maxWorkers)
+			if changedIssues is None:
+				return None
+			plan.completions = plan_completions(state, changedIssues, tasks, completedTasks, self.metaSuffix)
+
+		if self.retryPolicy.open or self.cancelEvent.is_set():
+			return None
+		logger.info('Planned %s', ', '.join('{0} {1}'.format(count, name) for name, count in plan.summary().items()))
+		return plan
+
+	# This method applies a plan: records known issues, creates the new ones in bulk, updates the changed ones and runs the moves in batches.
+	# Returns False when the cycle was stopped early.
+	def apply_plan(self, plan, progress=None):
+		if progress is None:
+			progress = lambda text: None
+		metrics = self.metrics
+		jira = self.jira
+		logger = self.logger
+		state = self.state
+		maxWorkers = self.maxWorkers
+		# Tasks of the retry queue are queued again below if they fail again
+		state.unqueue_retries(self.metaSuffix, plan.retries)
+		state.queue_retries(self.metaSuffix, plan.failed)
+		# The attachments of every task synced in this cycle are checked once its issue is known
+		if self.attachmentBudget:
+			state.queue_attachments([entry.entryID for entry in plan.creates + plan.links + plan.updates + plan.refreshes], self.metaSuffix)
+		# Tasks matched to an existing issue, touched tasks, and changed tasks whose issue shows nothing that changed
+		for record in plan.links + plan.refreshes + [update for update in plan.updates if not (update.issueFields or update.comment)]:
+			state.record(record.entryID, record.key, record.hash, record.fields, plan.started, self.metaSuffix)
+
+		progress('Creating {0} issues'.format(len(plan.creates)))
+		# This creates the new work items on the board
+		with metrics.phase('create'):
+			spilled = []
+			for task, newIssue in create_workitem_tasks_bulk(jira, plan.board, plan.creates, self.defaulttaskvalues, maxWorkers=maxWorkers, metadata=self.metadata):
+				if newIssue:
+					state.record(task.entryID, newIssue.key, task.hash, field_hashes(issue_summary(task.subject), task.body), plan.started, self.metaSuffix)
+					metrics.count('created')
+					if task.original:
+						spilled.append((newIssue.key, task.original))
+				else:
+					metrics.count('create_failed')
+					state.queue_retries(self.metaSuffix, [task.entryID])
+			state.commit()
+			self.attach_full_bodies(spilled)
+		
+		if self.cancelEvent.is_set():
+			return self.stop_cycle('Sync cancelled.')
+		updates = [update for update in plan.updates if update.issueFields or update.comment]
+		progress('Updating {0} issues'.format(len(updates)))
+		with metrics.phase('update'):
+			spilled = []
+			for update, updated in update_issues(jira, updates, maxWorkers):
+				if updated:
+					state.record(update.entryID, update.key, update.hash, update.fields, plan.started, self.metaSuffix)
+					metrics.count('updated')
+					if update.original:
+						spilled.append((update.key, update.original))
+				else:
+					# Queued, so the task is compared again on the next cycle even if the watermark passed it
+					metrics.count('update_failed')
+					state.queue_retries(self.metaSuffix, [update.entryID])
+			state.commit()
+			self.attach_full_bodies(spilled)
+		if self.retryPolicy.open:
+			return self.stop_cycle()
+		if self.cancelEvent.is_set():
+			return self.stop_cycle('Sync cancelled.')
+		progress('Archiving {0} done issues'.format(len(plan.archives)))
+		with metrics.phase('archive'):
+			archived = move_issues(self.planner, plan.archives, ARCHIVE_STATUS, maxWorkers, stop=self.should_stop, onMoved=self.issue_moved)
+		metrics.count('archived', archived['done'])
+		metrics.count('archive_failed', archived['failed'])
+		if self.retryPolicy.open:
+			return self.stop_cycle()
+		if self.cancelEvent.is_set():
+			return self.stop_cycle('Sync cancelled.')
+		progress('Moving {0} completed tasks'.format(len(plan.transitions)))
+		with metrics.phase('transition'):
+			moved = move_issues(self.planner, plan.transitions, self.planner.doneStatus, maxWorkers, stop=self.should_stop, onMoved=self.issue_moved)
+		metrics.count('moved', moved['done'])
+		metrics.count('move_failed', moved['failed'])
+		if self.retryPolicy.open:
+			return self.stop_cycle()
+		progress('Completing {0} outlook tasks'.format(len(plan.completions)))
+		with metrics.phase('complete'):
+			completed = complete_tasks(self.source, [completion.entryID for completion in plan.completions])
+		metrics.count('completed_in_outlook', completed['done'])
+		metrics.count('complete_failed', completed['failed'])
+		state.set_time('watermark' + self.metaSuffix, plan.started)
+		state.set_time('jira_watermark' + self.metaSuffix, plan.started)
+		if plan.since is None:
+			state.set_time('last_full_sweep' + self.metaSuffix, plan.started)
+		state.commit()
+		logger.info('Synced')
+		progress('Synced')
+		# We are done. kthnxbye
+		return True
+
+	# Shortened descriptions get the full task body as an attachment. A failed attachment is not retried, the description says where the rest is.
+	def attach_full_bodies(self, spilled):
+		for (key, original), result, error in run_concurrently(lambda item: attach_text(self.jira, item[0], item[1], FULL_BODY_FILENAME), spilled, self.maxWorkers):
+			if error:
+				self.logger.error('\t\t[EXCEPTION] Attach full body to %s - %s', key, error)
+				self.metrics.count('attach_failed')
+			else:
+				self.metrics.count('attached')
+
+	def should_stop(self):
+		return self.retryPolicy.open or self.cancelEvent.is_set()
+
+	# This method gives the open issues of the board, from the webhook cache while it is fresh.
+	# Otherwise they are taken from the mirror refreshed at started, and the cache is primed with them. Returns None on failure.
+	def board_issues(self, started=None):
+		cache = self.issueCache
+		self.changedIssues = None
+		if cache is not None and cache.fresh():
+			self.logger.info('Taking %s issues from the webhook cache.', len(cache))
+			return cache.all_issues()
+		if cache is not None:
+			cache.start_priming()
+		issues = self.refresh_mirror(started or datetime.now())
+		if cache is not None:
+			if issues is None:
+				cache.invalidate()
+			else:
+				cache.prime(issues)
+		return issues
+
+	# This method brings the mirror of the board's issues up to date. Only the issues changed since the last search are searched,
+	# the whole board once the mirror is due for a reconciliation. Returns the board's issues, or None on failure.
+	def refresh_mirror(self, started):
+		mirror = self.mirror
+		since = mirror.since(started)
+		if since is None:
+			issues = fetch_board_issues(self.jira, self.board['ID'], self.defaulttaskvalues, self.maxWorkers)
+			if issues is not None:
+				mirror.replace(issues, started)
+			return issues
+		since -= WATERMARK_OVERLAP
+		changed = fetch_changed_issues(self.jira, self.board['ID'], self.defaulttaskvalues, since, self.maxWorkers)
+		if changed is None:
+			return None
+		count = mirror.update(changed, started)
+		self.logger.info('Refreshed the mirror of %s issues with %s issues changed since %s.', len(mirror), count, since)
+		self.changedIssues = (since, changed)
+		return mirror.all_issues()
+
+	# The adapter's own moves are put in the cache ahead of their webhook events
+	def issue_moved(self, key, status):
+		if self.issueCache is not None:
+			self.issueCache.set_status(key, status)
+
+	# This method keeps the board's issues in a cache fed by the webhook receiver, instead of searching them every cycle
+	def enable_webhooks(self, receiver):
+		if self.issueCache is None:
+			self.issueCache = IssueCache(self.board['ID'], self.defaulttaskvalues['assigneeID'], self.defaulttaskvalues['labels'][0])
+			self.receiver = receiver
+			receiver.register(self.issueCache)
+
+	# This method ends a cycle early, when Jira is down or the cycle was cancelled.
+	# The watermark is not moved, so the next cycle reads the same tasks again.
+	def stop_cycle(self, reason='Jira is unavailable.'):
+		self.state.commit()
+		self.logger.error('%s Stopping this cycle.', reason)
+		return False
+
+# This class syncs several boards in one cycle. Outlook is read once per folder on the calling thread,
+# the tasks are routed to the boards by category or folder and the boards are then synced in parallel.
+# The engines of the boards share the Jira session, the retry policy and the sync state, and split maxWorkers between them.
+class MultiBoardEngine(object):
+	def __init__(self, jiraID, jiraUsername, jiraPassword, boardName, boardID, jiraLink, workflow=None, maxWorkers=MAX_WORKERS, matchThreshold=MATCH_THRESHOLD, profiles=(), sources=None, descriptionFormat=DEFAULT_FORMAT,
+					attachmentBudget=ATTACHMENT_BUDGET):
+		self.settings = (jiraID, jiraUsername, jiraPassword, boardName, boardID, jiraLink, workflow, maxWorkers, matchThreshold, profiles)
+		# The board of the [jiraout] section comes first and takes the tasks routed nowhere else
+		self.profiles = (BoardProfile(DEFAULT_PROFILE, boardName, boardID, jiraID, DEFAULT_LABEL, (), None),) + tuple(profiles)
+		# The boards run at the same time, so each gets its share of the Jira requests in flight
+		self.maxWorkers = maxWorkers
+		boardWorkers = max(1, maxWorkers // len(self.profiles))
+		# Its engine logs in and opens the sync state, and keeps the run values of the single board setup
+		self.primary = SyncEngine(jiraID, jiraUsername, jiraPassword, boardName, boardID, jiraLink, workflow, boardWorkers, matchThreshold, source=SnapshotTaskSource(),
+									descriptionFormat=descriptionFormat, attachmentBudget=attachmentBudget)
+		self.engines = None
+		# Outlook task sources by folder path, None being the To-Do list
+		self.sources = sources
+		self.metrics = None
+		self.receiver = None
+		self.logger = self.primary.logger
+
+	def connect(self):
+		primary = self.primary
+		primary.connect()
+		if self.engines is None:
+			self.engines = [primary] + [SyncEngine(profile.assignee, primary.jiraUsername, primary.jiraPassword, profile.boardName, profile.boardID, primary.jiraLink,
+										primary.workflow, primary.maxWorkers, primary.matchThreshold, source=SnapshotTaskSource(), jira=primary.jira,
+										retryPolicy=primary.retryPolicy, state=primary.state, label=profile.label, metaSuffix=':' + profile.name,
+										descriptionFormat=primary.descriptionFormat, attachmentBudget=primary.attachmentBudget)
+										for profile in self.profiles[1:]]
+			for engine in self.engines:
+				engine.connect()
+				if self.receiver is not None:
+					engine.enable_webhooks(self.receiver)
+		if self.sources is None:
+			import win32com.client
+			outlook = win32com.client.Dispatch("Outlook.Application")
+			ns = outlook.GetNamespace("MAPI")
+			self.sources = {None: OutlookTaskSource(ns.GetDefaultFolder(OL_FOLDER_TODO), ns)}
+			for folder in set(profile.folder for profile in self.profiles if profile.folder):
+				self.sources[folder] = OutlookTaskSource(find_folder(ns, folder), ns)
+
+	def cancel(self):
+		for engine in self.engines or [self.primary]:
+			engine.cancel()
+
+	def enable_webhooks(self, receiver):
+		self.receiver = receiver
+		for engine in self.engines or [self.primary]:
+			engine.enable_webhooks(receiver)
+
+	def close(self):
+		for engine in self.engines or [self.primary]:
+			engine.close()
+
+	# This method reads outlook once and hands every board the tasks routed to it. The To-Do list also shows the tasks
+	# of the folders, those are read from their folders only so that a task goes to one board.
+	def route_tasks(self):
+		state = self.primary.state
+		# The cycles of the boards start when outlook is read, so edits made after it are synced on the next cycle
+		started = datetime.now()
+		for engine in self.engines:
+			engine.readStarted = started
+		# One read covers all the boards, from the earliest time any of them needs
+		windows = [engine.cycle_window()[1] for engine in self.engines]
+		since = None if None in windows else min(windows)
+		# Tasks left to retry may not have been modified since, they are found in a full read
+		if any(state.queued_retries(engine.metaSuffix) for engine in self.engines):
+			since = None
+		scopes = dict((profile.name, engine.metaSuffix) for engine, profile in zip(self.engines, self.profiles))
+		routed = dict((profile.name, []) for profile in self.profiles)
+		seen = set()
+		for folder in sorted(self.sources, key=lambda folder: folder is None):
+			source = self.sources[folder]
+			tasks = source.snapshot(outlook_filter("[Complete] = FALSE", since)) + source.snapshot(outlook_filter("[Complete] = TRUE", since))
+			tasks = [task for task in tasks if task.entryID not in seen]
+			seen.update(task.entryID for task in tasks)
+			for name, boardTasks in route_tasks(self.profiles, tasks, folder).items():
+				# Bodies that will be needed are read now, outlook can't be used from the board threads
+				routed[name].extend(task if task.complete or state.is_unchanged(task.entryID, task.lastModified, scopes[name]) else source.with_body(task)
+									for task in boardTasks)
+		for engine, profile in zip(self.engines, self.profiles):
+			engine.source = SnapshotTaskSource(routed[profile.name])
+			self.logger.info('Routed %s tasks to board %s.', len(routed[profile.name]), profile.boardName)
+
+	# This method runs func(engine, progress) for every board in parallel.
+	# Returns a list of (profile, result, error) triples.
+	def run_boards(self, func, progress):
+		metrics = self.metrics
+		progress('Connecting')
+		with metrics.phase('connect'):
+			self.connect()
+		with metrics.phase('outlook'):
+			self.route_tasks()
+		for engine, profile in zip(self.engines, self.profiles):
+			engine.metrics = metrics.board(profile.name)
+		def run(board):
+			engine, profile = board
+			return func(engine, lambda text: progress('{0}: {1}'.format(profile.boardName, text)))
+		results = []
+		# With fewer workers than boards, each board gets one and the boards take turns
+		for (engine, profile), result, error in run_concurrently(run, zip(self.engines, self.profiles), min(len(self.engines), self.maxWorkers)):
+			if error:
+				self.logger.error('Sync of board %s failed - %s', profile.boardName, error)
+			results.append((profile, result, error))
+		return results
+
+	# This method runs one sync cycle of all the boards. Returns False when a board stopped early.
+	def sync(self, progress=None):
+		if progress is None:
+			progress = lambda text: None
+		self.metrics = metrics = SyncMetrics()
+		retriesBefore = self.primary.retryPolicy.retries
+		success = False
+		try:
+			results = self.run_boards(lambda engine, boardProgress: engine.run_cycle(boardProgress, uploads=False), progress)
+			success = all(result and not error for profile, result, error in results)
+			# Tasks completed in Jira are marked in outlook on this thread
+			completed = complete_tasks(self.sources[None], [entryID for engine in self.engines for entryID in engine.source.completions])
+			metrics.count('completed_in_outlook', completed['done'])
+			metrics.count('complete_failed', completed['failed'])
+			# The attachments of all the boards are read from outlook on this thread
+			if success:
+				success = self.primary.upload_attachments(self.sources[None], metrics, progress, [engine.metaSuffix for engine in self.engines], self.maxWorkers)
+			return success
+		finally:
+			self.primary.write_metrics(metrics, success, retriesBefore)
+
+	# This method plans the cycle of every board. Returns {board name: plan}, or None when a board couldn't be planned.
+	def dry_run(self, progress=None):
+		if progress is None:
+			progress = lambda text: None
+		self.metrics = SyncMetrics()
+		try:
+			results = self.run_boards(lambda engine, boardProgress: engine.plan_cycle(boardProgress), progress)
+		finally:
+			for engine in self.engines or [self.primary]:
+				engine.rollback()
+		if any(error or plan is None for profile, plan, error in results):
+			return None
+		return OrderedDict((profile.name, plan) for profile, plan, error in results)
 
 def cleanse(line):
 	line=line.replace('FW: ', '')
@@ -120,13 +749,110 @@ def cleanse(line):
 	line=line.replace('  ', ' ')
 	return line	
 
+# This function adds a last modification filter to an outlook Restrict condition
+def outlook_filter(condition, since=None):
+	if since is None:
+		return condition
+	return "{0} AND [LastModificationTime] > '{1}'".format(condition, since.strftime(OUTLOOK_DATE_FORMAT))
+
+# This generator pages through a JQL search, so there is no cap on the number of results
+def iter_search_issues(jira, jql, fields=INDEX_FIELDS, pageSize=SEARCH_PAGE_SIZE, startAt=0):
+	while True:
+		issues = jira.search_issues(jql, startAt=startAt, maxResults=pageSize, fields=fields)
+		for issue in issues:
+			yield issue
+		startAt += len(issues)
+		total = getattr(issues, 'total', None)
+		if len(issues) < pageSize or (total is not None and startAt >= total):
+			break
+
+# This function runs func on every item using a bounded pool of threads.
+# Returns (item, result, error) triples in input order, error being None when func succeeded.
+def run_concurrently(func, items, maxWorkers=MAX_WORKERS):
+	items = list(items)
+	def call(item):
+		try:
+			return (item, func(item), None)
+		except Exception as ex:
+			return (item, None, ex)
+	if maxWorkers <= 1 or len(items) <= 1:
+		return [call(item) for item in items]
+	with ThreadPoolExecutor(max_workers=min(maxWorkers, len(items))) as pool:
+		return list(pool.map(call, items))
+
+# This function fetches all the results of a JQL search. Pages after the first one are fetched concurrently.
+def search_all_issues(jira, jql, fields=INDEX_FIELDS, pageSize=SEARCH_PAGE_SIZE, maxWorkers=MAX_WORKERS):
+	firstPage = jira.search_issues(jql, startAt=0, maxResults=pageSize, fields=fields)
+	issues = list(firstPage)
+	total = getattr(firstPage, 'total', None)
+	if total is None:
+		# Total unknown, so the remaining pages are walked one after another
+		if len(issues) == pageSize:
+			issues.extend(iter_search_issues(jira, jql, fields, pageSize, startAt=len(issues)))
+		return issues
+	pages = run_concurrently(lambda startAt: jira.search_issues(jql, startAt=startAt, maxResults=pageSize, fields=fields), range(len(issues), total, pageSize), maxWorkers)
+	for startAt, page, error in pages:
+		if error:
+			raise error
+		issues.extend(page)
+	return issues
+
+# This function fetches all the open adapter issues of the board, Done ones included. Returns None on failure.
+def fetch_board_issues(jira, project, defaulttaskvalues, maxWorkers=MAX_WORKERS):
+	logger = logging.getLogger('JiraOutAdapter')
+	customJQL = "project={0} and assignee={1} and labels={2} and " \
+					"status not in (Closed, Archive)".format(str(project), defaulttaskvalues['assigneeID'], "".join(defaulttaskvalues['labels']))
+	try:
+		return search_all_issues(jira, customJQL, maxWorkers=maxWorkers)
+	except JIRAError as jex:
+		logger.exception('\t\t[JIRA EXCEPTION] - Index Issues %s - %s', jex.status_code, jex.text)
+	except Exception as ex:
+		logger.exception('\t\t[EXCEPTION] - Index Issues %s', ex)
+	return None
+
+# This function fetches the adapter issues of the board updated since the given time, whatever their status. Returns None on failure.
+def fetch_changed_issues(jira, project, defaulttaskvalues, since, maxWorkers=MAX_WORKERS):
+	logger = logging.getLogger('JiraOutAdapter')
+	customJQL = "project={0} and assignee={1} and labels={2} and updated >= \"{3}\"".format(
+					str(project), defaulttaskvalues['assigneeID'], "".join(defaulttaskvalues['labels']), since.strftime(JQL_DATE_FORMAT))
+	try:
+		return search_all_issues(jira, customJQL, maxWorkers=maxWorkers)
+	except JIRAError as jex:
+		logger.exception('\t\t[JIRA EXCEPTION] - Changed Issues %s - %s', jex.status_code, jex.text)
+	except Exception as ex:
+		logger.exception('\t\t[EXCEPTION] - Changed Issues %s', ex)
+	return None
+
+def index_issues(issues, threshold=MATCH_THRESHOLD):
+	issueIndex = SubjectMatcher(threshold)
+	for issue in issues:
+		issueIndex.add(issue.fields.summary, issue)
+	logging.getLogger('JiraOutAdapter').info('Indexed %s existing issues.', len(issueIndex))
+	return issueIndex
+
+# This function picks the issues in doneStatus resolved at least age ago, the ones due for archiving
+def resolved_before(issues, doneStatus=DONE_STATUS, age=ARCHIVE_AGE):
+	before = datetime.now(timezone.utc) - age
+	resolved = []
+	for issue in issues:
+		resolutionDate = parse_jira_time(getattr(issue.fields, 'resolutiondate', None))
+		if issue.fields.status.name == doneStatus and resolutionDate and resolutionDate <= before:
+			resolved.append(issue)
+	return sorted(resolved, key=lambda issue: issue.key)
+
 # This method helps to find an existing tasks work item in Jira based on the task subject	
-def get_existing_workitem(jira, project, task, defaulttaskvalues, customJQL):
+def get_existing_workitem(jira, project, task, defaulttaskvalues, customJQL, issueIndex=None):
 	logger = logging.getLogger('JiraOutAdapter')
+	# Prefetched index turns the existence check into an in-memory lookup
+	if issueIndex is not None and not customJQL:
+		issueExisting = issueIndex.match(task.subject)
+		if issueExisting:
+			logger.info('\tFound %s existing issue for %s', issueExisting, task.subject)
+		return issueExisting
 	# If this parameter was not passed, then assume we need to check whole of the project.
 	if not customJQL:
 		customJQL = "project={0} and assignee={1} and labels={2} and summary ~ '{3}' and " \
-						"status not in (Closed, Archive)".format(str(project),defaulttaskvalues['assigneeID'], "".join(defaulttaskvalues['labels']), task.Subject)
+						"status not in (Closed, Archive)".format(str(project),defaulttaskvalues['assigneeID'], "".join(defaulttaskvalues['labels']), task.subject)
 	# to reduce the number of items returned, we can further narrow down the search using more filter parameters.
 	# There is a restriction of 1000 items on search function.
 	else:
@@ -136,32 +862,227 @@ def get_existing_workitem(jira, project, task, defaulttaskvalues, customJQL):
 	issueExisting = 'None'
 	try:
 		issues = jira.search_issues(customJQL, startAt=0, maxResults=1)
-		if not issues:
-			logger.info('\tFound {0} existing issues. Checking again...'.format(len(issues)))
-			issues = jira.search_issues(customJQL, startAt=0, maxResults=1)
 
 		if issues:
 			if len(issues) >= 1:
-				print('\tFound {0} existing issue for {1}'.format(issues[0], task.Subject))
-				logger.info('\tFound {0} existing issue for {1}'.format(issues[0], task.Subject))
+				logger.info('\tFound %s existing issue for %s', issues[0], task.subject)
 				issueExisting = issues[0]
 		else:
 			issueExisting = None
 
 	except JIRAError as jex:
-		logger.exception('\t\t[JIRA EXCEPTION] - Search Issue {0} - {1}\n'.format(jex.status_code, jex.text))
-		print('\t\t[JIRA EXCEPTION] - Search Issue {0} - {1}\n'.format(jex.status_code, jex.text))
+		logger.exception('\t\t[JIRA EXCEPTION] - Search Issue %s - %s', jex.status_code, jex.text)
 	except Exception as ex:
-		logger.exception('\t\t[EXCEPTION] - Search Issue {0}'.format(ex))
-		print(ex)
+		logger.exception('\t\t[EXCEPTION] - Search Issue %s', ex)
 
 	return issueExisting
 
-# This function creates the tasks send to it.	
-def create_workitem_tasks(jira, project, task, defaulttaskvalues):
+# This function creates all the tasks sent to it through Jira's bulk create endpoint.
+# With the metadata cache, names are sent as IDs and the issues Jira would refuse are not sent at all.
+# Returns a list of (task, new issue) pairs in input order, the issue being None when its creation failed.
+def create_workitem_tasks_bulk(jira, project, tasks, defaulttaskvalues, chunkSize=CREATE_CHUNK_SIZE, maxWorkers=MAX_WORKERS, metadata=None):
+	logger = logging.getLogger('JiraOutAdapter')
+	# Outlook items can only be read on this thread, so subjects and fields are collected before the requests run
+	subjects = [task.subject for task in tasks]
+	field_list = [build_issue_dict(project, task, defaulttaskvalues) for task in tasks]
+	if metadata is not None:
+		field_list = resolve_issue_fields(metadata, field_list)
+	sendable = [i for i, fields in enumerate(field_list) if fields is not None]
+	newIssues = [None] * len(tasks)
+	chunkStarts = range(0, len(sendable), chunkSize)
+	for chunkStart, results, error in run_concurrently(lambda start: jira.create_issues(field_list=[field_list[i] for i in sendable[start:start + chunkSize]], prefetch=False), chunkStarts, maxWorkers):
+		chunk = sendable[chunkStart:chunkStart + chunkSize]
+		if isinstance(error, JIRAError):
+			logger.error('\t\t[JIRA EXCEPTION] Bulk create issues - %s - %s', error.status_code, error.text)
+			continue
+		elif error:
+			logger.error('\t\t[EXCEPTION] Bulk create issues - %s', error)
+			continue
+
+		# Results come back in the order of the chunk, so they map straight to the originating tasks
+		for i, result in zip(chunk, results):
+			if result['status'] == 'Success':
+				logger.info('\tCreated issue - %s for task %s', result['issue'], subjects[i])
+				newIssues[i] = result['issue']
+			else:
+				logger.info('%s', field_list[i])
+				logger.error('\t\t[JIRA EXCEPTION] Create issue - %s - %s', subjects[i], result['error'])
+	return list(zip(tasks, newIssues))
+
+# This function gives the fields of new issues with their names replaced by IDs, None for the issues Jira would refuse.
+# Each problem is logged once. When the metadata can't be fetched the issues are sent by name.
+def resolve_issue_fields(metadata, field_list):
+	logger = logging.getLogger('JiraOutAdapter')
+	resolved = []
+	refused = Counter()
+	available = True
+	for fields in field_list:
+		if not available:
+			resolved.append(fields)
+			continue
+		try:
+			resolved.append(metadata.resolve(fields))
+		except ValueError as ex:
+			refused[str(ex)] += 1
+			resolved.append(None)
+		except Exception as ex:
+			logger.warning('Jira metadata unavailable, sending issues by name - %s', ex)
+			available = False
+			resolved.append(fields)
+	for error, count in refused.items():
+		logger.error('\t\t[CONFIG ERROR] %s issues not created - %s', count, error)
+	if refused:
+		metadata.invalidate()
+	return resolved
+
+# This function updates the issues of changed tasks, each in one request setting its changed fields and adding its comment.
+# Returns (update, True when the issue was updated) for every update.
+def update_issues(jira, updates, maxWorkers=MAX_WORKERS):
+	logger = logging.getLogger('JiraOutAdapter')
+	def update_issue(update):
+		operations = {'comment': [{'add': {'body': update.comment}}]} if update.comment else None
+		jira.update_issue_fields(update.key, fields=update.issueFields, update=operations)
+	results = []
+	for update, result, error in run_concurrently(update_issue, updates, maxWorkers):
+		if isinstance(error, JIRAError):
+			logger.error('\t\t[JIRA EXCEPTION] Update issue %s - %s - %s', update.key, error.status_code, error.text)
+		elif error:
+			logger.error('\t\t[EXCEPTION] Update issue %s - %s', update.key, error)
+		else:
+			logger.info('\tUpdated issue - %s (%s)', update.key, ', '.join(sorted(update.issueFields or {}) + (['comment'] if update.comment else [])))
+		results.append((update, error is None))
+	return results
+
+# This function uploads the attachments of the tasks queued in the sync state, up to budget bytes per call.
+# Attachments already on the issue, by name and size or by content hash, are skipped. Outlook is only used on
+# the calling thread: attachments are saved to a temporary folder one by one and uploaded from there in parallel.
+# Tasks whose attachments didn't fit in the budget or failed to upload stay queued for the next cycle. Attachments
+# bigger than the whole budget, or that outlook fails to save, are skipped until the task is synced again.
+def upload_attachments(jira, state, source, budget, maxWorkers=MAX_WORKERS, metrics=None, stop=None, scopes=('',)):
+	logger = logging.getLogger('JiraOutAdapter')
+	metrics = metrics or SyncMetrics()
+	spool = tempfile.mkdtemp(prefix='jira-adapter-')
+	try:
+		uploads = []
+		# {(scope, entryID): True when attachments of the task are left for the next cycle}
+		left = OrderedDict()
+		remaining = budget
+		for scope, entryID in [(scope, entryID) for scope in scopes for entryID in state.queued_attachments(scope)]:
+			if stop is not None and stop():
+				break
+			record = state.get(entryID, scope)
+			if record is None:
+				# The task has no issue yet. It is queued again when it is synced.
+				state.unqueue_attachments(entryID, scope)
+				continue
+			key = record['jira_key']
+			try:
+				attachments = source.attachments(entryID)
+			except Exception as ex:
+				logger.warning('Could not read the attachments of the task of %s - %s', key, ex)
+				state.unqueue_attachments(entryID, scope)
+				continue
+			left[(scope, entryID)] = False
+			for attachment in attachments:
+				if state.has_attachment_named(key, attachment.filename, attachment.size):
+					metrics.count('attachments_skipped')
+					continue
+				if attachment.size > budget:
+					logger.warning('Attachment %s of %s is bigger than the budget of %s bytes, it is not uploaded.', attachment.filename, key, budget)
+					metrics.count('attachments_too_large')
+					continue
+				if attachment.size > remaining:
+					left[(scope, entryID)] = True
+					metrics.count('attachments_deferred')
+					continue
+				path = os.path.join(spool, str(len(uploads)))
+				try:
+					source.save_attachment(attachment, path)
+					contentHash = file_hash(path)
+				except Exception as ex:
+					logger.error('\t\t[EXCEPTION] Save attachment %s of %s - %s', attachment.filename, key, ex)
+					metrics.count('attachment_save_failed')
+					continue
+				if state.has_attachment(key, contentHash):
+					metrics.count('attachments_skipped')
+					continue
+				remaining -= attachment.size
+				uploads.append(((scope, entryID), key, attachment, path, contentHash))
+
+		progress = {'done': 0, 'failed': 0}
+		for (task, key, attachment, path, contentHash), result, error in run_concurrently(
+				lambda upload: jira.add_attachment(upload[1], attachment=upload[3], filename=upload[2].filename), uploads, maxWorkers):
+			if error:
+				logger.error('\t\t[EXCEPTION] Upload attachment %s to %s - %s', attachment.filename, key, error)
+				left[task] = True
+				progress['failed'] += 1
+				metrics.count('attachment_upload_failed')
+			else:
+				logger.info('\tUploaded attachment %s to %s', attachment.filename, key)
+				state.record_attachment(key, contentHash, attachment.filename, attachment.size)
+				progress['done'] += 1
+				metrics.count('attachments_uploaded')
+				metrics.count('attachment_bytes', attachment.size)
+		for (scope, entryID), deferred in left.items():
+			if not deferred:
+				state.unqueue_attachments(entryID, scope)
+		state.commit()
+		if any(left.values()):
+			logger.info('Attachments of %s tasks are left for the next cycle.', sum(left.values()))
+		return progress
+	finally:
+		shutil.rmtree(spool, ignore_errors=True)
+
+# This function gives the content hash of a file, read in chunks
+def file_hash(path, chunkSize=1024 * 1024):
+	digest = hashlib.sha1()
+	with open(path, 'rb') as f:
+		for chunk in iter(lambda: f.read(chunkSize), b''):
+			digest.update(chunk)
+	return digest.hexdigest()
+
+# This function attaches a text as a file, without writing it to disk
+def attach_text(jira, key, text, filename):
+	return jira.add_attachment(key, attachment=io.BytesIO(text.encode('utf-8')), filename=filename)
+
+# This function compares a changed task with the fields its issue was synced with, the FieldHashes of the sync state.
+# Returns the Jira fields to set and the text added to the body, to be commented instead of replacing the description.
+# Records of older versions have no field hashes, so all fields are set.
+def plan_issue_update(synced, summary, body):
+	body = body or ''
+	if synced is None:
+		return {'summary': summary, 'description': body}, None
+	fields = {}
+	comment = None
+	if text_hash(summary) != synced.summary:
+		fields['summary'] = summary
+	if text_hash(body) != synced.body:
+		added = added_text(synced, body)
+		if added is None:
+			fields['description'] = body
+		elif added.strip():
+			comment = added.strip()
+	return fields, comment
+
+# This function gives the text added before or after the body the issue was synced with, or None when the body was edited otherwise.
+# Replies are usually put on top of a mail, notes at the bottom of a task.
+def added_text(synced, body):
+	length = synced.bodyLength or 0
+	if not length or len(body) <= length:
+		return None
+	if text_hash(body[:length]) == synced.body:
+		return body[length:]
+	if text_hash(body[-length:]) == synced.body:
+		return body[:-length]
+	return None
+
+# This function gives the summary of the issue of a task. Jira refuses summaries with line breaks.
+def issue_summary(subject):
+	return subject.replace('\n', '')
+
+# This function builds the fields for creating a new issue from an outlook task
+def build_issue_dict(project, task, defaulttaskvalues):
 	logger = logging.getLogger('JiraOutAdapter')
-	# Holds the new issue ID from Jira when created successfully
-	new_issue = None
 	# Holds the parameters for the JSON for creating a new issue via API
 	issue_dict = {}
 	defaulttaskvalues['Priority'] = 'Medium'
@@ -172,19 +1093,19 @@ def create_workitem_tasks(jira, project, task, defaulttaskvalues):
 	else:
 		logger.warning('No project ID was passed.')
 	# Gets Summary. This will show on the cards on the board
-	issue_dict['summary'] = '{0}'.format(task.Subject.replace('\n', ''))
+	issue_dict['summary'] = issue_summary(task.subject)
 
 	# Gets the Notes
-	if task.Body:
-		issue_dict['description'] = task.Body
+	if task.body:
+		issue_dict['description'] = task.body
 	else:
-		logger.warning('No task note was passed to {0}'.format(task.Subject))
+		logger.warning('No task note was passed to %s', task.subject)
 
 	# Gets Priority info.
 	if defaulttaskvalues['Priority']:
 		issue_dict['priority'] = {'name' : defaulttaskvalues['Priority']}
 	else:
-		logger.warning('No priority was passed. {0}'.format(task.Subject))
+		logger.warning('No priority was passed. %s', task.subject)
 
 	# Sets the issue type
 	issue_dict['issuetype'] = {'name': 'Story'}
@@ -192,98 +1113,311 @@ def create_workitem_tasks(jira, project, task, defaulttaskvalues):
 	if defaulttaskvalues['labels']:
 		issue_dict['labels'] = defaulttaskvalues['labels']
 	else:
-		logger.warning('No label was passed. {0}'.format(task.Subject))
+		logger.warning('No label was passed. %s', task.subject)
 
 	# Gets assignee
 	if defaulttaskvalues['assigneeID']:
 		issue_dict['assignee'] ={'name' : defaulttaskvalues['assigneeID']}
 	else:
-		logger.warning('No assignee ID was passed. {0}'.format(task.Subject))
-
-	try:
-		# Pass all the collected info to Jira's API to create the issue on Kanban board
-		new_issue = jira.create_issue(fields=issue_dict)
-		print('\tCreated issue - {0}\n'.format(new_issue))
-		logger.info('\tCreated issue - {0} for task {1}'.format(new_issue, task.Subject))
-	except JIRAError as jex:
-		logger.info(issue_dict)
-		logger.exception('\t\t[JIRA EXCEPTION] Create issue - {0} - {1}\n'.format(jex.status_code, jex.text))
-		print('\t\t[JIRA EXCEPTION] Create issue - {0} - {1}\n'.format(jex.status_code, jex.text))
-	except Exception as ex:
-		logger.info(issue_dict)
-		logger.exception('\t\t[EXCEPTION] Create issue - {0}'.format(ex))
-		print(ex)
+		logger.warning('No assignee ID was passed. %s', task.subject)
 
-	return new_issue
+	return issue_dict
 
-# This function transits completd tasks in outlook to DONE stage
-def transit_tasks_to_done_stage(jira, project, defaulttaskvalues, todo_items):
+# This function finds the issues of tasks completed in outlook. Only reads are made.
+def find_completed_issues(jira, project, defaulttaskvalues, tasks, issueIndex=None, state=None, scope=''):
 	logger = logging.getLogger('JiraOutAdapter')
 	# Fecthing Completed tasks only
 	#issue = jira.issue(project)
 	#transitions = jira.transitions(issue)
 	#[(t['id'], t['name']) for t in transitions]
-	print('\nTransiting Completed Tasks')
-	tasks = todo_items.Restrict("[Complete] = TRUE")
+	logger.info('\nTransiting Completed Tasks')
+	if issueIndex is not None:
+		keyIndex = dict((issue.key, issue) for issue in issueIndex.issues())
+	# Issues to move to Done, collected first so that the transitions can run concurrently
+	toMove = OrderedDict()
 	for i,task in enumerate(tasks):
-		task.Subject = cleanse(task.Subject)
-		print("\t[{0}] {1}".format(i,task.Subject))
+		task = task._replace(subject=cleanse(task.subject))
+		logger.info("\t[%s] %s", i, task.subject)
 		customJQL = "project={0} and assignee={1} and labels={2} and summary ~ '{3}' and " \
-						"status not in (Closed, Archive)".format(str(project),defaulttaskvalues['assigneeID'], "".join(defaulttaskvalues['labels']), task.Subject)
+						"status not in (Closed, Archive)".format(str(project),defaulttaskvalues['assigneeID'], "".join(defaulttaskvalues['labels']), task.subject)
+		record = state.get(task.entryID, scope) if state else None
 		try:
-			issues = jira.search_issues(customJQL, startAt=0, maxResults=10)
-			if not issues:
-				logger.info('\tFound {0} existing issues. Checking again...'.format(len(issues)))
+			if record:
+				# Known task, its issue is picked by key. Issues already archived or closed are left alone.
+				if issueIndex is not None:
+					issue = keyIndex.get(record['jira_key'])
+				else:
+					issue = jira.issue(record['jira_key'], fields=INDEX_FIELDS)
+				issues = [issue] if issue else []
+			elif issueIndex is not None:
+				# Completed tasks are looked up in the prefetched index, no search needed
+				issue = issueIndex.match(task.subject)
+				issues = [issue] if issue else []
+			else:
 				issues = jira.search_issues(customJQL, startAt=0, maxResults=10)
 	
-			if issues:
-				for i, issue in enumerate(issues):
-					try:
-						print("\t\t Transitioning from NS to WIP")
-						jira.transition_issue(issue, transition='Move From NS to WIP')
-						print("\t\t Transitioned from NS to WIP")
-					except JIRAError as jex:
-						logger.exception('\t\t[JIRA EXCEPTION] - {2} - NS to WIP - {0} - {1}\n'.format(jex.status_code, jex.text, issue))
-						print('\t\t[JIRA EXCEPTION] - {2} - Transition to Done - {0} - {1}\n'.format(jex.status_code, jex.text, issue))
-					except Exception as ex:
-						logger.exception('\t\t[EXCEPTION] Transition to Done - {0}'.format(ex))
-						print('\t\t[EXCEPTION] Transition to Done - {0}'.format(ex))
-					try:
-						print("\t\t Transitioning from Deffered to WIP")
-						jira.transition_issue(issue, transition='Deferred to WIP')
-						print("\t\t Transitioned from Deffered to WIP")
-					except JIRAError as jex:
-						print('\t\t[JIRA EXCEPTION] - {2} - Transition to Done - {0} - {1}\n'.format(jex.status_code, jex.text, issue))
-						logger.exception('\t\t[JIRA EXCEPTION] - {2} - Deferred to WIP- {0} - {1}\n'.format(jex.status_code, jex.text, issue))
-					except Exception as ex:
-						logger.exception('\t\t[EXCEPTION] Transition to Done - {0}'.format(ex))
-						print('\t\t[EXCEPTION] Transition to Done - {0}'.format(ex))
-					try:
-						print("\t\t Transitioning from WIP to READY")
-						jira.transition_issue(issue, transition='WIP to Ready')
-						print("\t\t Transitioned from WIP to READY")
-					except JIRAError as jex:
-						logger.exception('\t\t[JIRA EXCEPTION] - {2} - WIP to Ready - {0} - {1}\n'.format(jex.status_code, jex.text, issue))
-						print('\t\t[JIRA EXCEPTION] - {2} - Transition to Done - {0} - {1}\n'.format(jex.status_code, jex.text, issue))
-					except Exception as ex:
-						logger.exception('\t\t[EXCEPTION] Transition to Done - {0}'.format(ex))
-						print('\t\t[EXCEPTION] Transition to Done - {0}'.format(ex))
-					try:
-						print("\t\t Transitioning from Ready to Done")
-						jira.transition_issue(issue, transition='Ready to Done')
-						print("\t\t Transitioned from Ready to Done")
-					except JIRAError as jex:
-						logger.exception('\t\t[JIRA EXCEPTION] - {2} - Ready to Done - {0} - {1}\n'.format(jex.status_code, jex.text, issue))
-						print('\t\t[JIRA EXCEPTION] - {2} - Transition to Done - {0} - {1}\n'.format(jex.status_code, jex.text, issue))
-					except Exception as ex:
-						logger.exception('\t\t[EXCEPTION] Transition to Done - {0}'.format(ex))
-						print('\t\t[EXCEPTION] Transition to Done - {0}'.format(ex))
-					logger.info('Issue {0} has been archived '
-									'in Kanban board.'.format(issue))	
+			for issue in issues:
+				toMove[issue.key] = issue
 		except JIRAError as jex:
-			logger.exception('\t\t[JIRA EXCEPTION] Transition to Done - {0} - {1}\n'.format(jex.status_code, jex.text, issue))
-			print('\t\t[JIRA EXCEPTION] Transition to Done - {0} - {1}\n'.format(jex.status_code, jex.text, issue))
+			logger.exception('\t\t[JIRA EXCEPTION] Transition to Done - %s - %s', jex.status_code, jex.text)
 		except Exception as ex:
-			logger.exception('\t\t[EXCEPTION] Transition to Done - {0}'.format(ex))
-			print('\t\t[EXCEPTION] Transition to Done - {0}'.format(ex))	
-	# Done
+			logger.exception('\t\t[EXCEPTION] Transition to Done - %s', ex)
+	return list(toMove.values())
+
+# This function finds the DONE issues resolved more than a week ago, which are due for archiving
+def find_done_issues(jira, project, defaulttaskvalues, maxWorkers=MAX_WORKERS):
+	logger = logging.getLogger('JiraOutAdapter')
+	customJQL = "project={0} and assignee={1} and labels={2} and status in (Done) and resolutiondate <= -1w " \
+					"order by key".format( str(project), defaulttaskvalues['assigneeID'], "".join(defaulttaskvalues['labels']))
+	try:
+		return search_all_issues(jira, customJQL, maxWorkers=maxWorkers)
+	except JIRAError as jex:
+		logger.exception('\t\t[JIRA EXCEPTION] - Archive Issues %s - %s', jex.status_code, jex.text)
+	except Exception as ex:
+		logger.exception('\t\t[EXCEPTION] - Archive Search Issue %s', ex)
+	return []
+
+# This function finds the issues moved to one of the statuses since the given time. Returns None on failure.
+def find_completed_in_jira(jira, project, defaulttaskvalues, statuses, since, maxWorkers=MAX_WORKERS):
+	logger = logging.getLogger('JiraOutAdapter')
+	customJQL = "project={0} and assignee={1} and labels={2} and status in ({3}) and updated >= \"{4}\"".format(
+					str(project), defaulttaskvalues['assigneeID'], "".join(defaulttaskvalues['labels']), ', '.join(statuses), since.strftime(JQL_DATE_FORMAT))
+	try:
+		return search_all_issues(jira, customJQL, fields=CHANGED_FIELDS, maxWorkers=maxWorkers)
+	except JIRAError as jex:
+		logger.exception('\t\t[JIRA EXCEPTION] - Jira Changes %s - %s', jex.status_code, jex.text)
+	except Exception as ex:
+		logger.exception('\t\t[EXCEPTION] - Jira Changes %s', ex)
+	return None
+
+# This function picks the synced tasks of the issues completed in Jira. Tasks already complete, and tasks modified in outlook
+# after their issue changed, are left alone, so a task reopened in outlook is not completed again.
+def plan_completions(state, issues, tasks, completedTasks, scope=''):
+	modified = dict((task.entryID, task.lastModified) for task in tasks)
+	complete = set(task.entryID for task in completedTasks)
+	completions = []
+	for issue in issues:
+		entryID = state.entry_for_key(issue.key, scope)
+		if entryID is None or entryID in complete:
+			continue
+		updated = local_time(getattr(issue.fields, 'updated', None))
+		if modified.get(entryID) and updated and modified[entryID] > updated:
+			continue
+		completions.append(PlannedCompletion(entryID, issue.key, issue.fields.status.name))
+	return completions
+
+# This function turns a Jira time field into a plain local datetime, like the times read from outlook
+def local_time(value):
+	when = parse_jira_time(value)
+	return when.astimezone().replace(tzinfo=None) if when else None
+
+# This function marks the tasks complete in outlook. Returns the number of tasks marked and failed, as {'done': n, 'failed': n}.
+# Tasks already complete, or left to the caller by a snapshot source, are not counted.
+def complete_tasks(source, entryIDs):
+	logger = logging.getLogger('JiraOutAdapter')
+	completed = {'done': 0, 'failed': 0}
+	for entryID in entryIDs:
+		try:
+			if source.mark_complete(entryID):
+				logger.info('\tCompleted outlook task %s', entryID)
+				completed['done'] += 1
+		except Exception as ex:
+			# Deleted from outlook since it was synced
+			logger.error('\t\t[EXCEPTION] Complete outlook task %s - %s', entryID, ex)
+			completed['failed'] += 1
+	return completed
+
+# This function plans the move of an issue to target. Returns None when the issue is already there or can't get there.
+def planned_move(planner, issue, target):
+	status = getattr(getattr(issue, 'fields', None), 'status', None)
+	if status is None:
+		# Status unknown, it is read when the move is applied
+		return PlannedMove(issue.key, None, None)
+	steps = planner.plan(status.name, target)
+	if not steps:
+		if steps is None:
+			logging.getLogger('JiraOutAdapter').warning('No path from %s to %s for issue %s', status.name, target, issue)
+		return None
+	return PlannedMove(issue.key, status.name, steps)
+
+# This function moves the planned issues to target, batch by batch. Issues of a batch are moved concurrently.
+# stop is checked between batches, onMoved is called with the key and new status of every issue moved. Returns the number of issues moved and failed, as {'done': n, 'failed': n}.
+def move_issues(planner, moves, target, maxWorkers=MAX_WORKERS, batchSize=ARCHIVE_BATCH_SIZE, stop=None, onMoved=None):
+	logger = logging.getLogger('JiraOutAdapter')
+	moved = {'done': 0, 'failed': 0}
+	for start in range(0, len(moves), batchSize):
+		if stop is not None and stop():
+			break
+		# The steps of one issue run in order on the same worker, issues run concurrently
+		batch = moves[start:start + batchSize]
+		for move, status, error in run_concurrently(lambda move: planner.move(move.key, target, status=move.status), batch, maxWorkers):
+			if error:
+				moved['failed'] += 1
+			else:
+				moved['done'] += 1
+			if isinstance(error, JIRAError):
+				logger.error('\t\t[JIRA EXCEPTION] - %s - Transition to %s - %s - %s', move.key, target, error.status_code, error.text)
+			elif error:
+				logger.error('\t\t[EXCEPTION] %s - Transition to %s - %s', move.key, target, error)
+			else:
+				logger.info('Issue %s has been moved to %s '
+								'in Kanban board.', move.key, status)
+				if onMoved is not None:
+					onMoved(move.key, status)
+		logger.info('\tMoved %s issues to %s, %s failed', moved['done'], target, moved['failed'])
+	return moved
+
+# This function reads a workflow map from config values of the form 'From status | Transition name | To status'
+def parse_workflow(values):
+	workflow = {}
+	for value in values:
+		parts = [part.strip() for part in value.split('|')]
+		if len(parts) != 3 or not all(parts):
+			raise ValueError('Invalid workflow transition "{0}". Expected "From | Transition | To".'.format(value))
+		workflow.setdefault(parts[0], {})[parts[1]] = parts[2]
+	return workflow
+
+# This class moves issues along the workflow by the shortest path, firing transitions by ID.
+# Transition IDs are fetched from Jira once per status and cached for the rest of the run.
+class TransitionPlanner(object):
+	def __init__(self, jira, workflow=None, doneStatus=DONE_STATUS, metadata=None):
+		self.jira = jira
+		self.workflow = workflow or DEFAULT_WORKFLOW
+		self.doneStatus = doneStatus
+		# Holds {status: {transition name: transition ID}}, kept between runs by the metadata cache
+		self.metadata = metadata
+		self.transitionIDs = metadata.transitionIDs if metadata is not None else {}
+		# Statuses whose transitions were fetched in this run
+		self.fetched = set()
+		# Issues are moved from several threads at once
+		self.lock = threading.Lock()
+
+	# Returns the transition names leading from status to target, or None if target can't be reached
+	def plan(self, status, target):
+		paths = {status: []}
+		queue = deque([status])
+		while queue:
+			current = queue.popleft()
+			if current == target:
+				return paths[current]
+			for transition, nextStatus in self.workflow.get(current, {}).items():
+				if nextStatus not in paths:
+					paths[nextStatus] = paths[current] + [transition]
+					queue.append(nextStatus)
+		return None
+
+	# Raises ValueError when the transition is not available, or the issue is not in status any more
+	def transition_id(self, issue, status, transition):
+		with self.lock:
+			# Saved transitions missing one are fetched again, the workflow may have changed since
+			if status not in self.transitionIDs or (transition not in self.transitionIDs[status] and status not in self.fetched):
+				# status may come from a cache and be stale. The transitions are saved under the status the issue is in.
+				fetched = self.jira.issue(getattr(issue, 'key', issue), fields='status', expand='transitions')
+				current = fetched.fields.status.name
+				self.transitionIDs[current] = dict((t['name'], t['id']) for t in fetched.raw.get('transitions') or [])
+				self.fetched.add(current)
+				if self.metadata is not None:
+					self.metadata.save_transitions()
+				if current != status:
+					raise ValueError('Issue {0} is in status {1}, not {2}.'.format(getattr(issue, 'key', issue), current, status))
+		if transition not in self.transitionIDs[status]:
+			raise ValueError('Transition "{0}" is not available from status {1}.'.format(transition, status))
+		return self.transitionIDs[status][transition]
+
+	# Issues created in bulk come back without their fields, their status is fetched then. issue can also be a key.
+	def issue_status(self, issue):
+		status = getattr(getattr(issue, 'fields', None), 'status', None)
+		if status is None:
+			status = self.jira.issue(getattr(issue, 'key', issue), fields='status').fields.status
+		return status.name
+
+	# Runs the planned transitions on the issue and returns the status it ended in.
+	# status is the current status of the issue when it is already known.
+	def move(self, issue, target, status=None):
+		logger = logging.getLogger('JiraOutAdapter')
+		if status is None:
+			status = self.issue_status(issue)
+		steps = self.plan(status, target)
+		if steps is None:
+			logger.warning('No path from %s to %s for issue %s', status, target, issue)
+			return status
+		for transition in steps:
+			logger.info("\t\t %s", transition)
+			self.jira.transition_issue(issue, self.transition_id(issue, status, transition))
+			status = self.workflow[status][transition]
+		return status
+
+# This function sets up logging from the optional [logging] section of the configuration
+def configure_logging(config):
+	if not config.has_section('logging'):
+		return setup_logging()
+	return setup_logging(
+		logfile=config.get('logging', 'file', fallback=LOGFILE),
+		structured=config.getboolean('logging', 'json', fallback=False),
+		quiet=config.getboolean('logging', 'quiet', fallback=False),
+		maxBytes=config.getint('logging', 'maxbytes', fallback=LOG_MAX_BYTES),
+		backupCount=config.getint('logging', 'backups', fallback=LOG_BACKUP_COUNT))
+
+# This function starts the webhook receiver of the optional [webhook] section. Returns None without it.
+# Raises ValueError when the section sets a host other than the loopback interface without a token.
+def start_webhook_receiver(config):
+	if not config.has_section('webhook'):
+		return None
+	receiver = WebhookReceiver(
+		host=config.get('webhook', 'host', fallback=WEBHOOK_HOST),
+		port=config.getint('webhook', 'port', fallback=WEBHOOK_PORT),
+		token=config.get('webhook', 'token', fallback=None))
+	receiver.start()
+	return receiver
+
+# This function reads the engine settings, engine options and board profiles from the configuration file saved by the UI
+def read_settings(config):
+	settings = [config.get('jiraout', option) for option in ('jiraid', 'jirausername', 'jirapassword', 'boardname', 'boardid', 'jiralink')]
+	workflow = None
+	if config.has_section('workflow'):
+		workflow = parse_workflow([value for key, value in config.items('workflow')])
+	settings.append(workflow)
+	settings.append(config.getint('jiraout', 'maxworkers', fallback=MAX_WORKERS))
+	settings.append(config.getfloat('jiraout', 'matchthreshold', fallback=MATCH_THRESHOLD))
+	settings.append({
+		'descriptionFormat': read_description_format(config),
+		'attachmentBudget': config.getint('attachments', 'maxbytes', fallback=ATTACHMENT_BUDGET),
+	})
+	settings.append(read_profiles(config, config.get('jiraout', 'jiraid')))
+	return tuple(settings)
+
+# This function runs one sync from the command line, or plans one with --dry-run
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Syncs outlook tasks to a Jira Kanban board.')
+	parser.add_argument('--config', default=CONFIG_FILE, help='configuration file saved by the UI')
+	parser.add_argument('--dry-run', action='store_true', help='plan the changes of the cycle without touching Jira')
+	parser.add_argument('--plan', help='file to save the plan to as JSON, printed when not given')
+	args = parser.parse_args(argv)
+
+	config = ConfigParser()
+	if not config.read(args.config):
+		parser.error('Configuration file {0} not found.'.format(args.config))
+	configure_logging(config)
+	engine = create_engine(read_settings(config))
+	try:
+		if not args.dry_run:
+			return 0 if engine.sync() else 1
+		plan = engine.dry_run()
+		if plan is None:
+			return 1
+		if isinstance(plan, SyncPlan):
+			text = plan.to_json()
+		else:
+			# One plan per board
+			text = json.dumps(OrderedDict((name, boardPlan.to_dict()) for name, boardPlan in plan.items()), indent=2)
+		if args.plan:
+			with open(args.plan, 'w') as f:
+				f.write(text + '\n')
+		else:
+			print(text)
+		return 0
+	finally:
+		engine.close()
+
+if __name__ == '__main__':
+	sys.exit(main())
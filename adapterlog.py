@@ -0,0 +1,90 @@
+'''
+Purpose - Logging setup of the adapter.
+
+Configured once per process. Records are put on a queue by the sync threads
+and written by a QueueListener thread, so file I/O never runs on the sync
+path. The log file is rotated by size. Records can be written as plain text or
+as one JSON object per line.
+
+Console output goes through the same listener. In quiet mode the console only
+shows warnings and errors, the per-task lines are dropped.
+
+'''
+
+import atexit
+import json
+import logging
+import queue
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Name of the adapter's logger
+LOGGER_NAME = 'JiraOutAdapter'
+# Log file and format of the adapter
+LOGFILE = 'jira-adapter.log'
+LOGFORMAT = '[%(asctime)s - %(levelname)s: %(funcName)20s()] %(message)s'
+# The log file is rotated at this size, keeping this many old files
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+
+_listener = None
+_queueHandler = None
+
+# This class writes every record as one JSON object per line
+class JsonFormatter(logging.Formatter):
+	def format(self, record):
+		entry = {
+			'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)),
+			'level': record.levelname,
+			'logger': record.name,
+			'thread': record.threadName,
+			'function': record.funcName,
+			'message': record.getMessage().strip(),
+		}
+		if record.exc_info:
+			entry['exception'] = self.formatException(record.exc_info)
+		return json.dumps(entry)
+
+# This class queues records as they are. They stay in this process, so the message and traceback
+# are only formatted on the listener thread.
+class LocalQueueHandler(QueueHandler):
+	def prepare(self, record):
+		return record
+
+# This class shows only the message on the console, tracebacks are left to the log file
+class ConsoleFormatter(logging.Formatter):
+	def format(self, record):
+		return record.getMessage()
+
+# This function configures the adapter's logging. Only the first call has an effect.
+def setup_logging(logfile=LOGFILE, structured=False, quiet=False, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT):
+	global _listener, _queueHandler
+	logger = logging.getLogger(LOGGER_NAME)
+	if _listener is not None:
+		return logger
+	fileHandler = RotatingFileHandler(logfile, maxBytes=maxBytes, backupCount=backupCount)
+	fileHandler.setFormatter(JsonFormatter() if structured else logging.Formatter(LOGFORMAT))
+	consoleHandler = logging.StreamHandler(sys.stdout)
+	consoleHandler.setFormatter(ConsoleFormatter())
+	# Only the adapter's own records are shown on the console
+	consoleHandler.addFilter(logging.Filter(LOGGER_NAME))
+	consoleHandler.setLevel(logging.WARNING if quiet else logging.INFO)
+	records = queue.Queue(-1)
+	_listener = QueueListener(records, fileHandler, consoleHandler, respect_handler_level=True)
+	_queueHandler = LocalQueueHandler(records)
+	root = logging.getLogger()
+	root.addHandler(_queueHandler)
+	root.setLevel(logging.INFO)
+	_listener.start()
+	# Records still on the queue are written before the process exits
+	atexit.register(stop_logging)
+	return logger
+
+def stop_logging():
+	global _listener, _queueHandler
+	if _listener is not None:
+		logging.getLogger().removeHandler(_queueHandler)
+		_listener.stop()
+		_listener = None
+		_queueHandler = None
@@ -0,0 +1,205 @@
+'''
+Purpose - Scale benchmark of the sync cycle.
+
+Runs SyncEngine against the local Jira stand-in (fakejira.py) and a synthetic
+outlook task source, for several task list sizes. Each size runs a cold cycle
+(empty sync state) and a warm one right after it. For every phase it reports
+wall time, Jira requests per endpoint and peak memory. Peak memory is traced
+for the whole process, so it includes the stand-in server.
+
+Request counts are compared against a stored baseline and the run fails when a
+phase needs more requests than before. Use the baseline only with no error
+injection, as injected failures add retries.
+
+Usage:
+	python benchmark.py [--sizes 10 1000 10000] [--latency 0.005] [--error-rate 0] [--webhooks]
+						[--baseline benchmark_baseline.json] [--update-baseline] [--output results.json]
+
+'''
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timedelta
+
+import PyJiraOut
+from adapterlog import setup_logging
+from fakejira import FakeJira
+from tasksource import FakeTaskSource
+from webhooks import WebhookReceiver
+
+BASELINE_FILE = 'benchmark_baseline.json'
+# Allowed growth of a request count over the baseline before the run fails
+TOLERANCE = 0.1
+# Phase names for the progress texts of SyncEngine.sync
+PHASES = (
+	('Connecting', 'connect'),
+	('Checking tasks', 'check'),
+	('Creating', 'create'),
+	('Updating', 'update'),
+	('Archiving', 'archive'),
+	('Moving', 'transition'),
+	('Reading Jira changes', 'reverse'),
+	('Completing', 'complete'),
+	('Uploading', 'attachments'),
+)
+
+# This class times the phases of a cycle, using the progress texts of the engine
+class PhaseRecorder(object):
+	def __init__(self, jira):
+		self.jira = jira
+		self.phases = {}
+		self.current = None
+
+	def progress(self, text):
+		self.finish()
+		for prefix, phase in PHASES:
+			if text.startswith(prefix):
+				self.current = phase
+				self.started = time.perf_counter()
+				self.requests = Counter(self.jira.counts_by_endpoint())
+				tracemalloc.reset_peak()
+				return
+
+	def finish(self):
+		if self.current is None:
+			return
+		requests = self.jira.counts_by_endpoint()
+		requests.subtract(self.requests)
+		requests = dict((endpoint, count) for endpoint, count in requests.items() if count > 0)
+		self.phases[self.current] = {
+			'seconds': round(time.perf_counter() - self.started, 3),
+			'requests': sum(requests.values()),
+			'endpoints': requests,
+			'peak_kb': tracemalloc.get_traced_memory()[1] // 1024,
+		}
+		self.current = None
+
+# This function fills the fake board and task source for a task list of the given size.
+# About 60% of the open tasks already have an issue, the rest are new. A tenth of the tasks is
+# completed in outlook, and a tenth of the size in Done issues is due for archiving.
+def synthetic_board(jira, source, size, seed=0):
+	generator = random.Random(seed)
+	lastModified = datetime.now() - timedelta(days=1)
+	words = ['deploy', 'review', 'backup', 'report', 'server', 'release', 'invoice', 'meeting', 'audit', 'patch']
+	for number in range(size):
+		subject = '{0} {1} {2}'.format(generator.choice(words), generator.choice(words), number)
+		complete = number % 10 == 9
+		if complete or generator.random() < 0.6:
+			jira.add_issue(subject, status=generator.choice(['NS', 'WIP', 'Ready']), assignee='bench')
+		source.add('ENTRY{0}'.format(number), subject, body='Body of task {0}\n'.format(number) * 5,
+					complete=complete, lastModified=lastModified)
+	resolved = datetime.now() - timedelta(weeks=2)
+	for number in range(size // 10):
+		jira.add_issue('archived task {0}'.format(number), status='Done', assignee='bench', resolved=resolved)
+
+def run_size(size, latency, errorRate, webhooks=False):
+	jira = FakeJira(latency=latency, errorRate=errorRate, seed=size)
+	url = jira.start()
+	source = FakeTaskSource()
+	synthetic_board(jira, source, size)
+	receiver = None
+	if webhooks:
+		# The stand-in sends its changes to a local receiver, as Jira would
+		receiver = WebhookReceiver(host='127.0.0.1', port=0)
+		jira.send_webhooks(receiver.start())
+	workdir = tempfile.mkdtemp(prefix='jira-bench-')
+	cwd = os.getcwd()
+	os.chdir(workdir)
+	results = {}
+	try:
+		engine = PyJiraOut.SyncEngine('bench', 'bench', 'bench', 'Bench', 'P', url, source=source)
+		if receiver is not None:
+			engine.enable_webhooks(receiver)
+		for cycle in ('cold', 'warm'):
+			recorder = PhaseRecorder(jira)
+			started = time.perf_counter()
+			engine.sync(progress=recorder.progress)
+			recorder.finish()
+			results[cycle] = {
+				'seconds': round(time.perf_counter() - started, 3),
+				'requests': sum(phase['requests'] for phase in recorder.phases.values()),
+				'phases': recorder.phases,
+			}
+		engine.close()
+	finally:
+		os.chdir(cwd)
+		jira.stop()
+		if receiver is not None:
+			receiver.stop()
+		shutil.rmtree(workdir, ignore_errors=True)
+	return results
+
+def report(size, results):
+	print('\n{0} tasks'.format(size))
+	print('  {0:<6} {1:<11} {2:>9} {3:>9} {4:>10}  {5}'.format('cycle', 'phase', 'seconds', 'requests', 'peak KB', 'endpoints'))
+	for cycle, result in results.items():
+		for phase, values in result['phases'].items():
+			endpoints = ', '.join('{0}={1}'.format(endpoint, count) for endpoint, count in sorted(values['endpoints'].items()))
+			print('  {0:<6} {1:<11} {2:>9.3f} {3:>9} {4:>10}  {5}'.format(cycle, phase, values['seconds'], values['requests'], values['peak_kb'], endpoints))
+		print('  {0:<6} {1:<11} {2:>9.3f} {3:>9}'.format(cycle, 'total', result['seconds'], result['requests']))
+
+# Returns the phases needing more requests than the baseline allows, as text
+def regressions(allResults, baseline):
+	found = []
+	for size, results in allResults.items():
+		for cycle, result in results.items():
+			for phase, values in result['phases'].items():
+				allowed = baseline.get(str(size), {}).get(cycle, {}).get(phase)
+				if allowed is not None and values['requests'] > allowed * (1 + TOLERANCE):
+					found.append('{0} tasks, {1} {2}: {3} requests, baseline {4}'.format(size, cycle, phase, values['requests'], allowed))
+	return found
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Scale benchmark of the Jira-Outlook sync cycle.')
+	parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 10000])
+	parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every Jira response')
+	parser.add_argument('--error-rate', type=float, default=0.0, help='share of Jira requests failed with 503')
+	parser.add_argument('--webhooks', action='store_true', help='keep the issues fresh through webhooks instead of searches')
+	parser.add_argument('--baseline', default=BASELINE_FILE)
+	parser.add_argument('--update-baseline', action='store_true')
+	parser.add_argument('--output', help='file to write the full results to as JSON')
+	args = parser.parse_args(argv)
+
+	# The per-task lines of the engine are dropped, and the log goes out of the way
+	setup_logging(logfile=os.path.join(tempfile.gettempdir(), 'jira-adapter-benchmark.log'), quiet=True)
+	tracemalloc.start()
+	allResults = {}
+	for size in args.sizes:
+		allResults[size] = run_size(size, args.latency, args.error_rate, args.webhooks)
+		report(size, allResults[size])
+
+	if args.output:
+		with open(args.output, 'w') as f:
+			json.dump(allResults, f, indent=2)
+
+	baseline = {}
+	if os.path.exists(args.baseline):
+		with open(args.baseline) as f:
+			baseline = json.load(f)
+	if args.update_baseline:
+		for size, results in allResults.items():
+			baseline[str(size)] = dict((cycle, dict((phase, values['requests']) for phase, values in result['phases'].items()))
+										for cycle, result in results.items())
+		with open(args.baseline, 'w') as f:
+			json.dump(baseline, f, indent=2, sort_keys=True)
+		print('\nBaseline written to {0}'.format(args.baseline))
+		return 0
+
+	found = regressions(allResults, baseline)
+	if found:
+		print('\nRequest count regressions:')
+		for line in found:
+			print('  ' + line)
+		return 1
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,67 @@
+'''
+Purpose - Board profiles, for syncing several Kanban boards from one process.
+
+Besides the board of the [jiraout] section, adapter_config.ini can hold one
+[board:<name>] section per extra board:
+
+	[board:ops]
+	boardname = Operations
+	boardid = 10200
+	categories = Ops, Servers
+	folder = Projects/Ops
+	jiraid = ops.lead
+	label = OutlookTasks
+
+A task goes to the first board having one of its outlook categories, from
+whichever folder it was read. Other tasks of a board's folder, a path below
+the default Tasks folder, go to the first board with that folder. Tasks
+routed nowhere go to the board of the [jiraout] section. jiraid, label and
+the [workflow] section default to those of the [jiraout] section.
+
+'''
+
+from collections import namedtuple, OrderedDict
+
+from tasksource import task_categories
+
+# Label put on the issues created by the adapter
+DEFAULT_LABEL = 'OutlookTasks'
+# Prefix of the board sections in adapter_config.ini
+BOARD_SECTION = 'board:'
+# Name of the profile made from the [jiraout] section
+DEFAULT_PROFILE = 'default'
+
+# One board to sync. categories is a tuple of outlook categories, folder None for the To-Do list.
+BoardProfile = namedtuple('BoardProfile', ['name', 'boardName', 'boardID', 'assignee', 'label', 'categories', 'folder'])
+
+# This function reads the [board:<name>] sections. defaultAssignee is the jiraid of the [jiraout] section.
+def read_profiles(config, defaultAssignee):
+	profiles = []
+	for section in config.sections():
+		if not section.startswith(BOARD_SECTION):
+			continue
+		categories = config.get(section, 'categories', fallback='')
+		profiles.append(BoardProfile(
+			name=section[len(BOARD_SECTION):].strip(),
+			boardName=config.get(section, 'boardname'),
+			boardID=config.get(section, 'boardid'),
+			assignee=config.get(section, 'jiraid', fallback=defaultAssignee),
+			label=config.get(section, 'label', fallback=DEFAULT_LABEL),
+			categories=tuple(category.strip() for category in categories.split(',') if category.strip()),
+			folder=config.get(section, 'folder', fallback=None) or None))
+	return tuple(profiles)
+
+# This function splits the tasks read from one folder between the profiles.
+# Returns {profile name: tasks}. Profiles are tried in order by category, then the folder's board and the default profile take what is left.
+def route_tasks(profiles, tasks, folder=None):
+	routed = OrderedDict((profile.name, []) for profile in profiles)
+	if folder is None:
+		fallback = next((profile for profile in profiles if profile.name == DEFAULT_PROFILE), None)
+	else:
+		fallback = next((profile for profile in profiles if profile.folder == folder), None)
+	for task in tasks:
+		categories = set(task_categories(task))
+		target = next((profile for profile in profiles if categories.intersection(profile.categories)), fallback)
+		if target is not None:
+			routed[target.name].append(task)
+	return routed
@@ -0,0 +1,181 @@
+'''
+Purpose - Turns the body of an outlook task into the description of its issue.
+
+The body is read line by line through a chain of generators, so the text
+after a cut is never looked at:
+1. Quoted replies are dropped from the first reply header ("From:" followed by
+   "Sent:", "-----Original Message-----", "On ... wrote:") and lines quoted
+   with ">". When the body starts with a forwarded mail, that mail is kept up
+   to the next header.
+2. The signature is dropped from the "-- " delimiter or a "Sent from my" line,
+   when only a few lines follow it. Anything longer is text of the task.
+3. The plain text is converted to Jira wiki markup: bullets and numbered lines
+   become lists, outlook's <link> and <mailto:> artifacts become links, and
+   characters starting wiki macros, and backslashes, are escaped.
+4. The description is cut at maxchars. The full body is then attached to the
+   issue as a text file.
+
+	[description]
+	maxchars = 16000
+	stripquotes = yes
+	stripsignature = yes
+	wiki = yes
+	attachfull = yes
+
+'''
+
+import io
+import re
+from collections import namedtuple, deque
+
+# Jira refuses descriptions over 32767 characters, the default cap stays well below
+MAX_CHARS = 16000
+# Name of the attachment holding the full body of a shortened description
+FULL_BODY_FILENAME = 'outlook-body.txt'
+
+# How descriptions are made from task bodies
+DescriptionFormat = namedtuple('DescriptionFormat', ['maxChars', 'stripQuotes', 'stripSignature', 'wiki', 'attachFull'])
+DEFAULT_FORMAT = DescriptionFormat(MAX_CHARS, True, True, True, True)
+# The description, and the full body to attach when the description was shortened
+Description = namedtuple('Description', ['text', 'original'])
+
+REPLY_HEADERS = (
+	re.compile(r'^-{2,}\s*(Original|Forwarded) Message\s*-{2,}\s*$', re.I),
+	re.compile(r'^On .{4,200} wrote:\s*$'),
+	re.compile(r'^_{20,}\s*$'),
+)
+# "From:" starts a reply header only when one of these follows it
+FROM_LINE = re.compile(r'^\s*\*?From:\*?\s', re.I)
+HEADER_FIELD = re.compile(r'^\s*\*?(Sent|Date|To):\*?\s', re.I)
+# The signature delimiter of RFC 3676 keeps its trailing space, a bare "--" is text
+SIGNATURE = re.compile(r'^(-- |Sent from my .*)$')
+# Lines a signature has at most after its delimiter
+SIGNATURE_LINES = 10
+BULLET = re.compile(r'^\s*[•·▪●\-\*o]\s+(?=\S)')
+NUMBERED = re.compile(r'^\s*\d{1,3}[.)]\s+(?=\S)')
+MAILTO = re.compile(r'\s*<mailto:[^>]*>')
+LINK = re.compile(r'<((?:https?|ftp)://[^>\s]+)>')
+# Characters starting macros, links and tables in wiki markup
+WIKI_SPECIAL = re.compile(r'([{}\[\]|\\])')
+
+# This function gives the description of a task body
+def render_description(body, rules=DEFAULT_FORMAT):
+	if not body:
+		return Description(body or '', None)
+	lines = iter_lines(body)
+	if rules.stripQuotes:
+		lines = strip_quoted(lines)
+	if rules.stripSignature:
+		lines = strip_signature(lines)
+	if rules.wiki:
+		lines = wiki_lines(lines)
+	text, shortened = cap_lines(squeeze_blank(line.rstrip() for line in lines), rules.maxChars, rules.attachFull)
+	return Description(text, body if shortened and rules.attachFull else None)
+
+# Trailing spaces are kept up to the signature, they tell the delimiter from a bare "--"
+def iter_lines(text):
+	for line in io.StringIO(text):
+		yield line.rstrip('\r\n')
+
+# Drops quoted replies. A reply header before any text of the task's own starts a forwarded mail, which is kept.
+def strip_quoted(lines):
+	ownText = False
+	# Inside the header of the forwarded mail, where a From: and Sent: belong to the same header
+	inHeader = False
+	pending = None
+	for line in lines:
+		if pending is not None:
+			if HEADER_FIELD.match(line) and not inHeader:
+				if ownText:
+					return
+				inHeader = True
+			ownText = True
+			yield pending
+			pending = None
+		if line.startswith('>'):
+			continue
+		if FROM_LINE.match(line):
+			pending = line
+			continue
+		if any(header.match(line) for header in REPLY_HEADERS):
+			if ownText:
+				return
+			ownText = inHeader = True
+			yield line
+			continue
+		if line.strip():
+			ownText = True
+		else:
+			inHeader = False
+		yield line
+	if pending is not None:
+		yield pending
+
+# Drops the signature at the end of the body. The lines after a delimiter are held until they are too many for a signature.
+def strip_signature(lines):
+	held = deque()
+	for line in lines:
+		if held or SIGNATURE.match(line):
+			held.append(line)
+		else:
+			yield line
+		if len(held) > SIGNATURE_LINES + 1:
+			yield held.popleft()
+			while held and not SIGNATURE.match(held[0]):
+				yield held.popleft()
+
+def wiki_lines(lines):
+	for line in lines:
+		line = MAILTO.sub('', line)
+		line = WIKI_SPECIAL.sub(r'\\\1', line)
+		line = LINK.sub(r'[\1]', line)
+		if BULLET.match(line):
+			line = BULLET.sub('* ', line, count=1)
+		elif NUMBERED.match(line):
+			line = NUMBERED.sub('# ', line, count=1)
+		yield line
+
+# Keeps at most one blank line in a row, and none at the start or the end
+def squeeze_blank(lines):
+	blank = False
+	started = False
+	for line in lines:
+		if not line.strip():
+			blank = started
+			continue
+		if blank:
+			yield ''
+		blank = False
+		started = True
+		yield line
+
+# Joins the lines up to maxChars. Returns the text and True when it was shortened.
+def cap_lines(lines, maxChars, attached):
+	kept = []
+	size = -1
+	for line in lines:
+		size += len(line) + 1
+		kept.append(line)
+		if size > maxChars:
+			break
+	else:
+		return '\n'.join(kept), False
+	notice = '\n\n_The description was shortened{0}._'.format(
+		', the full text is attached as ' + FULL_BODY_FILENAME if attached else '')
+	room = max(maxChars - len(notice), 0)
+	text = '\n'.join(kept)[:room + 1]
+	# Cut at the end of a line when there is one
+	end = text.rfind('\n')
+	text = text[:end] if end > 0 else text[:room]
+	return text.rstrip() + notice, True
+
+# This function reads the optional [description] section
+def read_description_format(config):
+	if not config.has_section('description'):
+		return DEFAULT_FORMAT
+	return DescriptionFormat(
+		maxChars=config.getint('description', 'maxchars', fallback=MAX_CHARS),
+		stripQuotes=config.getboolean('description', 'stripquotes', fallback=True),
+		stripSignature=config.getboolean('description', 'stripsignature', fallback=True),
+		wiki=config.getboolean('description', 'wiki', fallback=True),
+		attachFull=config.getboolean('description', 'attachfull', fallback=True))
@@ -0,0 +1,381 @@
+'''
+Purpose - Local stand-in for the Jira REST API, used by the benchmarks.
+
+Serves the part of /rest/api/2 the adapter uses: server info, search, issue,
+bulk create, update, comments, attachments, transitions and the create
+metadata (issue types, create fields, priorities and components). Every response can
+be delayed by a fixed latency and a share of requests can be failed with 503,
+to see how the adapter behaves on a slow or flaky link. Requests are counted
+per endpoint and status. Changes of the board can be sent as webhooks to the
+adapter's receiver.
+
+The JQL understood is the subset the adapter sends: "and" joined clauses on
+project, assignee, labels, key, status, resolutiondate and updated.
+
+'''
+
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import urlparse, parse_qs
+
+from webhooks import replay_events
+
+# Workflow of the fake board, same as the adapter's default one
+WORKFLOW = {
+	'NS': {'Move From NS to WIP': 'WIP'},
+	'Deferred': {'Deferred to WIP': 'WIP'},
+	'WIP': {'WIP to Ready': 'Ready'},
+	'Ready': {'Ready to Done': 'Done'},
+	'Done': {'Done to Archive': 'Archive'},
+}
+API = '/rest/api/2/'
+# Create metadata of the fake project
+ISSUE_TYPES = {'10001': 'Story', '10002': 'Task', '10003': 'Bug'}
+PRIORITIES = {'1': 'Highest', '2': 'High', '3': 'Medium', '4': 'Low', '5': 'Lowest'}
+COMPONENTS = {'10100': 'Maintenance Tasks'}
+# {field ID: (required, has a default value)} of the create screen of every issue type
+CREATE_FIELDS = {
+	'project': (True, False),
+	'issuetype': (True, False),
+	'summary': (True, False),
+	'reporter': (True, True),
+	'description': (False, False),
+	'priority': (False, True),
+	'components': (False, False),
+	'labels': (False, False),
+	'assignee': (False, False),
+}
+JQL_TIME_FORMAT = '%Y/%m/%d %H:%M'
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+	daemon_threads = True
+
+class FakeJira(object):
+	def __init__(self, latency=0.0, errorRate=0.0, seed=None):
+		self.latency = latency
+		self.errorRate = errorRate
+		self.random = random.Random(seed)
+		self.issues = {}
+		self.nextID = 10000
+		self.transitionIDs = {}
+		# Create metadata, which tests can change to set up a misconfigured project
+		self.issueTypes = dict(ISSUE_TYPES)
+		self.priorities = dict(PRIORITIES)
+		self.components = dict(COMPONENTS)
+		self.createFields = dict(CREATE_FIELDS)
+		for status, transitions in WORKFLOW.items():
+			for name in transitions:
+				self.transitionIDs[name] = str(len(self.transitionIDs) + 1)
+		self.requests = Counter()
+		# Results of the last search, reused while the board is unchanged so that paging stays cheap
+		self.version = 0
+		self.lastSearch = (None, None, None)
+		self.lock = threading.Lock()
+		self.server = None
+		self.url = None
+		# Called with (event, issue) when an issue changes, used to emit webhooks
+		self.listeners = []
+
+	# Adds an issue straight to the fake board, without going through the API
+	def add_issue(self, summary, status='NS', labels=('OutlookTasks',), assignee=None, project='P', description='', resolved=None, updated=None):
+		with self.lock:
+			self.nextID += 1
+			self.version += 1
+			key = '{0}-{1}'.format(project, self.nextID)
+			self.issues[key] = {
+				'id': str(self.nextID),
+				'key': key,
+				'project': project,
+				'summary': summary,
+				'description': description,
+				'status': status,
+				'labels': list(labels),
+				'assignee': assignee,
+				'resolved': resolved,
+				'updated': updated or datetime.now(),
+				'comments': [],
+				'attachments': [],
+			}
+		return self.issues[key]
+
+	def start(self):
+		self.server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(self))
+		self.url = 'http://127.0.0.1:{0}'.format(self.server.server_address[1])
+		threading.Thread(target=self.server.serve_forever, daemon=True).start()
+		return self.url
+
+	def stop(self):
+		if self.server is not None:
+			self.server.shutdown()
+			self.server.server_close()
+			self.server = None
+
+	def reset_counts(self):
+		with self.lock:
+			self.requests.clear()
+
+	# Returns {endpoint: count} summed over statuses
+	def counts_by_endpoint(self):
+		counts = Counter()
+		for (endpoint, status), count in self.requests.items():
+			counts[endpoint] += count
+		return counts
+
+	def notify(self, event, issue):
+		for listener in self.listeners:
+			listener(event, issue)
+
+	# Payload of the webhook Jira sends for an event on the issue
+	def webhook_payload(self, event, issue):
+		return {'timestamp': int(time.time() * 1000), 'webhookEvent': event, 'issue': self.issue_json(issue)}
+
+	# Sends webhooks for the changes of the board to a receiver, and records their payloads in recorded when given
+	def send_webhooks(self, url, recorded=None):
+		def send(event, issue):
+			payload = self.webhook_payload(event, issue)
+			if recorded is not None:
+				recorded.append(payload)
+			replay_events(url, [payload])
+		self.listeners.append(send)
+
+	# Deletes an issue straight from the fake board
+	def delete_issue(self, key):
+		with self.lock:
+			issue = self.issues.pop(key)
+			self.version += 1
+		self.notify('jira:issue_deleted', issue)
+
+	def issue_json(self, issue, fields=None):
+		allFields = {
+			'summary': issue['summary'],
+			'description': issue['description'],
+			'status': {'name': issue['status']},
+			'labels': issue['labels'],
+			'assignee': {'name': issue['assignee']} if issue['assignee'] else None,
+			'project': {'key': issue['project']},
+			'resolutiondate': issue['resolved'].strftime('%Y-%m-%dT%H:%M:%S.000+0000') if issue['resolved'] else None,
+			'updated': issue['updated'].strftime('%Y-%m-%dT%H:%M:%S.000+0000'),
+			'comment': {'comments': [{'body': body} for body in issue['comments']], 'total': len(issue['comments'])},
+			'attachment': [{'filename': name, 'size': size} for name, size in issue['attachments']],
+		}
+		if fields and '*all' not in fields:
+			allFields = dict((name, value) for name, value in allFields.items() if name in fields)
+		return {'id': issue['id'], 'key': issue['key'], 'self': '{0}{1}issue/{2}'.format(self.url, API, issue['id']), 'fields': allFields}
+
+	def find(self, keyOrID):
+		if keyOrID in self.issues:
+			return self.issues[keyOrID]
+		for issue in self.issues.values():
+			if issue['id'] == keyOrID:
+				return issue
+		return None
+
+	def search(self, jql):
+		if self.lastSearch[:2] == (jql, self.version):
+			return self.lastSearch[2]
+		matches = self.run_search(jql)
+		self.lastSearch = (jql, self.version, matches)
+		return matches
+
+	def run_search(self, jql):
+		jql = re.split(r'\s+order\s+by\s+', jql, flags=re.IGNORECASE)[0]
+		clauses = [clause.strip() for clause in re.split(r'\s+and\s+', jql, flags=re.IGNORECASE) if clause.strip()]
+		matches = [issue for issue in self.issues.values() if all(jql_match(issue, clause) for clause in clauses)]
+		return sorted(matches, key=lambda issue: int(issue['id']))
+
+	# Marks the issue as changed
+	def touch(self, issue):
+		issue['updated'] = datetime.now()
+		self.version += 1
+
+	def set_status(self, issue, status):
+		issue['status'] = status
+		self.touch(issue)
+		if status == 'Done' and not issue['resolved']:
+			issue['resolved'] = datetime.now()
+		self.notify('jira:issue_updated', issue)
+
+# This function tells if an issue fulfils one JQL clause. Unknown clauses match everything.
+def jql_match(issue, clause):
+	listClause = re.match(r'(\w+)\s+(not\s+in|in)\s*\((.*)\)$', clause, re.IGNORECASE)
+	if listClause:
+		field, operator, values = listClause.groups()
+		values = [value.strip().strip('"\'') for value in values.split(',')]
+		value = field_value(issue, field)
+		inList = any(item in values for item in value) if isinstance(value, list) else value in values
+		return inList if operator.lower() == 'in' else not inList
+	compare = re.match(r'(\w+)\s*(<=|>=|=|~)\s*(.*)$', clause)
+	if not compare:
+		return True
+	field, operator, value = compare.groups()
+	value = value.strip().strip('"\'')
+	if field.lower() in ('resolutiondate', 'updated'):
+		when = field_value(issue, field)
+		limit = jql_time(value)
+		if when is None:
+			return False
+		return when <= limit if operator == '<=' else when >= limit
+	current = field_value(issue, field)
+	if operator == '~':
+		return value.lower() in (current or '').lower()
+	if isinstance(current, list):
+		return value in current
+	return current == value
+
+def field_value(issue, field):
+	field = field.lower()
+	if field == 'resolutiondate':
+		return issue['resolved']
+	return issue.get(field)
+
+# This function reads JQL times, either relative like -1w or absolute like "2018/04/08 10:00"
+def jql_time(value):
+	relative = re.match(r'^-(\d+)([wdhm])$', value)
+	if relative:
+		amount, unit = int(relative.group(1)), relative.group(2)
+		delta = {'w': timedelta(weeks=amount), 'd': timedelta(days=amount), 'h': timedelta(hours=amount), 'm': timedelta(minutes=amount)}[unit]
+		return datetime.now() - delta
+	return datetime.strptime(value, JQL_TIME_FORMAT)
+
+# This function gives the transitions available from the status of an issue
+def issue_transitions(jira, issue):
+	return [{'id': jira.transitionIDs[name], 'name': name, 'to': {'name': status}} for name, status in WORKFLOW.get(issue['status'], {}).items()]
+
+def make_handler(jira):
+	class Handler(BaseHTTPRequestHandler):
+		def log_message(self, *args):
+			pass
+
+		def do_GET(self):
+			self.handle_request('GET')
+
+		def do_POST(self):
+			self.handle_request('POST')
+
+		def do_PUT(self):
+			self.handle_request('PUT')
+
+		def handle_request(self, method):
+			url = urlparse(self.path)
+			path = url.path[len(API):] if url.path.startswith(API) else url.path
+			params = dict((name, ','.join(values) if name == 'fields' else values[-1]) for name, values in parse_qs(url.query).items())
+			length = int(self.headers.get('Content-Length') or 0)
+			body = self.rfile.read(length) if length else b''
+			endpoint = '{0} {1}'.format(method, re.sub(r'issue/(?!bulk$|createmeta/)[^/]+', 'issue/{key}', path))
+			if jira.latency:
+				time.sleep(jira.latency)
+			if jira.errorRate and path != 'serverInfo' and jira.random.random() < jira.errorRate:
+				return self.reply(endpoint, 503, {'errorMessages': ['Injected failure']})
+			try:
+				status, payload = self.route(method, path, params, body)
+			except Exception as ex:
+				status, payload = 500, {'errorMessages': [str(ex)]}
+			self.reply(endpoint, status, payload)
+
+		def reply(self, endpoint, status, payload):
+			with jira.lock:
+				jira.requests[(endpoint, status)] += 1
+			data = json.dumps(payload).encode('utf-8') if payload is not None else b''
+			self.send_response(status)
+			self.send_header('Content-Type', 'application/json')
+			self.send_header('Content-Length', str(len(data)))
+			self.end_headers()
+			self.wfile.write(data)
+
+		def route(self, method, path, params, body):
+			if path == 'serverInfo':
+				return 200, {'baseUrl': jira.url, 'version': '8.20.0', 'versionNumbers': [8, 20, 0], 'deploymentType': 'Server'}
+			if path == 'field':
+				return 200, [{'id': name, 'key': name, 'name': name.capitalize(), 'custom': False, 'clauseNames': [name]} for name in ('summary', 'description', 'status', 'labels', 'assignee', 'updated', 'resolutiondate', 'comment', 'attachment')]
+			if path == 'search':
+				if method == 'POST':
+					params = json.loads(body.decode('utf-8'))
+				with jira.lock:
+					matches = jira.search(params.get('jql', ''))
+				startAt = int(params.get('startAt', 0))
+				maxResults = int(params.get('maxResults', 50))
+				fields = params.get('fields')
+				if isinstance(fields, str):
+					fields = fields.split(',')
+				page = [jira.issue_json(issue, fields) for issue in matches[startAt:startAt + maxResults]]
+				return 200, {'startAt': startAt, 'maxResults': maxResults, 'total': len(matches), 'issues': page}
+			if path == 'issue/bulk' and method == 'POST':
+				created = []
+				for update in json.loads(body.decode('utf-8'))['issueUpdates']:
+					fields = update['fields']
+					issue = jira.add_issue(fields['summary'], labels=fields.get('labels', []),
+								assignee=(fields.get('assignee') or {}).get('name'),
+								project=(fields.get('project') or {}).get('key') or (fields.get('project') or {}).get('id') or 'P',
+								description=fields.get('description', ''))
+					jira.notify('jira:issue_created', issue)
+					created.append({'id': issue['id'], 'key': issue['key'], 'self': '{0}{1}issue/{2}'.format(jira.url, API, issue['id'])})
+				return 201, {'issues': created, 'errors': []}
+			if path == 'issue' and method == 'POST':
+				fields = json.loads(body.decode('utf-8'))['fields']
+				issue = jira.add_issue(fields['summary'], labels=fields.get('labels', []), description=fields.get('description', ''))
+				jira.notify('jira:issue_created', issue)
+				return 201, {'id': issue['id'], 'key': issue['key'], 'self': '{0}{1}issue/{2}'.format(jira.url, API, issue['id'])}
+			if path == 'priority':
+				return 200, [{'id': priorityID, 'name': name} for priorityID, name in sorted(jira.priorities.items())]
+			match = re.match(r'project/[^/]+/components$', path)
+			if match:
+				return 200, [{'id': componentID, 'name': name} for componentID, name in sorted(jira.components.items())]
+			match = re.match(r'issue/createmeta/[^/]+/issuetypes(/([^/]+))?$', path)
+			if match:
+				if match.group(2) is None:
+					values = [{'id': typeID, 'name': name} for typeID, name in sorted(jira.issueTypes.items())]
+				elif match.group(2) in jira.issueTypes:
+					values = [{'fieldId': fieldID, 'name': fieldID.capitalize(), 'required': required, 'hasDefaultValue': default}
+								for fieldID, (required, default) in sorted(jira.createFields.items())]
+				else:
+					return 404, {'errorMessages': ['Issue type {0} does not exist'.format(match.group(2))]}
+				return 200, {'startAt': 0, 'maxResults': len(values), 'total': len(values), 'isLast': True, 'values': values}
+			match = re.match(r'issue/([^/]+)(/(\w+))?$', path)
+			if not match:
+				return 404, {'errorMessages': ['Unknown resource {0}'.format(path)]}
+			issue = jira.find(match.group(1))
+			if issue is None:
+				return 404, {'errorMessages': ['Issue does not exist']}
+			resource = match.group(3)
+			if resource is None and method == 'GET':
+				fields = params.get('fields')
+				payload = jira.issue_json(issue, fields.split(',') if fields else None)
+				if 'transitions' in params.get('expand', ''):
+					payload['transitions'] = issue_transitions(jira, issue)
+				return 200, payload
+			if resource is None and method == 'PUT':
+				data = json.loads(body.decode('utf-8'))
+				fields = data.get('fields') or {}
+				for name in ('summary', 'description'):
+					if name in fields:
+						issue[name] = fields[name]
+				for operation in (data.get('update') or {}).get('comment', []):
+					issue['comments'].append(operation['add']['body'])
+				jira.touch(issue)
+				jira.notify('jira:issue_updated', issue)
+				return 204, None
+			if resource == 'transitions' and method == 'GET':
+				return 200, {'transitions': issue_transitions(jira, issue)}
+			if resource == 'transitions' and method == 'POST':
+				transitionID = str(json.loads(body.decode('utf-8'))['transition']['id'])
+				for name, status in WORKFLOW.get(issue['status'], {}).items():
+					if jira.transitionIDs[name] == transitionID:
+						jira.set_status(issue, status)
+						return 204, None
+				return 400, {'errorMessages': ['Transition {0} is not valid from {1}'.format(transitionID, issue['status'])]}
+			if resource == 'comment' and method == 'POST':
+				issue['comments'].append(json.loads(body.decode('utf-8'))['body'])
+				jira.touch(issue)
+				return 201, {'id': str(len(issue['comments'])), 'body': issue['comments'][-1]}
+			if resource == 'attachments' and method == 'POST':
+				issue['attachments'].append(('attachment', len(body)))
+				return 200, [{'id': str(len(issue['attachments'])), 'filename': 'attachment', 'size': len(body)}]
+			return 405, {'errorMessages': ['Method not allowed']}
+	return Handler
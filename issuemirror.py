@@ -0,0 +1,97 @@
+'''
+Purpose - Local mirror of the open issues of a board, kept between runs.
+
+The key, summary, status, resolution date and last update of the board's
+issues are stored in the sync state after every search. A restarted adapter
+loads them and only asks Jira for the issues updated since the last search,
+so its first cycle needs one small query instead of a search of the whole
+board. Issues updated into Closed or Archive drop out of the mirror.
+
+Issues deleted in Jira, or taken off the board by a new assignee or label,
+don't show up in that query. The mirror is replaced by a full search once a
+day for them.
+
+'''
+
+from datetime import datetime
+
+from webhooks import CachedIssue, EXCLUDED_STATUSES, RECONCILE_INTERVAL
+
+class IssueMirror(object):
+	# scope names the board's issues in the sync state, see mirror_scope
+	def __init__(self, state, scope, reconcileInterval=RECONCILE_INTERVAL):
+		self.state = state
+		self.scope = scope
+		self.reconcileInterval = reconcileInterval
+		# {key: issue JSON}, loaded from the sync state on first use
+		self.issues = None
+
+	def __len__(self):
+		return len(self.load().issues)
+
+	# Returns the time from which only the changed issues need to be searched, or None when a full search is due
+	def since(self, now=None):
+		watermark = self.state.get_time('mirror_watermark:' + self.scope)
+		reconciled = self.state.get_time('mirror_reconciled:' + self.scope)
+		if watermark is None or reconciled is None or (now or datetime.now()) - reconciled >= self.reconcileInterval:
+			return None
+		return watermark
+
+	# Replaces the mirror with the result of a full search started at started
+	def replace(self, issues, started):
+		self.issues = dict((raw['key'], raw) for raw in (compact_issue(issue.raw) for issue in issues if getattr(issue, 'raw', None)))
+		self.state.mirror_issues(self.scope, [issue_row(raw) for raw in self.issues.values()], replace=True)
+		self.state.set_time('mirror_watermark:' + self.scope, started)
+		self.state.set_time('mirror_reconciled:' + self.scope, started)
+
+	# Applies the issues updated since the last search, which was started at started. Returns the number of issues changed.
+	def update(self, issues, started):
+		self.load()
+		changed = []
+		dropped = []
+		for issue in issues:
+			raw = compact_issue(issue.raw)
+			if raw['fields']['status']['name'] in EXCLUDED_STATUSES:
+				if self.issues.pop(raw['key'], None) is not None:
+					dropped.append(raw['key'])
+			else:
+				self.issues[raw['key']] = raw
+				changed.append(issue_row(raw))
+		self.state.mirror_issues(self.scope, changed)
+		self.state.unmirror_issues(self.scope, dropped)
+		self.state.set_time('mirror_watermark:' + self.scope, started)
+		return len(changed) + len(dropped)
+
+	def load(self):
+		if self.issues is None:
+			self.issues = dict((row[0], issue_raw(row)) for row in self.state.mirrored_issues(self.scope))
+		return self
+
+	# Drops the issues held in memory, so that they are loaded from the sync state again
+	def unload(self):
+		self.issues = None
+
+	def all_issues(self):
+		return [CachedIssue(raw) for raw in self.load().issues.values()]
+
+# This function names the issues of a board searched with the given assignee and label
+def mirror_scope(project, assignee, label):
+	return '{0}|{1}|{2}'.format(project, assignee, label)
+
+# This function keeps the fields of an issue's JSON the sync needs
+def compact_issue(raw):
+	fields = raw.get('fields') or {}
+	return {'key': raw['key'], 'id': raw.get('id'), 'fields': {
+		'summary': fields.get('summary'),
+		'status': {'name': (fields.get('status') or {}).get('name')},
+		'resolutiondate': fields.get('resolutiondate'),
+		'updated': fields.get('updated'),
+	}}
+
+def issue_row(raw):
+	fields = raw['fields']
+	return (raw['key'], raw['id'], fields['summary'], fields['status']['name'], fields['resolutiondate'], fields['updated'])
+
+def issue_raw(row):
+	key, issueID, summary, status, resolved, updated = row
+	return {'key': key, 'id': issueID, 'fields': {'summary': summary, 'status': {'name': status}, 'resolutiondate': resolved, 'updated': updated}}
@@ -0,0 +1,163 @@
+'''
+Purpose - Jira metadata cached between runs, to create and move issues by ID.
+
+The issue types of the board's project and the fields of their create screen,
+the priorities, the project's components and the transition IDs of each
+status are fetched once and kept in the sync state for a day. The fields of a
+new issue are checked against them before it is sent, and the names of its
+issue type, priority and components are replaced by their IDs. A board set up
+with a missing issue type, priority or component, or a create screen needing
+a field the adapter doesn't set, fails at once with one clear error instead
+of one failed create request per task.
+
+Issue types are read from the createmeta endpoints of Jira Server 8.4 and
+later, or from the older createmeta on Jira Cloud and older servers.
+
+'''
+
+import json
+import threading
+from datetime import datetime, timedelta
+
+# Official Python module from Jira
+from jira.exceptions import JIRAError
+
+from syncstate import TIME_FORMAT
+
+# Metadata is fetched again after this long, in case the project's setup changed
+METADATA_TTL = timedelta(hours=24)
+# Fields set by Jira itself or implied by the request, never on the create screen
+IMPLIED_FIELDS = ('project', 'issuetype')
+
+class MetadataCache(object):
+	def __init__(self, jira, state, project, ttl=METADATA_TTL):
+		self.jira = jira
+		self.state = state
+		self.project = str(project)
+		self.ttl = ttl
+		# Issue types, create fields, priorities and components, None until loaded
+		self.data = None
+		# {status: {transition name: transition ID}}, shared with the TransitionPlanner
+		self.transitionIDs = self.load('jira_transitions:' + self.project) or {}
+		self.lock = threading.Lock()
+
+	# Returns a saved value of the sync state, or None when it is missing or older than the time to live
+	def load(self, name):
+		value = self.state.get_meta(name)
+		if not value:
+			return None
+		saved = json.loads(value)
+		if datetime.now() - datetime.strptime(saved['fetched'], TIME_FORMAT) >= self.ttl:
+			return None
+		return saved['data']
+
+	def save(self, name, data):
+		self.state.set_meta(name, json.dumps({'fetched': datetime.now().strftime(TIME_FORMAT), 'data': data}))
+
+	# Saves the transition IDs, after the planner fetched those of a new status
+	def save_transitions(self):
+		self.save('jira_transitions:' + self.project, self.transitionIDs)
+
+	# Drops the metadata, after it refused issues, so that a fixed project setup is seen on the next cycle
+	def invalidate(self):
+		with self.lock:
+			self.data = None
+			self.state.set_meta('jira_metadata:' + self.project, '')
+
+	# Returns the metadata of the project, fetched when the saved one is missing or too old.
+	# Raises ValueError when the project can't be read with the adapter's account.
+	def metadata(self):
+		with self.lock:
+			if self.data is None:
+				self.data = self.load('jira_metadata:' + self.project)
+			if self.data is None:
+				try:
+					self.data = {
+						'issuetypes': project_issue_types(self.jira, self.project),
+						'fields': {},
+						'priorities': dict((priority.name, priority.id) for priority in self.jira.priorities()),
+						'components': dict((component.name, component.id) for component in self.jira.project_components(self.project)),
+					}
+				except JIRAError as jex:
+					if jex.status_code in (400, 403, 404):
+						raise ValueError('Project {0} can\'t be read - {1}'.format(self.project, jex.text))
+					raise
+				self.save('jira_metadata:' + self.project, self.data)
+			return self.data
+
+	# Returns {field ID: (name, required)} of the create screen of an issue type
+	def create_fields(self, issueTypeID):
+		data = self.metadata()
+		with self.lock:
+			if issueTypeID not in data['fields']:
+				data['fields'][issueTypeID] = issue_type_fields(self.jira, self.project, issueTypeID)
+				self.save('jira_metadata:' + self.project, data)
+			return data['fields'][issueTypeID]
+
+	# Returns the fields of a new issue with its issue type, priority and components given by ID.
+	# Raises ValueError, naming every problem found, when Jira would refuse the issue.
+	def resolve(self, issue_dict):
+		data = self.metadata()
+		fields = dict(issue_dict)
+		errors = []
+		issueType = fields.get('issuetype') or {}
+		if 'name' in issueType:
+			if issueType['name'] in data['issuetypes']:
+				fields['issuetype'] = {'id': data['issuetypes'][issueType['name']]}
+			else:
+				errors.append('Issue type "{0}" is not in the project, it has {1}.'.format(issueType['name'], ', '.join(sorted(data['issuetypes']))))
+		if 'name' in (fields.get('priority') or {}):
+			name = fields['priority']['name']
+			if name in data['priorities']:
+				fields['priority'] = {'id': data['priorities'][name]}
+			else:
+				errors.append('Priority "{0}" doesn\'t exist, there are {1}.'.format(name, ', '.join(sorted(data['priorities']))))
+		components = []
+		for component in fields.get('components') or []:
+			if 'name' not in component:
+				components.append(component)
+			elif component['name'] in data['components']:
+				components.append({'id': data['components'][component['name']]})
+			else:
+				errors.append('Component "{0}" is not in the project.'.format(component['name']))
+		if components:
+			fields['components'] = components
+		if 'id' in fields.get('issuetype', {}):
+			screen = self.create_fields(fields['issuetype']['id'])
+			for name in fields:
+				if name not in screen and name not in IMPLIED_FIELDS:
+					errors.append('Field "{0}" is not on the create screen.'.format(name))
+			for fieldID, (name, required) in sorted(screen.items()):
+				if required and fieldID not in fields and fieldID not in IMPLIED_FIELDS:
+					errors.append('Required field "{0}" is not set.'.format(name))
+		if errors:
+			raise ValueError('Issues can\'t be created in project {0}. {1}'.format(self.project, ' '.join(errors)))
+		return fields
+
+# This function gives {issue type name: ID} of a project
+def project_issue_types(jira, project):
+	try:
+		return dict((issueType.name, issueType.id) for issueType in jira.project_issue_types(project, maxResults=False))
+	except JIRAError as jex:
+		# Raised without a request on Jira Cloud and on servers before 8.4
+		if jex.status_code is not None:
+			raise
+	meta = jira.createmeta(projectIds=[project])
+	projects = meta.get('projects') or []
+	if not projects:
+		raise JIRAError(status_code=404, text='No project {0} to create issues in.'.format(project))
+	return dict((issueType['name'], issueType['id']) for issueType in projects[0]['issuetypes'])
+
+# This function gives {field ID: (name, required)} of the create screen of an issue type.
+# Fields with a default value are not required, Jira sets them.
+def issue_type_fields(jira, project, issueTypeID):
+	try:
+		fields = [field.raw for field in jira.project_issue_fields(project, issueTypeID, maxResults=False)]
+	except JIRAError as jex:
+		if jex.status_code is not None:
+			raise
+		meta = jira.createmeta(projectIds=[project], issuetypeIds=[issueTypeID], expand='projects.issuetypes.fields')
+		fields = [dict(field, fieldId=fieldID) for metaProject in meta.get('projects') or []
+					for issueType in metaProject['issuetypes'] for fieldID, field in issueType.get('fields', {}).items()]
+	return dict((field['fieldId'], (field.get('name') or field['fieldId'], bool(field.get('required')) and not field.get('hasDefaultValue')))
+				for field in fields)
@@ -17,21 +17,80 @@ Features Implemented:
 import sys
 import PyJiraOut
 import jira_rc
+import scheduler
 
 from PyQt5.QtWidgets import (QAction, QApplication, QDialog, QCheckBox,
 		QDialog, QFormLayout, QGroupBox, QHBoxLayout,
 		QLabel, QLineEdit, QMenu, QMenuBar, QPushButton, QTextEdit, QRadioButton,
 		QVBoxLayout, QSystemTrayIcon, QErrorMessage )
 from PyQt5.QtGui import QIcon
-from PyQt5.QtCore import (pyqtSlot, QSize, QTimer, QEventLoop)
+from PyQt5.QtCore import (pyqtSignal, pyqtSlot, Qt, QDateTime, QObject, QSize, QThread, QTimer)
 from configparser import (SafeConfigParser, NoOptionError, NoSectionError)
 from pathlib import Path
+# Official Python module from windows, needed to use outlook from the sync thread
+import pythoncom
+
+# This class runs the syncs on its own thread so that the window and tray icon never block.
+# The engine is created and used only on that thread, as outlook's COM objects are bound to it.
+class SyncWorker(QObject):
+	progress = pyqtSignal(str)
+	# Whether the cycle ran to the end and the number of changes it made
+	finished = pyqtSignal(bool, int)
+	error = pyqtSignal(str)
+
+	def __init__(self):
+		super(SyncWorker, self).__init__()
+		self.engine = None
+		self.settings = None
+		# Webhook receiver keeping the issues of the boards fresh, set by the window when configured
+		self.receiver = None
+		self.comInitialised = False
+
+	@pyqtSlot(tuple)
+	def run(self, settings):
+		synced = False
+		changes = 0
+		try:
+			if not self.comInitialised:
+				pythoncom.CoInitialize()
+				self.comInitialised = True
+			# The engine is made again for new settings, or for a receiver started again with new settings
+			if self.engine is None or self.settings != settings or self.engine.receiver is not self.receiver:
+				self.close()
+				self.engine = PyJiraOut.create_engine(settings)
+				self.settings = settings
+				if self.receiver is not None:
+					self.engine.enable_webhooks(self.receiver)
+			synced = self.engine.sync(progress=self.progress.emit)
+			if self.engine.metrics is not None:
+				changes = self.engine.metrics.changes()
+		except Exception as ex:
+			self.error.emit(str(ex))
+		self.finished.emit(synced, changes)
+
+	# Called from the GUI thread while a sync is running
+	def cancel(self):
+		if self.engine is not None:
+			self.engine.cancel()
+
+	@pyqtSlot()
+	def close(self):
+		if self.engine is not None:
+			self.engine.close()
+			self.engine = None
 
 
 
 class Window(QDialog):
+	syncRequested = pyqtSignal(tuple)
+
 	def __init__(self):
 		super(Window, self).__init__()
+		self.syncRunning = False
+		self.syncCancelled = False
+		self.settings = None
+		self.scheduler = None
+		self.createSyncWorker()
 
 		self.runButton = QPushButton("Run")
 		self.runButton.clicked.connect(self.confirm_btn)
@@ -43,6 +102,7 @@ class Window(QDialog):
 		self.getConfig()
 		self.createSysTrayEntry()
 		self.tray.activated.connect(self.iconActivated)
+		self.resumeSchedule()
 		self.setWindowTitle("JIRA-Outlook Adapter")
 		self.tray.show()		
 		self.showIconCheckBox.toggled.connect(self.tray.setVisible)
@@ -62,21 +122,51 @@ class Window(QDialog):
 			self.runButton.setEnabled(False)
 			
 	def getConfig(self):
+		self.workflow = None
+		self.maxWorkers = PyJiraOut.MAX_WORKERS
+		self.matchThreshold = PyJiraOut.MATCH_THRESHOLD
+		self.options = {'descriptionFormat': PyJiraOut.DEFAULT_FORMAT, 'attachmentBudget': PyJiraOut.ATTACHMENT_BUDGET}
+		self.profiles = ()
+		self.scheduler = scheduler.AdaptiveScheduler().load()
 		configFile = Path('adapter_config.ini')
 		if configFile.exists():
 			config = SafeConfigParser()
 			config.read('adapter_config.ini')
+			# The settings are read the way the command line reads them, [workflow], [description], [attachments]
+			# and [board:<name>] sections included
 			try:
-				self.jiraID.setText(config.get('jiraout', 'jiraid'))
-				self.jiraUsername.setText(config.get('jiraout', 'jirausername'))
-				self.jiraPassword.setText(config.get('jiraout', 'jirapassword'))
-				self.boardName.setText(config.get('jiraout', 'boardname'))
-				self.boardID.setText(config.get('jiraout', 'boardid'))
-				self.jiraLink.setText(config.get('jiraout', 'jiralink'))
+				self.applySettings(PyJiraOut.read_settings(config))
 			except NoSectionError:
 				print("Section Error in the config file")
-			except  NoOptionError:
+			except NoOptionError:
 				print("Option Error in the config file")
+			except ValueError as ex:
+				print("Value Error in the config file - {0}".format(ex))
+			# Optional [schedule] section tuning the intervals of scheduled syncs
+			try:
+				self.scheduler = scheduler.read_scheduler(config)
+			except ValueError as ex:
+				print("Schedule Error in the config file - {0}".format(ex))
+			# Optional [logging] section. Logging is set up once, before the first sync.
+			PyJiraOut.configure_logging(config)
+			# Optional [webhook] section starting the receiver of Jira's webhooks. A receiver of earlier settings
+			# is stopped first, so that it lets go of its port.
+			self.stopReceiver()
+			try:
+				self.syncWorker.receiver = PyJiraOut.start_webhook_receiver(config)
+			except (OSError, ValueError) as ex:
+				print("Webhook Error in the config file - {0}".format(ex))
+
+	# This method shows the settings read from the configuration file in the form and keeps the others for the syncs
+	def applySettings(self, settings):
+		for field, value in zip((self.jiraID, self.jiraUsername, self.jiraPassword, self.boardName, self.boardID, self.jiraLink), settings):
+			field.setText(value)
+		self.workflow, self.maxWorkers, self.matchThreshold, self.options, self.profiles = settings[6:]
+
+	def stopReceiver(self):
+		if self.syncWorker.receiver is not None:
+			self.syncWorker.receiver.stop()
+			self.syncWorker.receiver = None
 			
 			
 	def pwToggle(self,showPwCheckBox):
@@ -91,12 +181,11 @@ class Window(QDialog):
 			error_dialog = QErrorMessage(self)
 			error_dialog.showMessage('Please enter all the textfields.')
 		else:
-			configFile = open("adapter_config.ini", "w")
-			configFile.truncate()
-			configFile.close()
+			# Other sections like [workflow] are kept as they are
 			config = SafeConfigParser()
 			config.read('adapter_config.ini')
-			config.add_section('jiraout')
+			if not config.has_section('jiraout'):
+				config.add_section('jiraout')
 			config.set('jiraout', 'jiraid', self.jiraID.text())
 			config.set('jiraout', 'jirausername', self.jiraUsername.text())
 			config.set('jiraout', 'jirapassword', self.jiraPassword.text())
@@ -122,12 +211,19 @@ class Window(QDialog):
 		self.maximizeAction = QAction("Maximize", self, triggered=self.showMaximized)
 		self.restoreAction = QAction("Restore", self, triggered=self.showNormal)
 		self.quitAction = QAction("Quit", self, triggered=QApplication.instance().quit)
+		self.syncNowAction = QAction("Sync now", self, triggered=self.syncNow)
+		self.syncNowAction.setEnabled(False)
+		self.cancelAction = QAction("Cancel sync", self, triggered=self.cancelSync)
+		self.cancelAction.setEnabled(False)
 		self.menu = QMenu()
 		self.menu.triggered[QAction].connect(self.processtrigger)
 		self.menu.addAction(self.minimizeAction)
 		self.menu.addAction(self.maximizeAction)
 		self.menu.addAction(self.restoreAction)
 		self.menu.addSeparator()
+		self.menu.addAction(self.syncNowAction)
+		self.menu.addAction(self.cancelAction)
+		self.menu.addSeparator()
 		self.menu.addAction(self.quitAction)
 				
 		# Create the tray
@@ -188,23 +284,100 @@ class Window(QDialog):
 		print (q.text()+" is triggered")
 		if q.text() == "Quit":
 			self.tray.hide()
+			self.stopSyncWorker()
 			QApplication.instance().quit
 			sys.exit()
 
 
+	def createSyncWorker(self):
+		self.syncThread = QThread()
+		self.syncWorker = SyncWorker()
+		self.syncWorker.moveToThread(self.syncThread)
+		self.syncRequested.connect(self.syncWorker.run)
+		self.syncWorker.progress.connect(self.syncProgress)
+		self.syncWorker.finished.connect(self.syncFinished)
+		self.syncWorker.error.connect(self.syncError)
+		# The engine is closed on the sync thread itself, once it stops
+		self.syncThread.finished.connect(self.syncWorker.close, Qt.DirectConnection)
+		self.syncThread.start()
+		self.syncTimer = QTimer(self)
+		self.syncTimer.setSingleShot(True)
+		self.syncTimer.timeout.connect(self.syncNow)
+
+	def stopSyncWorker(self):
+		self.syncTimer.stop()
+		self.syncWorker.cancel()
+		self.syncThread.quit()
+		self.syncThread.wait()
+		self.stopReceiver()
+
+	def currentSettings(self):
+		return (self.jiraID.text(), self.jiraUsername.text(), self.jiraPassword.text(), self.boardName.text(), self.boardID.text(), self.jiraLink.text(), self.workflow, self.maxWorkers, self.matchThreshold, self.options, self.profiles)
+
 	@pyqtSlot()
 	def confirm_btn(self):
+		self.settings = self.currentSettings()
+		self.syncNowAction.setEnabled(True)
 		if self.oneTime.isChecked() == True:
 			print("One-Time")
-			PyJiraOut.syncTasksToJira(self.jiraID.text(), self.jiraUsername.text(), self.jiraPassword.text(), self.boardName.text(), self.boardID.text(), self.jiraLink.text())
+			self.syncTimer.stop()
+			self.scheduler.clear()
 		if self.scheduled.isChecked() == True:
 			print("Scheduled")
-			while True:
-				PyJiraOut.syncTasksToJira(self.jiraID.text(), self.jiraUsername.text(), self.jiraPassword.text(), self.boardName.text(), self.boardID.text(), self.jiraLink.text())
-				loop = QEventLoop()
-				QTimer.singleShot(9000000, loop.quit)
-				loop.exec_()
-		print("Success")
+		self.syncNow()
+
+	# Scheduled syncs saved by the last run go on at their saved time, once the configuration is complete
+	def resumeSchedule(self):
+		remaining = self.scheduler.remaining()
+		if remaining is None or not self.runButton.isEnabled():
+			return
+		self.scheduled.setChecked(True)
+		self.settings = self.currentSettings()
+		self.syncNowAction.setEnabled(True)
+		self.scheduleNext(remaining)
+
+	def scheduleNext(self, seconds):
+		self.syncTimer.start(int(seconds * 1000))
+		nextRun = QDateTime.currentDateTime().addSecs(int(seconds))
+		self.tray.setToolTip("JIRA-Outlook Adapter - Next sync at {0}".format(nextRun.toString('HH:mm')))
+
+	@pyqtSlot()
+	def syncNow(self):
+		if self.syncRunning or self.settings is None:
+			return
+		self.syncTimer.stop()
+		self.syncRunning = True
+		self.syncCancelled = False
+		self.cancelAction.setEnabled(True)
+		self.syncRequested.emit(self.settings)
+
+	@pyqtSlot()
+	def cancelSync(self):
+		if self.syncRunning:
+			self.syncCancelled = True
+			self.syncWorker.cancel()
+
+	@pyqtSlot(str)
+	def syncProgress(self, text):
+		self.tray.setToolTip("JIRA-Outlook Adapter - {0}".format(text))
+
+	@pyqtSlot(str)
+	def syncError(self, text):
+		print(text)
+		self.tray.showMessage("JIRA-Outlook Adapter", "Sync failed - {0}".format(text), QSystemTrayIcon.Warning)
+
+	@pyqtSlot(bool, int)
+	def syncFinished(self, synced, changes):
+		self.syncRunning = False
+		self.cancelAction.setEnabled(False)
+		if synced:
+			print("Success")
+		if self.scheduled.isChecked() == True:
+			# A cycle cancelled before its end keeps the schedule as it was
+			if self.syncCancelled and not synced:
+				self.scheduleNext(self.scheduler.cycle_cancelled())
+			else:
+				self.scheduleNext(self.scheduler.cycle_done(synced, changes))
 
 if __name__ == '__main__':
 	app = QApplication(sys.argv)
@@ -0,0 +1,155 @@
+'''
+Purpose - Timing and request metrics of each sync cycle.
+
+Collects phase durations, Jira requests by endpoint and status, retries and
+task outcomes (processed, skipped, created, ...), by board when several boards
+are synced in one cycle. After every cycle they are
+written as a JSON summary and as a Prometheus textfile, which the node
+exporter's textfile collector can pick up, so monitoring can alert on drift.
+
+'''
+
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+# Default output files, next to jira-adapter.log
+METRICS_FILE = 'jira-adapter-metrics.json'
+PROMETHEUS_FILE = 'jira-adapter.prom'
+# Task outcomes that changed something in Jira or in the sync state
+CHANGE_OUTCOMES = ('created', 'existing', 'updated', 'moved', 'archived', 'attachments_uploaded', 'completed_in_outlook')
+
+# Issue keys and IDs in request paths are folded so that requests group by endpoint
+ISSUE_IN_PATH = re.compile(r'issue/(?!bulk\b|createmeta\b)[^/]+')
+API_PREFIX = re.compile(r'^.*?/rest/api/\d+/')
+
+# This function gives the endpoint of a request, like "GET issue/{key}/transitions"
+def endpoint_of(method, url):
+	path = API_PREFIX.sub('', urlparse(url).path)
+	return '{0} {1}'.format(method, ISSUE_IN_PATH.sub('issue/{key}', path))
+
+class SyncMetrics(object):
+	def __init__(self):
+		self.started = time.time()
+		self.duration = None
+		self.success = None
+		self.phases = OrderedDict()
+		self.requests = Counter()
+		self.tasks = Counter()
+		self.retries = 0
+		self.lock = threading.Lock()
+
+	# Times the code run inside the with block as the given phase
+	@contextmanager
+	def phase(self, name, board=None):
+		started = time.time()
+		try:
+			yield
+		finally:
+			with self.lock:
+				self.phases[(board, name)] = self.phases.get((board, name), 0) + time.time() - started
+
+	def count(self, outcome, amount=1, board=None):
+		with self.lock:
+			self.tasks[(board, outcome)] += amount
+
+	# Returns the number of changes of the cycle over all boards
+	def changes(self):
+		with self.lock:
+			return sum(count for (board, outcome), count in self.tasks.items() if outcome in CHANGE_OUTCOMES)
+
+	# Returns the metrics of one board of the cycle
+	def board(self, name):
+		return BoardMetrics(self, name)
+
+	# Response hook for the requests session of the Jira client
+	def record_response(self, response, *args, **kwargs):
+		with self.lock:
+			self.requests[(endpoint_of(response.request.method, response.url), response.status_code)] += 1
+
+	def finish(self, success):
+		self.duration = time.time() - self.started
+		self.success = success
+
+	def summary(self):
+		summary = OrderedDict([
+			('started', time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started))),
+			('duration_seconds', round(self.duration or 0, 3)),
+			('success', bool(self.success)),
+			('phases', self.board_phases(None)),
+			('requests', sum(self.requests.values())),
+			('requests_by_endpoint', [OrderedDict([('endpoint', endpoint), ('status', status), ('count', count)])
+										for (endpoint, status), count in sorted(self.requests.items())]),
+			('retries', self.retries),
+			('tasks', self.board_tasks(None)),
+		])
+		boards = sorted(set(board for board, name in list(self.phases) + list(self.tasks) if board is not None))
+		if boards:
+			summary['boards'] = OrderedDict((board, OrderedDict([('phases', self.board_phases(board)), ('tasks', self.board_tasks(board))]))
+											for board in boards)
+		return summary
+
+	def board_phases(self, board):
+		return OrderedDict((name, round(seconds, 3)) for (phaseBoard, name), seconds in self.phases.items() if phaseBoard == board)
+
+	def board_tasks(self, board):
+		return dict((outcome, count) for (taskBoard, outcome), count in self.tasks.items() if taskBoard == board)
+
+	def to_json(self):
+		return json.dumps(self.summary())
+
+	def prometheus(self):
+		lines = []
+		def metric(name, kind, help, samples):
+			lines.append('# HELP {0} {1}'.format(name, help))
+			lines.append('# TYPE {0} {1}'.format(name, kind))
+			for labels, value in samples:
+				labelText = ','.join('{0}="{1}"'.format(label, str(text).replace('\\', '\\\\').replace('"', '\\"')) for label, text in labels)
+				lines.append('{0}{1} {2}'.format(name, '{' + labelText + '}' if labelText else '', value))
+		metric('jira_adapter_last_cycle_timestamp_seconds', 'gauge', 'Start time of the last sync cycle.', [((), int(self.started))])
+		metric('jira_adapter_last_cycle_success', 'gauge', '1 if the last sync cycle ran to the end.', [((), int(bool(self.success)))])
+		metric('jira_adapter_last_cycle_duration_seconds', 'gauge', 'Duration of the last sync cycle.', [((), round(self.duration or 0, 3))])
+		metric('jira_adapter_last_cycle_phase_duration_seconds', 'gauge', 'Duration of each phase of the last sync cycle.',
+				[(board_labels(board, ('phase', name)), round(seconds, 3)) for (board, name), seconds in self.phases.items()])
+		metric('jira_adapter_last_cycle_requests', 'gauge', 'Jira requests of the last sync cycle by endpoint and status.',
+				[((('endpoint', endpoint), ('status', status)), count) for (endpoint, status), count in sorted(self.requests.items())])
+		metric('jira_adapter_last_cycle_retries', 'gauge', 'Jira requests retried in the last sync cycle.', [((), self.retries)])
+		metric('jira_adapter_last_cycle_tasks', 'gauge', 'Tasks of the last sync cycle by outcome.',
+				[(board_labels(board, ('outcome', outcome)), count) for (board, outcome), count in sorted(self.tasks.items(), key=lambda item: (str(item[0][0]), item[0][1]))])
+		return '\n'.join(lines) + '\n'
+
+	# Writes the JSON summary and the Prometheus textfile. Files are replaced at once so readers never see half a file.
+	def write(self, metricsFile=METRICS_FILE, prometheusFile=PROMETHEUS_FILE):
+		if metricsFile:
+			write_atomic(metricsFile, self.to_json() + '\n')
+		if prometheusFile:
+			write_atomic(prometheusFile, self.prometheus())
+
+# This class records the phases and task outcomes of one board into the metrics of the cycle
+class BoardMetrics(object):
+	def __init__(self, metrics, board):
+		self.metrics = metrics
+		self.board = board
+
+	def phase(self, name):
+		return self.metrics.phase(name, board=self.board)
+
+	def count(self, outcome, amount=1):
+		self.metrics.count(outcome, amount, board=self.board)
+
+	def record_response(self, response, *args, **kwargs):
+		self.metrics.record_response(response)
+
+def board_labels(board, label):
+	return (('board', board), label) if board is not None else (label,)
+
+def write_atomic(path, text):
+	temporary = '{0}.tmp'.format(path)
+	with open(temporary, 'w') as f:
+		f.write(text)
+	os.replace(temporary, path)
@@ -0,0 +1,117 @@
+'''
+Purpose - Retry policy shared by all the Jira calls of the adapter.
+
+Only transient failures are retried (timeouts, dropped connections, 429 and
+5xx responses), with exponential backoff and jitter. After too many failed
+calls in a row the circuit opens and every further call fails at once, so a
+cycle stops early when Jira is down instead of waiting on each request.
+
+'''
+
+# Official Python module from Jira
+from jira.exceptions import JIRAError
+# HTTP library used by the Jira module
+import requests
+import logging
+import random
+import threading
+import time
+
+# Methods that change Jira. They are retried only when Jira refused the request outright (429),
+# as a timeout or a 5xx may come after the change was already made.
+# An issue update may add a comment. A transition repeated after the issue moved fails, or moves it on again.
+NON_IDEMPOTENT = ('create_issue', 'create_issues', 'add_comment', 'add_attachment', 'update_issue_fields', 'transition_issue')
+
+class CircuitOpenError(Exception):
+	pass
+
+class RetryPolicy(object):
+	def __init__(self, maxAttempts=4, baseDelay=0.5, maxDelay=30, failureThreshold=5):
+		self.maxAttempts = maxAttempts
+		self.baseDelay = baseDelay
+		self.maxDelay = maxDelay
+		self.failureThreshold = failureThreshold
+		# Calls that failed in a row, after their retries
+		self.failures = 0
+		self.retries = 0
+		self.lock = threading.Lock()
+
+	@property
+	def open(self):
+		return self.failures >= self.failureThreshold
+
+	# Closes the circuit again, at the start of a new cycle
+	def reset(self):
+		with self.lock:
+			self.failures = 0
+
+	def is_transient(self, ex, idempotent=True):
+		if isinstance(ex, JIRAError):
+			if ex.status_code == 429:
+				return True
+			return idempotent and ex.status_code is not None and ex.status_code >= 500
+		if isinstance(ex, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+			return idempotent
+		return False
+
+	# Exponential backoff with full jitter
+	def delay(self, attempt):
+		return random.uniform(0, min(self.maxDelay, self.baseDelay * (2 ** attempt)))
+
+	def call(self, func, *args, **kwargs):
+		idempotent = kwargs.pop('idempotent', True)
+		logger = logging.getLogger('JiraOutAdapter')
+		if self.open:
+			raise CircuitOpenError('Jira is unavailable, {0} calls failed in a row.'.format(self.failures))
+		attempt = 0
+		while True:
+			try:
+				result = func(*args, **kwargs)
+			except Exception as ex:
+				if not self.is_transient(ex, idempotent):
+					raise
+				attempt += 1
+				if attempt >= self.maxAttempts:
+					with self.lock:
+						self.failures += 1
+					raise
+				with self.lock:
+					self.retries += 1
+				delay = self.delay(attempt)
+				logger.warning('Transient Jira failure in %s - %s. Retry %s in %.1fs', getattr(func, '__name__', func), ex, attempt, delay)
+				time.sleep(delay)
+			else:
+				with self.lock:
+					self.failures = 0
+				return result
+
+# This class wraps a JIRA client so that every call goes through the retry policy.
+# When reconnect is given, a call refused with 401 logs in again once and is repeated.
+class RetryingJira(object):
+	def __init__(self, jira, policy, reconnect=None):
+		self.jira = jira
+		self.policy = policy
+		self.reconnect = reconnect
+		self.lock = threading.Lock()
+
+	def __getattr__(self, name):
+		attribute = getattr(self.jira, name)
+		if not callable(attribute):
+			return attribute
+		def call(*args, **kwargs):
+			client = self.jira
+			try:
+				return self.policy.call(getattr(client, name), *args, idempotent=name not in NON_IDEMPOTENT, **kwargs)
+			except JIRAError as jex:
+				if jex.status_code != 401 or self.reconnect is None:
+					raise
+			self.relogin(client)
+			return self.policy.call(getattr(self.jira, name), *args, idempotent=name not in NON_IDEMPOTENT, **kwargs)
+		return call
+
+	# Logs in again, unless another thread already did it since the failed call
+	def relogin(self, client):
+		with self.lock:
+			if self.jira is client:
+				logging.getLogger('JiraOutAdapter').info('Jira session expired. Logging in again.')
+				self.jira = self.reconnect()
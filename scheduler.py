@@ -0,0 +1,159 @@
+'''
+Purpose - Adaptive schedule of the sync cycles.
+
+The time to the next cycle follows the activity of the last ones. Cycles that
+changed something halve the interval down to the minimum, so a busy board is
+synced nearly in real time. Cycles without changes stretch it by half up to
+the maximum. Failed cycles back off exponentially from the base interval.
+A cancelled cycle leaves the interval and the backoff as they were. During the quiet hours the interval is never shorter than the maximum. Every
+delay gets some random jitter, so adapters started together don't hit Jira
+at the same moment.
+
+The next run is saved to a file after every cycle, so a restarted adapter goes
+on with the schedule instead of syncing at once.
+
+	[schedule]
+	mininterval = 2
+	baseinterval = 10
+	maxinterval = 60
+	maxbackoff = 120
+	quiethours = 20-7
+
+Intervals are in minutes, quiethours are from-to hours of the day.
+
+'''
+
+import json
+import random
+from datetime import datetime, timedelta
+
+from metrics import write_atomic
+
+# File keeping the next run of the schedule
+SCHEDULE_FILE = 'jira-adapter-schedule.json'
+# Default intervals in minutes
+MIN_INTERVAL = 2
+BASE_INTERVAL = 10
+MAX_INTERVAL = 60
+MAX_BACKOFF = 120
+# Share of the interval added or taken off at random
+JITTER = 0.1
+# Factors applied to the interval after busy and idle cycles
+BUSY_FACTOR = 0.5
+IDLE_FACTOR = 1.5
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+class AdaptiveScheduler(object):
+	def __init__(self, minInterval=MIN_INTERVAL, baseInterval=BASE_INTERVAL, maxInterval=MAX_INTERVAL,
+					maxBackoff=MAX_BACKOFF, quietHours=None, jitter=JITTER, path=SCHEDULE_FILE):
+		if not 0 < minInterval <= baseInterval <= maxInterval <= maxBackoff:
+			raise ValueError('Intervals must grow from mininterval to baseinterval, maxinterval and maxbackoff.')
+		self.minInterval = timedelta(minutes=minInterval)
+		self.baseInterval = timedelta(minutes=baseInterval)
+		self.maxInterval = timedelta(minutes=maxInterval)
+		self.maxBackoff = timedelta(minutes=maxBackoff)
+		# (from hour, to hour), may wrap around midnight
+		self.quietHours = quietHours
+		self.jitter = jitter
+		self.path = path
+		self.interval = self.baseInterval
+		self.failures = 0
+		self.nextRun = None
+
+	# Records the outcome of a cycle and returns the delay to the next one in seconds
+	def cycle_done(self, success, changes=0, now=None):
+		now = now or datetime.now()
+		if not success:
+			self.failures += 1
+			delay = self.backoff()
+		else:
+			self.failures = 0
+			factor = BUSY_FACTOR if changes else IDLE_FACTOR
+			self.interval = min(max(self.interval * factor, self.minInterval), self.maxInterval)
+			delay = self.interval
+		return self.schedule(delay, now)
+
+	# Schedules the next cycle after one cancelled by the user, which neither succeeded nor failed.
+	# Returns the delay in seconds, the current interval or backoff.
+	def cycle_cancelled(self, now=None):
+		return self.schedule(self.backoff() if self.failures else self.interval, now or datetime.now())
+
+	# The wait after the failures in a row so far, doubled with each of them
+	def backoff(self):
+		return min(self.baseInterval * 2 ** (self.failures - 1), self.maxBackoff)
+
+	# Sets the next run after delay, stretched to the maximum during the quiet hours and with jitter
+	def schedule(self, delay, now):
+		if self.quiet(now):
+			delay = max(delay, self.maxInterval)
+		delay *= 1 + random.uniform(-self.jitter, self.jitter)
+		self.nextRun = now + delay
+		self.save()
+		return delay.total_seconds()
+
+	# Returns the seconds left to the saved next run, 0 when it is due, None when nothing is scheduled
+	def remaining(self, now=None):
+		if self.nextRun is None:
+			return None
+		return max((self.nextRun - (now or datetime.now())).total_seconds(), 0)
+
+	# Drops the next run, when the adapter is switched to one-time syncs
+	def clear(self):
+		self.nextRun = None
+		self.save()
+
+	def quiet(self, now):
+		if not self.quietHours:
+			return False
+		start, end = self.quietHours
+		if start <= end:
+			return start <= now.hour < end
+		return now.hour >= start or now.hour < end
+
+	def save(self):
+		if not self.path:
+			return
+		write_atomic(self.path, json.dumps({
+			'next_run': self.nextRun.strftime(TIME_FORMAT) if self.nextRun else None,
+			'interval_seconds': self.interval.total_seconds(),
+			'failures': self.failures,
+		}) + '\n')
+
+	# Takes the schedule saved by an earlier run. A missing or unreadable file leaves the defaults.
+	def load(self):
+		try:
+			with open(self.path) as f:
+				saved = json.load(f)
+			nextRun = datetime.strptime(saved['next_run'], TIME_FORMAT) if saved.get('next_run') else None
+			interval = timedelta(seconds=saved['interval_seconds'])
+			failures = int(saved['failures'])
+		except (OSError, ValueError, KeyError, TypeError):
+			return self
+		self.nextRun = nextRun
+		self.interval = min(max(interval, self.minInterval), self.maxInterval)
+		self.failures = failures
+		return self
+
+# This function parses quiet hours like "20-7"
+def parse_quiet_hours(value):
+	if not value or not value.strip():
+		return None
+	try:
+		start, end = (int(hour) for hour in value.split('-'))
+	except ValueError:
+		raise ValueError('Quiet hours must be given as "from-to", like 20-7: {0}'.format(value))
+	if not (0 <= start < 24 and 0 <= end < 24):
+		raise ValueError('Quiet hours must be between 0 and 23: {0}'.format(value))
+	return (start, end)
+
+# This function creates the scheduler of the optional [schedule] section and loads its saved next run
+def read_scheduler(config):
+	if not config.has_section('schedule'):
+		return AdaptiveScheduler().load()
+	return AdaptiveScheduler(
+		minInterval=config.getfloat('schedule', 'mininterval', fallback=MIN_INTERVAL),
+		baseInterval=config.getfloat('schedule', 'baseinterval', fallback=BASE_INTERVAL),
+		maxInterval=config.getfloat('schedule', 'maxinterval', fallback=MAX_INTERVAL),
+		maxBackoff=config.getfloat('schedule', 'maxbackoff', fallback=MAX_BACKOFF),
+		quietHours=parse_quiet_hours(config.get('schedule', 'quiethours', fallback=None)),
+		path=config.get('schedule', 'file', fallback=SCHEDULE_FILE)).load()
@@ -0,0 +1,118 @@
+'''
+Purpose - Local matching of outlook task subjects against Jira issue summaries.
+
+Replaces the server side "summary ~" text search. A subject first looks for an
+exact hit on its normalized key. Failing that, near duplicates are found
+through a trigram index, scored with the Jaccard similarity of the trigrams and
+accepted above a configurable threshold. Candidates are only gathered from the
+rarest trigrams of the subject (prefix filtering), so a lookup stays cheap on
+boards with tens of thousands of issues.
+
+A near duplicate must have the same numbers as the subject. Recurring tasks
+like "Status report week 42" or "Q4 budget review" differ from the issue of
+the last period by a number only, and get their own issue.
+
+'''
+
+import re
+import math
+from collections import defaultdict
+
+# Default similarity above which two subjects are taken as the same task
+MATCH_THRESHOLD = 0.85
+# Length of the grams in the index
+GRAM_SIZE = 3
+
+# Reply and forward prefixes, possibly repeated, like "RE: FW: "
+REPLY_PREFIX = re.compile(r'^(\s*(re|fw|fwd)\s*:\s*)+', re.IGNORECASE)
+PUNCTUATION = re.compile(r'([^\s\w]|_)+')
+NUMBER = re.compile(r'\d+')
+
+# This function gives the key under which a subject or summary is matched
+def normalize_subject(subject):
+	subject = REPLY_PREFIX.sub('', subject or '')
+	subject = PUNCTUATION.sub('', subject)
+	return ' '.join(subject.lower().split())
+
+# This function gives the numbers of a key in order, "week 07" and "week 7" having the same
+def subject_numbers(key):
+	return tuple(int(number) for number in NUMBER.findall(key))
+
+def subject_grams(key, size=GRAM_SIZE):
+	padded = ' {0} '.format(key)
+	return frozenset(padded[i:i + size] for i in range(len(padded) - size + 1))
+
+class SubjectMatcher(object):
+	def __init__(self, threshold=MATCH_THRESHOLD):
+		self.threshold = threshold
+		# Holds {normalized key: issue}
+		self.exact = {}
+		# Holds {normalized key: its grams} and {gram: keys containing it}
+		self.grams = {}
+		self.postings = defaultdict(set)
+		# Holds {normalized key: its numbers}
+		self.numbers = {}
+
+	def __len__(self):
+		return len(self.exact)
+
+	def issues(self):
+		return list(self.exact.values())
+
+	# Adds an issue under its summary. An issue already indexed under the same key is kept.
+	def add(self, summary, issue):
+		key = normalize_subject(summary)
+		if key in self.exact:
+			return
+		self.exact[key] = issue
+		grams = subject_grams(key)
+		self.grams[key] = grams
+		self.numbers[key] = subject_numbers(key)
+		for gram in grams:
+			self.postings[gram].add(key)
+
+	def remove(self, summary):
+		key = normalize_subject(summary)
+		if self.exact.pop(key, None) is None:
+			return
+		del self.numbers[key]
+		for gram in self.grams.pop(key):
+			self.postings[gram].discard(key)
+			if not self.postings[gram]:
+				del self.postings[gram]
+
+	# Returns the issue matching the subject, or None
+	def match(self, subject):
+		key = normalize_subject(subject)
+		issue = self.exact.get(key)
+		if issue is not None or self.threshold >= 1:
+			return issue
+		return self.near_match(key)
+
+	def near_match(self, key):
+		query = subject_grams(key)
+		if not query:
+			return None
+		# Any key with a similarity above the threshold shares at least one gram in this prefix
+		rarest = sorted(query, key=lambda gram: len(self.postings.get(gram, ())))
+		prefix = len(query) - int(math.ceil(self.threshold * len(query))) + 1
+		numbers = subject_numbers(key)
+		best, bestScore = None, self.threshold
+		checked = set()
+		for gram in rarest[:prefix]:
+			for candidate in self.postings.get(gram, ()):
+				if candidate in checked:
+					continue
+				checked.add(candidate)
+				grams = self.grams[candidate]
+				# Keys too short or too long can't reach the threshold
+				if len(grams) < self.threshold * len(query) or len(grams) * self.threshold > len(query):
+					continue
+				# Another week, quarter or version of a recurring task is another task
+				if self.numbers[candidate] != numbers:
+					continue
+				common = len(query & grams)
+				score = common / float(len(query) + len(grams) - common)
+				if score >= bestScore:
+					best, bestScore = candidate, score
+		return self.exact[best] if best is not None else None
@@ -0,0 +1,82 @@
+'''
+Purpose - The change plan of one sync cycle.
+
+Planning reads outlook, the sync state and Jira, and decides every change of
+the cycle without writing anything: issues to create, tasks to link to an
+existing issue, known tasks whose content changed with the fields to send or
+the text to comment, known tasks modified in outlook without a content change,
+like a new attachment, issues to move to Done
+or to Archive, and tasks to mark complete in outlook because their issue was
+completed in Jira. Applying the plan runs these changes in batches. A dry run
+prints the plan as JSON.
+
+A plan also names the tasks it took from the retry queue, which are queued
+again on apply only if they fail again, and the tasks whose issue could not be
+looked up in Jira, which are queued on apply.
+
+'''
+
+import json
+from collections import namedtuple, OrderedDict
+
+from syncstate import TIME_FORMAT
+
+# A task without an issue, created on apply. body is the description, original the full task body when it was shortened.
+PlannedCreate = namedtuple('PlannedCreate', ['entryID', 'subject', 'body', 'hash', 'original'], defaults=(None,))
+# A task and the issue it is synced to, recorded in the sync state on apply. fields are the task's FieldHashes.
+PlannedRecord = namedtuple('PlannedRecord', ['entryID', 'key', 'hash', 'fields'], defaults=(None,))
+# A changed task. issueFields are the Jira fields to set and comment the text added to the body, both may be empty
+# when nothing Jira shows changed. The issue is updated in one request, or not at all. original is the full task body
+# to attach when the new description was shortened.
+PlannedUpdate = namedtuple('PlannedUpdate', ['entryID', 'key', 'hash', 'fields', 'issueFields', 'comment', 'original'], defaults=(None, None, None, None))
+# An issue moved along the workflow from status by the given transitions
+PlannedMove = namedtuple('PlannedMove', ['key', 'status', 'steps'])
+# A task whose issue was moved to status in Jira, marked complete in outlook on apply
+PlannedCompletion = namedtuple('PlannedCompletion', ['entryID', 'key', 'status'])
+
+# Lists of a plan and the record type of their entries
+PLAN_LISTS = (
+	('creates', PlannedCreate),
+	('links', PlannedRecord),
+	('updates', PlannedUpdate),
+	('refreshes', PlannedRecord),
+	('transitions', PlannedMove),
+	('archives', PlannedMove),
+	('completions', PlannedCompletion),
+)
+
+class SyncPlan(object):
+	def __init__(self, board, started=None, since=None):
+		self.board = board
+		# Start of the planning, the next watermark. since is None on a full sweep.
+		self.started = started
+		self.since = since
+		for name, record in PLAN_LISTS:
+			setattr(self, name, [])
+		# EntryIDs of the tasks that failed to sync in an earlier cycle
+		self.retries = []
+		# EntryIDs of the tasks whose existing issue could not be searched, neither created nor linked
+		self.failed = []
+
+	# Returns the number of changes in each list of the plan
+	def summary(self):
+		return OrderedDict((name, len(getattr(self, name))) for name, record in PLAN_LISTS)
+
+	def to_dict(self):
+		values = OrderedDict([
+			('board', self.board),
+			('started', format_time(self.started)),
+			('since', format_time(self.since)),
+			('summary', self.summary()),
+			('retries', list(self.retries)),
+			('failed', list(self.failed)),
+		])
+		for name, record in PLAN_LISTS:
+			values[name] = [entry._asdict() for entry in getattr(self, name)]
+		return values
+
+	def to_json(self, indent=2):
+		return json.dumps(self.to_dict(), indent=indent)
+
+def format_time(value):
+	return value.strftime(TIME_FORMAT) if value is not None else None
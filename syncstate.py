@@ -0,0 +1,259 @@
+'''
+Purpose - Local sync state of the adapter, kept between runs.
+
+Records for every synced outlook task its EntryID, the Jira issue key it was
+synced to, a hash of its content, hashes of the summary and description sent
+to Jira and the time it was last synced. Lookups are
+exact, so a renamed task still finds its issue and unchanged tasks need no
+Jira call at all. Issues changed in Jira find their task the same way, by key. One state can be shared by the engines of several boards
+running on their own threads. The tasks of each board are kept in a scope of their own, '' for the board of the
+[jiraout] section.
+
+The attachments uploaded to each issue are recorded by content hash, name and
+size, and the tasks whose attachments still have to be checked are queued, so
+uploads left over by the byte budget of a cycle go on in the next one.
+
+Tasks whose issue failed to be created or updated are queued for a retry, so
+the next cycle plans them again even when they were not modified since.
+
+The open issues of each board are mirrored with their key, summary, status,
+resolution date and last update, see issuemirror.py.
+
+'''
+
+# In-built Python module for the SQLite database holding the state
+import sqlite3
+# In-built Python module for hashing the task content
+import hashlib
+import threading
+from collections import namedtuple
+from datetime import datetime
+
+# Default location of the state database, next to jira-adapter.log
+STATE_FILE = 'jira-adapter.db'
+# Format of the times stored in the meta table
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+# This function gives the hash of the task content used to detect changes between runs
+def content_hash(subject, body):
+	text = u'{0}\x00{1}'.format(subject or '', body or '')
+	return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+# Hashes of the summary and description of an issue, and the length of the description,
+# to tell which fields of a task changed and whether text was only added to its body
+FieldHashes = namedtuple('FieldHashes', ['summary', 'body', 'bodyLength'])
+
+def text_hash(text):
+	return hashlib.sha1((text or '').encode('utf-8')).hexdigest()
+
+def field_hashes(summary, body):
+	return FieldHashes(text_hash(summary), text_hash(body), len(body or ''))
+
+# Columns added since the first version of the tasks table
+FIELD_COLUMNS = (('summary_hash', 'TEXT'), ('body_hash', 'TEXT'), ('body_length', 'INTEGER'))
+TASKS_SCHEMA = ('scope TEXT NOT NULL DEFAULT \'\', '
+				'entry_id TEXT NOT NULL, '
+				'jira_key TEXT NOT NULL, '
+				'content_hash TEXT, '
+				'last_synced TEXT, '
+				'summary_hash TEXT, '
+				'body_hash TEXT, '
+				'body_length INTEGER, '
+				'PRIMARY KEY (scope, entry_id)')
+ATTACHMENT_QUEUE_SCHEMA = ('scope TEXT NOT NULL DEFAULT \'\', '
+							'entry_id TEXT NOT NULL, '
+							'PRIMARY KEY (scope, entry_id)')
+
+# This function keys a table of an older version, keyed by EntryID alone, by scope too. Its rows go to the scope ''.
+def add_scope(conn, table, schema):
+	columns = ', '.join(row[1] for row in conn.execute('PRAGMA table_info({0})'.format(table)))
+	conn.execute('CREATE TABLE {0}_scoped ({1})'.format(table, schema))
+	conn.execute('INSERT INTO {0}_scoped ({1}) SELECT {1} FROM {0}'.format(table, columns))
+	conn.execute('DROP TABLE {0}'.format(table))
+	conn.execute('ALTER TABLE {0}_scoped RENAME TO {0}'.format(table))
+
+class SyncState(object):
+	def __init__(self, path=STATE_FILE):
+		# The connection is used from the board threads in turn, never at the same time
+		self.conn = sqlite3.connect(path, check_same_thread=False)
+		self.lock = threading.RLock()
+		self.conn.execute('CREATE TABLE IF NOT EXISTS tasks ({0})'.format(TASKS_SCHEMA))
+		columns = set(row[1] for row in self.conn.execute('PRAGMA table_info(tasks)'))
+		for name, kind in FIELD_COLUMNS:
+			if name not in columns:
+				self.conn.execute('ALTER TABLE tasks ADD COLUMN {0} {1}'.format(name, kind))
+		if 'scope' not in columns:
+			add_scope(self.conn, 'tasks', TASKS_SCHEMA)
+		self.conn.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)')
+		self.conn.execute('CREATE TABLE IF NOT EXISTS attachments ('
+							'jira_key TEXT NOT NULL, '
+							'content_hash TEXT NOT NULL, '
+							'filename TEXT, '
+							'size INTEGER, '
+							'PRIMARY KEY (jira_key, content_hash))')
+		self.conn.execute('CREATE TABLE IF NOT EXISTS attachment_queue ({0})'.format(ATTACHMENT_QUEUE_SCHEMA))
+		if 'scope' not in set(row[1] for row in self.conn.execute('PRAGMA table_info(attachment_queue)')):
+			add_scope(self.conn, 'attachment_queue', ATTACHMENT_QUEUE_SCHEMA)
+		self.conn.execute('CREATE TABLE IF NOT EXISTS retry_queue ('
+							'scope TEXT NOT NULL, '
+							'entry_id TEXT NOT NULL, '
+							'PRIMARY KEY (scope, entry_id))')
+		self.conn.execute('CREATE TABLE IF NOT EXISTS issue_mirror ('
+							'scope TEXT NOT NULL, '
+							'jira_key TEXT NOT NULL, '
+							'issue_id TEXT, '
+							'summary TEXT, '
+							'status TEXT, '
+							'resolved TEXT, '
+							'updated TEXT, '
+							'PRIMARY KEY (scope, jira_key))')
+		self.conn.commit()
+		# All records are held in memory so that lookups don't touch the disk
+		# {(scope, entry ID): record}
+		self.tasks = {}
+		for scope, entryID, jiraKey, contentHash, lastSynced, summaryHash, bodyHash, bodyLength in self.conn.execute(
+				'SELECT scope, entry_id, jira_key, content_hash, last_synced, summary_hash, body_hash, body_length FROM tasks'):
+			fields = FieldHashes(summaryHash, bodyHash, bodyLength) if summaryHash else None
+			self.tasks[(scope, entryID)] = {'jira_key': jiraKey, 'content_hash': contentHash, 'last_synced': lastSynced, 'fields': fields}
+		# {jira key: (scope, entry ID)}, the other way round
+		self.entries = dict((record['jira_key'], task) for task, record in self.tasks.items())
+		# {jira key: {content hash: (filename, size)}} of the uploaded attachments
+		self.attachments = {}
+		for jiraKey, contentHash, filename, size in self.conn.execute('SELECT jira_key, content_hash, filename, size FROM attachments'):
+			self.attachments.setdefault(jiraKey, {})[contentHash] = (filename, size)
+
+	# Returns the record of the task as a dict, or None if the task was never synced to the board of scope
+	def get(self, entryID, scope=''):
+		return self.tasks.get((scope, entryID))
+
+	# Returns the EntryID of the task of the board of scope synced to the issue, or None
+	def entry_for_key(self, jiraKey, scope=''):
+		with self.lock:
+			task = self.entries.get(jiraKey)
+		return task[1] if task and task[0] == scope else None
+
+	# Returns True when the task was synced and not modified since, so its body doesn't need to be read.
+	# Outlook gives modification times to the second, so a task modified in the second it was read counts as changed.
+	def is_unchanged(self, entryID, lastModified, scope=''):
+		syncedAt = self.synced_at(entryID, scope)
+		return bool(lastModified and syncedAt and lastModified < syncedAt)
+
+	# Returns the time the task was last read to be synced, or None
+	def synced_at(self, entryID, scope=''):
+		record = self.tasks.get((scope, entryID))
+		if not record or not record['last_synced']:
+			return None
+		return datetime.strptime(record['last_synced'][:19], TIME_FORMAT)
+
+	# fields are the FieldHashes of what the issue was synced with. Records without them, from older versions, update all fields.
+	# readAt is when the task was read from outlook. Edits made after it, while the cycle was running, are synced on the next cycle.
+	def record(self, entryID, jiraKey, contentHash, fields=None, readAt=None, scope=''):
+		lastSynced = (readAt or datetime.now()).strftime(TIME_FORMAT)
+		fields = FieldHashes(*fields) if fields else None
+		task = (scope, entryID)
+		with self.lock:
+			previous = self.tasks.get(task)
+			if previous and self.entries.get(previous['jira_key']) == task:
+				del self.entries[previous['jira_key']]
+			self.tasks[task] = {'jira_key': jiraKey, 'content_hash': contentHash, 'last_synced': lastSynced, 'fields': fields}
+			self.entries[jiraKey] = task
+			self.conn.execute('INSERT OR REPLACE INTO tasks (scope, entry_id, jira_key, content_hash, last_synced, summary_hash, body_hash, body_length) '
+								'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+								task + (jiraKey, contentHash, lastSynced) + (tuple(fields) if fields else (None, None, None)))
+
+	def forget(self, entryID, scope=''):
+		task = (scope, entryID)
+		with self.lock:
+			record = self.tasks.pop(task, None)
+			if record and self.entries.get(record['jira_key']) == task:
+				del self.entries[record['jira_key']]
+			self.conn.execute('DELETE FROM tasks WHERE scope = ? AND entry_id = ?', task)
+
+	# Tells if an attachment with this name and size was uploaded to the issue, so it doesn't need to be read to be hashed
+	def has_attachment_named(self, jiraKey, filename, size):
+		with self.lock:
+			return (filename, size) in self.attachments.get(jiraKey, {}).values()
+
+	def has_attachment(self, jiraKey, contentHash):
+		with self.lock:
+			return contentHash in self.attachments.get(jiraKey, {})
+
+	def record_attachment(self, jiraKey, contentHash, filename, size):
+		with self.lock:
+			self.attachments.setdefault(jiraKey, {})[contentHash] = (filename, size)
+			self.conn.execute('INSERT OR REPLACE INTO attachments (jira_key, content_hash, filename, size) VALUES (?, ?, ?, ?)',
+								(jiraKey, contentHash, filename, size))
+
+	# Queues tasks of the board of scope whose attachments have to be checked
+	def queue_attachments(self, entryIDs, scope=''):
+		with self.lock:
+			self.conn.executemany('INSERT OR IGNORE INTO attachment_queue (scope, entry_id) VALUES (?, ?)', [(scope, entryID) for entryID in entryIDs])
+
+	def queued_attachments(self, scope=''):
+		with self.lock:
+			return [row[0] for row in self.conn.execute('SELECT entry_id FROM attachment_queue WHERE scope = ? ORDER BY rowid', (scope,))]
+
+	def unqueue_attachments(self, entryID, scope=''):
+		with self.lock:
+			self.conn.execute('DELETE FROM attachment_queue WHERE scope = ? AND entry_id = ?', (scope, entryID))
+
+	# Queues tasks of a board whose issue failed to be created or updated
+	def queue_retries(self, scope, entryIDs):
+		with self.lock:
+			self.conn.executemany('INSERT OR IGNORE INTO retry_queue (scope, entry_id) VALUES (?, ?)', [(scope, entryID) for entryID in entryIDs])
+
+	def queued_retries(self, scope):
+		with self.lock:
+			return [row[0] for row in self.conn.execute('SELECT entry_id FROM retry_queue WHERE scope = ? ORDER BY rowid', (scope,))]
+
+	def unqueue_retries(self, scope, entryIDs):
+		with self.lock:
+			self.conn.executemany('DELETE FROM retry_queue WHERE scope = ? AND entry_id = ?', [(scope, entryID) for entryID in entryIDs])
+
+	# Returns the mirrored issues of a board as (key, id, summary, status, resolved, updated) rows
+	def mirrored_issues(self, scope):
+		with self.lock:
+			return self.conn.execute('SELECT jira_key, issue_id, summary, status, resolved, updated FROM issue_mirror WHERE scope = ?', (scope,)).fetchall()
+
+	# Stores issue rows of a board, in place of all its rows when replace is set
+	def mirror_issues(self, scope, rows, replace=False):
+		with self.lock:
+			if replace:
+				self.conn.execute('DELETE FROM issue_mirror WHERE scope = ?', (scope,))
+			self.conn.executemany('INSERT OR REPLACE INTO issue_mirror (scope, jira_key, issue_id, summary, status, resolved, updated) '
+									'VALUES (?, ?, ?, ?, ?, ?, ?)', [(scope,) + tuple(row) for row in rows])
+
+	def unmirror_issues(self, scope, keys):
+		with self.lock:
+			self.conn.executemany('DELETE FROM issue_mirror WHERE scope = ? AND jira_key = ?', [(scope, key) for key in keys])
+
+	# Returns a stored run value like the last-run watermark, or None if it was never set
+	def get_meta(self, name):
+		with self.lock:
+			row = self.conn.execute('SELECT value FROM meta WHERE name = ?', (name,)).fetchone()
+		return row[0] if row else None
+
+	def set_meta(self, name, value):
+		with self.lock:
+			self.conn.execute('INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)', (name, value))
+
+	def get_time(self, name):
+		value = self.get_meta(name)
+		return datetime.strptime(value, TIME_FORMAT) if value else None
+
+	def set_time(self, name, value):
+		self.set_meta(name, value.strftime(TIME_FORMAT))
+
+	def commit(self):
+		with self.lock:
+			self.conn.commit()
+
+	# Drops what was written since the last commit
+	def rollback(self):
+		with self.lock:
+			self.conn.rollback()
+
+	def close(self):
+		with self.lock:
+			self.conn.commit()
+			self.conn.close()
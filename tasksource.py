@@ -0,0 +1,231 @@
+'''
+Purpose - Read-only snapshots of the outlook tasks.
+
+Every property the sync needs is read from outlook exactly once per task into
+an immutable TaskSnapshot. Outlook is only written to when a task is marked
+complete because its issue was completed in Jira. Each property read on a
+live task is a call into the outlook process, so the cheap columns are read
+through Folder.GetTable when outlook supports it. The body, which a table can't
+return, is only read for the tasks that need it.
+
+The attachments of a task are listed by name and size, and saved to a file
+one at a time, so a large attachment is never held in memory.
+
+SnapshotTaskSource gives the same interface on top of snapshots already read,
+so that the tasks of one outlook read can be handed to the engines of several
+boards. The tasks they mark complete are kept for the caller to mark in
+outlook. FakeTaskSource builds on it for tests and benchmarks on machines
+without outlook.
+
+'''
+
+import re
+from collections import namedtuple
+from datetime import datetime
+
+# Immutable record of one outlook task. body is None until it is read with with_body().
+TaskSnapshot = namedtuple('TaskSnapshot', ['entryID', 'subject', 'body', 'complete', 'lastModified', 'categories'])
+
+# Attachment of a task. index is its position in the outlook item, starting at 1.
+TaskAttachment = namedtuple('TaskAttachment', ['entryID', 'index', 'filename', 'size'])
+
+# Only attachments by value are files. Hidden ones are the inline images of a mail, like signature logos.
+OL_BY_VALUE = 1
+PR_ATTACHMENT_HIDDEN = 'http://schemas.microsoft.com/mapi/proptag/0x7FFE000B'
+
+# Columns read through the outlook table
+TABLE_COLUMNS = ('EntryID', 'Subject', 'Complete', 'LastModificationTime', 'Categories')
+# Outlook's default Tasks folder, the root of folder paths
+OL_FOLDER_TASKS = 13
+# Class of task items. The other items of the To-Do list are flagged mails and contacts, completed by their flag.
+OL_TASK = 48
+OL_FLAG_COMPLETE = 1
+
+# This function turns the time of a COM property into a plain datetime
+def to_datetime(value):
+	if value is None:
+		return None
+	return datetime(value.year, value.month, value.day, value.hour, value.minute, value.second)
+
+class OutlookTaskSource(object):
+	def __init__(self, folder, namespace):
+		self.folder = folder
+		self.namespace = namespace
+
+	# Returns the number of tasks in the folder
+	def count(self):
+		return self.folder.Items.Count
+
+	# Returns snapshots of the tasks matching the outlook Restrict condition
+	def snapshot(self, condition):
+		try:
+			table = self.folder.GetTable(condition)
+		except Exception:
+			# Outlook without tables, the tasks are read one by one
+			return [self.snapshot_item(item) for item in self.folder.Items.Restrict(condition)]
+		table.Columns.RemoveAll()
+		for column in TABLE_COLUMNS:
+			table.Columns.Add(column)
+		snapshots = []
+		while not table.EndOfTable:
+			row = table.GetNextRow()
+			values = row.GetValues()
+			snapshots.append(TaskSnapshot(
+				entryID=values[0],
+				subject=values[1] or '',
+				body=None,
+				complete=bool(values[2]),
+				lastModified=to_datetime(values[3]),
+				categories=values[4] or ''))
+		return snapshots
+
+	def snapshot_item(self, item):
+		return TaskSnapshot(
+			entryID=item.EntryID,
+			subject=item.Subject or '',
+			body=item.Body or '',
+			complete=bool(item.Complete),
+			lastModified=to_datetime(item.LastModificationTime),
+			categories=item.Categories or '')
+
+	# Returns the snapshot with its body read from outlook
+	def with_body(self, snapshot):
+		if snapshot.body is not None:
+			return snapshot
+		item = self.namespace.GetItemFromID(snapshot.entryID)
+		return snapshot._replace(body=item.Body or '')
+
+	# Returns the file attachments of a task
+	def attachments(self, entryID):
+		item = self.namespace.GetItemFromID(entryID)
+		found = []
+		for index in range(1, item.Attachments.Count + 1):
+			attachment = item.Attachments.Item(index)
+			if attachment.Type != OL_BY_VALUE or is_hidden(attachment):
+				continue
+			found.append(TaskAttachment(entryID, index, attachment.FileName, attachment.Size))
+		return found
+
+	# Saves an attachment to a file. Outlook writes it there itself, it is not read into python.
+	def save_attachment(self, attachment, path):
+		item = self.namespace.GetItemFromID(attachment.entryID)
+		item.Attachments.Item(attachment.index).SaveAsFile(path)
+
+	# Marks a task complete. Returns False when it already was.
+	def mark_complete(self, entryID):
+		item = self.namespace.GetItemFromID(entryID)
+		if item.Class == OL_TASK:
+			if item.Complete:
+				return False
+			item.MarkComplete()
+		else:
+			if item.FlagStatus == OL_FLAG_COMPLETE:
+				return False
+			item.FlagStatus = OL_FLAG_COMPLETE
+		item.Save()
+		return True
+
+def is_hidden(attachment):
+	try:
+		return bool(attachment.PropertyAccessor.GetProperty(PR_ATTACHMENT_HIDDEN))
+	except Exception:
+		# The property is not set on most attachments
+		return False
+
+# This function finds an outlook folder by its path below the default Tasks folder, like "Projects/Ops"
+def find_folder(namespace, path):
+	folder = namespace.GetDefaultFolder(OL_FOLDER_TASKS)
+	for name in [part for part in path.replace('\\', '/').split('/') if part]:
+		folder = folder.Folders[name]
+	return folder
+
+# This function splits the outlook categories of a task, which are separated by commas
+def task_categories(snapshot):
+	return [category.strip() for category in (snapshot.categories or '').split(',') if category.strip()]
+
+# Conditions understood by SnapshotTaskSource, the subset of the Restrict syntax used by the adapter
+COMPLETE_CONDITION = re.compile(r"\[Complete\]\s*=\s*(TRUE|FALSE)", re.IGNORECASE)
+MODIFIED_CONDITION = re.compile(r"\[LastModificationTime\]\s*>\s*'([^']+)'", re.IGNORECASE)
+RESTRICT_DATE_FORMAT = '%m/%d/%Y %I:%M %p'
+
+# This class serves snapshots read before. Bodies not read yet are served from bodies, which holds {entryID: body}.
+class SnapshotTaskSource(object):
+	def __init__(self, snapshots=None, bodies=None):
+		self.tasks = list(snapshots or [])
+		self.bodies = dict(bodies or ())
+		# EntryIDs of the tasks marked complete, left to mark in outlook
+		self.completions = []
+		for task in self.tasks:
+			if task.body is not None:
+				self.bodies[task.entryID] = task.body
+
+	def count(self):
+		return len(self.tasks)
+
+	def snapshot(self, condition):
+		tasks = self.tasks
+		complete = COMPLETE_CONDITION.search(condition)
+		if complete:
+			tasks = [task for task in tasks if task.complete == (complete.group(1).upper() == 'TRUE')]
+		modified = MODIFIED_CONDITION.search(condition)
+		if modified:
+			since = datetime.strptime(modified.group(1), RESTRICT_DATE_FORMAT)
+			tasks = [task for task in tasks if task.lastModified > since]
+		return [task._replace(body=None) for task in tasks]
+
+	def with_body(self, snapshot):
+		if snapshot.body is not None:
+			return snapshot
+		if snapshot.entryID not in self.bodies:
+			raise KeyError('Body of task {0} was not read.'.format(snapshot.entryID))
+		return snapshot._replace(body=self.bodies[snapshot.entryID] or '')
+
+	# Snapshots carry no attachments. They are read from outlook, on the thread outlook was opened on.
+	def attachments(self, entryID):
+		return []
+
+	# Returns None, as the task is only marked in outlook by the caller
+	def mark_complete(self, entryID):
+		self.completions.append(entryID)
+		return None
+
+class FakeTaskSource(SnapshotTaskSource):
+	def __init__(self, snapshots=None):
+		super(FakeTaskSource, self).__init__(snapshots)
+		# Number of snapshot and body reads, for benchmarks
+		self.reads = 0
+		# {entryID: [(filename, bytes)]}
+		self.files = {}
+
+	# attachments is a list of (filename, bytes)
+	def add(self, entryID, subject, body='', complete=False, lastModified=None, categories='', attachments=()):
+		self.tasks.append(TaskSnapshot(entryID, subject, body, complete, lastModified or datetime.now(), categories))
+		self.bodies[entryID] = body
+		if attachments:
+			self.files[entryID] = list(attachments)
+
+	def attachments(self, entryID):
+		return [TaskAttachment(entryID, index, filename, len(data)) for index, (filename, data) in enumerate(self.files.get(entryID, []), 1)]
+
+	def save_attachment(self, attachment, path):
+		with open(path, 'wb') as f:
+			f.write(self.files[attachment.entryID][attachment.index - 1][1])
+
+	def mark_complete(self, entryID):
+		for index, task in enumerate(self.tasks):
+			if task.entryID == entryID:
+				if task.complete:
+					return False
+				self.tasks[index] = task._replace(complete=True, lastModified=datetime.now())
+				return True
+		raise KeyError('Task {0} not found.'.format(entryID))
+
+	def snapshot(self, condition):
+		self.reads += 1
+		return super(FakeTaskSource, self).snapshot(condition)
+
+	def with_body(self, snapshot):
+		if snapshot.body is not None:
+			return snapshot
+		self.reads += 1
+		return super(FakeTaskSource, self).with_body(snapshot)
@@ -0,0 +1,24 @@
+'''
+Purpose - Makes the adapter's modules, which live at the top of the repository, importable by the tests,
+and gives them a local Jira stand-in.
+
+'''
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import adapterlog
+from fakejira import FakeJira
+
+# A running Jira stand-in, with the adapter's log kept off the console
+@pytest.fixture
+def jira():
+	adapterlog.setup_logging(quiet=True)
+	jira = FakeJira(seed=3)
+	jira.start()
+	yield jira
+	jira.stop()
@@ -0,0 +1,118 @@
+'''
+Purpose - Tests of the attachment uploads: dedup, the byte budget and failures, against a recording Jira stand-in.
+
+'''
+
+import pytest
+
+from PyJiraOut import upload_attachments
+from metrics import SyncMetrics
+from syncstate import SyncState
+from tasksource import FakeTaskSource
+
+# Keeps the uploaded files by issue, and fails the uploads of the names in failing
+class RecordingJira(object):
+	def __init__(self, failing=()):
+		self.uploads = []
+		self.failing = set(failing)
+
+	def add_attachment(self, issue, attachment, filename):
+		if filename in self.failing:
+			raise IOError('Upload refused')
+		with open(attachment, 'rb') as f:
+			self.uploads.append((issue, filename, f.read()))
+
+class FailingSource(FakeTaskSource):
+	def save_attachment(self, attachment, path):
+		if attachment.filename.startswith('locked'):
+			raise RuntimeError('The operation failed.')
+		super(FailingSource, self).save_attachment(attachment, path)
+
+@pytest.fixture
+def state():
+	state = SyncState(':memory:')
+	yield state
+	state.close()
+
+def add_task(state, source, entryID, key, attachments):
+	source.add(entryID, 'Task ' + entryID, attachments=attachments)
+	state.record(entryID, key, 'hash')
+	state.queue_attachments([entryID])
+
+def upload(jira, state, source, budget=1000):
+	metrics = SyncMetrics()
+	progress = upload_attachments(jira, state, source, budget, maxWorkers=2, metrics=metrics)
+	return progress, metrics.board_tasks(None)
+
+def test_attachments_are_uploaded_once(state):
+	jira, source = RecordingJira(), FakeTaskSource()
+	add_task(state, source, 'e1', 'P-1', [('log.txt', b'x' * 10), ('shot.png', b'y' * 20)])
+	assert upload(jira, state, source)[0] == {'done': 2, 'failed': 0}
+	assert sorted(filename for issue, filename, data in jira.uploads) == ['log.txt', 'shot.png']
+	assert state.queued_attachments() == []
+	# Synced again, the same files are found on the issue by name and size
+	state.queue_attachments(['e1'])
+	progress, tasks = upload(jira, state, source)
+	assert progress['done'] == 0
+	assert tasks['attachments_skipped'] == 2
+
+def test_same_content_under_another_name_is_skipped(state):
+	jira, source = RecordingJira(), FakeTaskSource()
+	add_task(state, source, 'e1', 'P-1', [('log.txt', b'x' * 10)])
+	upload(jira, state, source)
+	source.files['e1'].append(('copy of log.txt', b'x' * 10))
+	state.queue_attachments(['e1'])
+	progress, tasks = upload(jira, state, source)
+	assert progress['done'] == 0
+	assert tasks['attachments_skipped'] == 2
+
+def test_budget_defers_to_the_next_cycle(state):
+	jira, source = RecordingJira(), FakeTaskSource()
+	add_task(state, source, 'e1', 'P-1', [('a.bin', b'a' * 60), ('b.bin', b'b' * 60)])
+	progress, tasks = upload(jira, state, source, budget=100)
+	assert progress['done'] == 1
+	assert tasks['attachments_deferred'] == 1
+	assert state.queued_attachments() == ['e1']
+	progress, tasks = upload(jira, state, source, budget=100)
+	assert progress['done'] == 1
+	assert tasks['attachments_skipped'] == 1
+	assert state.queued_attachments() == []
+	assert len(jira.uploads) == 2
+
+def test_attachment_bigger_than_the_budget_is_skipped(state):
+	jira, source = RecordingJira(), FakeTaskSource()
+	add_task(state, source, 'e1', 'P-1', [('huge.iso', b'h' * 150), ('log.txt', b'x' * 10)])
+	progress, tasks = upload(jira, state, source, budget=100)
+	assert progress['done'] == 1
+	assert tasks['attachments_too_large'] == 1
+	assert 'attachments_deferred' not in tasks
+	# Nothing uploadable is left, the task is not listed again
+	assert state.queued_attachments() == []
+
+def test_failed_save_moves_on(state):
+	jira, source = RecordingJira(), FailingSource()
+	add_task(state, source, 'e1', 'P-1', [('locked.xlsx', b'l' * 10), ('log.txt', b'x' * 10)])
+	add_task(state, source, 'e2', 'P-2', [('shot.png', b'y' * 10)])
+	progress, tasks = upload(jira, state, source)
+	assert progress == {'done': 2, 'failed': 0}
+	assert tasks['attachment_save_failed'] == 1
+	assert sorted((issue, filename) for issue, filename, data in jira.uploads) == [('P-1', 'log.txt'), ('P-2', 'shot.png')]
+	assert state.queued_attachments() == []
+
+def test_failed_upload_is_retried(state):
+	jira, source = RecordingJira(failing=['log.txt']), FakeTaskSource()
+	add_task(state, source, 'e1', 'P-1', [('log.txt', b'x' * 10), ('shot.png', b'y' * 10)])
+	progress, tasks = upload(jira, state, source)
+	assert progress == {'done': 1, 'failed': 1}
+	assert tasks['attachment_upload_failed'] == 1
+	assert state.queued_attachments() == ['e1']
+	jira.failing.clear()
+	assert upload(jira, state, source)[0] == {'done': 1, 'failed': 0}
+	assert state.queued_attachments() == []
+
+def test_task_without_issue_leaves_the_queue(state):
+	jira, source = RecordingJira(), FakeTaskSource()
+	source.add('e1', 'Task e1', attachments=[('log.txt', b'x')])
+	state.queue_attachments(['e1'])
+	assert upload(jira, state, source)[0]['done'] == 0
+	assert state.queued_attachments() == []
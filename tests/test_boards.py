@@ -0,0 +1,74 @@
+'''
+Purpose - Tests of the board profiles and the routing of tasks between them.
+
+'''
+
+from configparser import ConfigParser
+from datetime import datetime
+
+from boards import BoardProfile, DEFAULT_LABEL, DEFAULT_PROFILE, read_profiles, route_tasks
+from PyJiraOut import MultiBoardEngine
+from tasksource import FakeTaskSource, TaskSnapshot
+
+DEFAULT = BoardProfile(DEFAULT_PROFILE, 'Main', '10100', 'jdoe', DEFAULT_LABEL, (), None)
+OPS = BoardProfile('ops', 'Operations', '10200', 'jdoe', DEFAULT_LABEL, ('Ops', 'Servers'), 'Projects/Ops')
+FINANCE = BoardProfile('finance', 'Finance', '10300', 'jdoe', DEFAULT_LABEL, ('Budget',), None)
+ARCHIVE = BoardProfile('archive', 'Archive', '10400', 'jdoe', DEFAULT_LABEL, (), 'Projects/Old')
+PROFILES = (DEFAULT, OPS, FINANCE, ARCHIVE)
+
+def task(entryID, categories=''):
+	return TaskSnapshot(entryID, 'Task ' + entryID, None, False, datetime.now(), categories)
+
+def names(routed):
+	return dict((name, [task.entryID for task in tasks]) for name, tasks in routed.items() if tasks)
+
+def test_todo_tasks_go_by_category_to_any_board():
+	routed = route_tasks(PROFILES, [task('e1', 'Servers'), task('e2', 'Budget, Ops'), task('e3', 'Private'), task('e4')])
+	assert names(routed) == {'ops': ['e1', 'e2'], DEFAULT_PROFILE: ['e3', 'e4']}
+
+def test_folder_tasks_go_by_category_then_to_the_folder_board():
+	routed = route_tasks(PROFILES, [task('e1', 'Budget'), task('e2', 'Servers'), task('e3')], 'Projects/Old')
+	assert names(routed) == {'finance': ['e1'], 'ops': ['e2'], 'archive': ['e3']}
+
+def test_tasks_of_an_unknown_folder_are_not_routed():
+	assert names(route_tasks(PROFILES, [task('e1')], 'Projects/Other')) == {}
+
+def test_todo_list_tasks_of_a_folder_go_to_one_board(jira, tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	todo = FakeTaskSource()
+	folder = FakeTaskSource()
+	# The To-Do list shows the flagged task of the folder too
+	for source in (todo, folder):
+		source.add('e1', 'Restart the mail relay', 'Body one')
+	todo.add('e2', 'Book the team offsite', 'Body two')
+	ops = BoardProfile('ops', 'Operations', 'Q', 'bench', DEFAULT_LABEL, (), 'Projects/Ops')
+	engine = MultiBoardEngine('bench', 'bench', 'bench', 'Main', 'P', jira.url, profiles=(ops,), sources={None: todo, 'Projects/Ops': folder})
+	try:
+		assert engine.sync()
+		assert sorted((issue['project'], issue['summary']) for issue in jira.issues.values()) == [
+			('P', 'Book the team offsite'), ('Q', 'Restart the mail relay')]
+		state = engine.primary.state
+		assert state.get('e1', ':ops') is not None and state.get('e1') is None
+		assert state.get('e2') is not None and state.get('e2', ':ops') is None
+	finally:
+		engine.close()
+
+def test_boards_share_the_workers(jira, tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	profiles = tuple(BoardProfile(name, name, 'Q', 'bench', DEFAULT_LABEL, (), None) for name in ('ops', 'finance'))
+	engine = MultiBoardEngine('bench', 'bench', 'bench', 'Main', 'P', jira.url, maxWorkers=7, profiles=profiles, sources={None: FakeTaskSource()})
+	try:
+		engine.connect()
+		assert [board.maxWorkers for board in engine.engines] == [2, 2, 2]
+	finally:
+		engine.close()
+
+def test_profiles_are_read_with_defaults():
+	config = ConfigParser()
+	config.read_string(u'[jiraout]\njiraid = jdoe\n\n'
+						u'[board:ops]\nboardname = Operations\nboardid = 10200\ncategories = Ops, Servers\nfolder = Projects/Ops\n\n'
+						u'[board:finance]\nboardname = Finance\nboardid = 10300\njiraid = cfo\nlabel = Budget\n')
+	assert read_profiles(config, 'jdoe') == (
+		BoardProfile('ops', 'Operations', '10200', 'jdoe', DEFAULT_LABEL, ('Ops', 'Servers'), 'Projects/Ops'),
+		BoardProfile('finance', 'Finance', '10300', 'cfo', 'Budget', (), None),
+	)
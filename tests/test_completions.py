@@ -0,0 +1,65 @@
+'''
+Purpose - Tests of the outlook tasks marked complete when their issues are completed in Jira.
+
+'''
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import PyJiraOut
+from syncstate import SyncState
+from tasksource import FakeTaskSource, TaskSnapshot
+from webhooks import CachedIssue
+
+@pytest.fixture
+def state(tmp_path):
+	state = SyncState(str(tmp_path / 'state.db'))
+	yield state
+	state.close()
+
+def issue(key, status, updated):
+	return CachedIssue({'key': key, 'fields': {'status': {'name': status}, 'updated': updated.astimezone().strftime('%Y-%m-%dT%H:%M:%S.000%z')}})
+
+def task(entryID, lastModified, complete=False):
+	return TaskSnapshot(entryID, 'Task ' + entryID, None, complete, lastModified, '')
+
+def test_tasks_of_completed_issues_are_planned(state):
+	hourAgo = datetime.now() - timedelta(hours=1)
+	for entryID, key in (('e1', 'P-1'), ('e2', 'P-2'), ('e3', 'P-3')):
+		state.record(entryID, key, 'hash')
+	tasks = [task('e1', hourAgo), task('e2', hourAgo)]
+	completions = PyJiraOut.plan_completions(state, [issue('P-1', 'Done', datetime.now()), issue('P-2', 'Closed', datetime.now())], tasks, [])
+	assert [(completion.entryID, completion.key, completion.status) for completion in completions] == [('e1', 'P-1', 'Done'), ('e2', 'P-2', 'Closed')]
+
+def test_tasks_edited_after_their_issue_or_already_complete_are_left(state):
+	hourAgo = datetime.now() - timedelta(hours=1)
+	for entryID, key in (('e1', 'P-1'), ('e2', 'P-2')):
+		state.record(entryID, key, 'hash')
+	# e1 was reopened in outlook after its issue was completed, e2 is complete in outlook already
+	tasks = [task('e1', datetime.now().replace(microsecond=0))]
+	completed = [task('e2', hourAgo, complete=True)]
+	issues = [issue('P-1', 'Done', hourAgo), issue('P-2', 'Done', datetime.now()), issue('P-9', 'Done', datetime.now())]
+	assert PyJiraOut.plan_completions(state, issues, tasks, completed) == []
+
+def test_issues_of_another_board_are_left(state):
+	state.record('e1', 'Q-1', 'hash', scope=':ops')
+	assert PyJiraOut.plan_completions(state, [issue('Q-1', 'Done', datetime.now())], [], []) == []
+	assert len(PyJiraOut.plan_completions(state, [issue('Q-1', 'Done', datetime.now())], [], [], ':ops')) == 1
+
+def test_issue_completed_in_jira_completes_its_task(jira, tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	source = FakeTaskSource()
+	for entryID in ('e1', 'e2'):
+		source.add(entryID, 'Task ' + entryID, 'Body', lastModified=datetime.now() - timedelta(hours=1))
+	engine = PyJiraOut.SyncEngine('bench', 'bench', 'bench', 'B', 'P', jira.url, source=source)
+	try:
+		assert engine.sync()
+		jira.set_status(jira.issues[engine.state.get('e1')['jira_key']], 'Done')
+		assert engine.sync()
+		assert engine.metrics.summary()['tasks']['completed_in_outlook'] == 1
+		assert [(task.entryID, task.complete) for task in source.tasks] == [('e1', True), ('e2', False)]
+		# The issue is not moved again for its now complete task
+		assert jira.issues[engine.state.get('e1')['jira_key']]['status'] == 'Done'
+	finally:
+		engine.close()
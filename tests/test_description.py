@@ -0,0 +1,80 @@
+'''
+Purpose - Tests of the description pipeline: quote and signature stripping, wiki escaping and the cap.
+
+'''
+
+from description import DEFAULT_FORMAT, FULL_BODY_FILENAME, SIGNATURE_LINES, render_description
+
+PLAIN = DEFAULT_FORMAT._replace(wiki=False)
+
+def describe(body, rules=PLAIN):
+	return render_description(body, rules).text
+
+def test_reply_is_dropped():
+	body = 'Please restart the queue.\r\n\r\nFrom: Ops Team\r\nSent: Monday\r\nTo: me\r\n\r\nOld thread\r\n'
+	assert describe(body) == 'Please restart the queue.'
+
+def test_lines_quoted_with_a_caret_are_dropped():
+	body = 'Done on my side.\n> did you restart it?\n> thanks\nCheck the logs.'
+	assert describe(body) == 'Done on my side.\nCheck the logs.'
+
+def test_forwarded_mail_is_kept():
+	body = '-----Original Message-----\nFrom: Ops Team\nSent: Monday\n\nThe disk of db01 is full.\n\nOn Monday Ops wrote:\nolder reply'
+	assert describe(body) == '-----Original Message-----\nFrom: Ops Team\nSent: Monday\n\nThe disk of db01 is full.'
+
+def test_from_line_of_the_task_is_kept():
+	body = 'From: the backlog meeting\nRenew the certificate.'
+	assert describe(body) == body
+
+def test_signature_is_dropped():
+	body = 'Renew the certificate.\n\n-- \nJane Doe\nOperations\n+1 555 0100'
+	assert describe(body) == 'Renew the certificate.'
+	assert describe('Renew the certificate.\r\n\r\nSent from my phone\r\n') == 'Renew the certificate.'
+
+def test_bare_double_dash_is_text():
+	body = 'Steps to deploy\n--\n1. stop service\n2. copy files\n3. start service'
+	assert describe(body) == body
+
+def test_delimiter_followed_by_more_than_a_signature_is_text():
+	body = 'Steps to deploy\n-- \n' + '\n'.join('{0}. step'.format(number) for number in range(1, SIGNATURE_LINES + 2))
+	assert describe(body) == body.replace('-- \n', '--\n')
+
+def test_signature_after_text_with_a_delimiter_is_dropped():
+	steps = '\n'.join('{0}. step'.format(number) for number in range(1, SIGNATURE_LINES + 2))
+	body = 'Steps to deploy\n-- \n' + steps + '\n\n-- \nJane Doe'
+	assert describe(body) == 'Steps to deploy\n--\n' + steps
+
+def test_signature_is_kept_when_stripping_is_off():
+	body = 'Renew the certificate.\n-- \nJane Doe'
+	assert describe(body, PLAIN._replace(stripSignature=False)) == 'Renew the certificate.\n--\nJane Doe'
+
+def test_wiki_markup():
+	body = 'Copy the files:\n• from \\\\fileserver\\ops\n- to {backup} [old]|new\n1) see <https://wiki.example.com/ops>\nmail Jane <mailto:jane@example.com>'
+	assert describe(body, DEFAULT_FORMAT) == ('Copy the files:\n* from \\\\\\\\fileserver\\\\ops\n* to \\{backup\\} \\[old\\]\\|new\n'
+												'# see [https://wiki.example.com/ops]\nmail Jane')
+
+def test_blank_lines_are_squeezed():
+	assert describe('\n\nfirst  \n\n\n\nsecond\n\n') == 'first\n\nsecond'
+
+def test_short_body_is_not_capped():
+	description = render_description('Renew the certificate.', DEFAULT_FORMAT._replace(maxChars=100))
+	assert description.original is None
+
+def test_long_body_is_capped_and_attached():
+	body = '\n'.join('line {0}'.format(number) for number in range(1000))
+	description = render_description(body, PLAIN._replace(maxChars=200))
+	assert len(description.text) <= 200
+	assert description.text.startswith('line 0\nline 1\n')
+	assert description.text.endswith('the full text is attached as {0}._'.format(FULL_BODY_FILENAME))
+	assert description.original == body
+
+def test_capped_body_without_attachment():
+	body = '\n'.join('line {0}'.format(number) for number in range(1000))
+	description = render_description(body, PLAIN._replace(maxChars=200, attachFull=False))
+	assert len(description.text) <= 200
+	assert description.text.endswith('_The description was shortened._')
+	assert description.original is None
+
+def test_empty_body():
+	assert render_description(None).text == ''
+	assert render_description('').original is None
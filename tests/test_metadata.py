@@ -0,0 +1,70 @@
+'''
+Purpose - Tests of the Jira metadata cache, which creates issues by ID and refuses a misconfigured board up front.
+
+'''
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import PyJiraOut
+from jirameta import MetadataCache
+from tasksource import FakeTaskSource, TaskSnapshot
+
+@pytest.fixture
+def engine(jira, tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	source = FakeTaskSource()
+	source.add('e1', 'Renew the build server certificate', 'Body one', lastModified=datetime.now() - timedelta(hours=1))
+	engine = PyJiraOut.SyncEngine('bench', 'bench', 'bench', 'B', 'P', jira.url, source=source)
+	engine.connect()
+	yield engine
+	engine.close()
+
+def issue_fields(engine, subject='Order keyboards for the support desk'):
+	return PyJiraOut.build_issue_dict('P', TaskSnapshot('e9', subject, 'Body', False, datetime.now(), ''), engine.defaulttaskvalues)
+
+def test_names_are_sent_as_ids(engine):
+	fields = engine.metadata.resolve(issue_fields(engine))
+	assert fields['issuetype'] == {'id': '10001'}
+	assert fields['priority'] == {'id': '3'}
+	assert fields['components'] == [{'id': '10100'}]
+
+def test_metadata_is_kept_for_its_time_to_live(jira, engine):
+	engine.metadata.resolve(issue_fields(engine))
+	jira.reset_counts()
+	MetadataCache(engine.jira, engine.state, 'P').resolve(issue_fields(engine))
+	assert jira.counts_by_endpoint() == {}
+	MetadataCache(engine.jira, engine.state, 'P', ttl=timedelta(0)).resolve(issue_fields(engine))
+	assert jira.counts_by_endpoint()['GET priority'] == 1
+
+def test_unknown_priority_and_component_are_refused(jira, engine):
+	del jira.priorities['3']
+	jira.components = {}
+	with pytest.raises(ValueError) as error:
+		engine.metadata.resolve(issue_fields(engine))
+	assert 'Priority "Medium"' in str(error.value)
+	assert 'Component "Maintenance Tasks"' in str(error.value)
+
+def test_required_field_missing_from_the_issues_is_refused(jira, engine):
+	jira.createFields['duedate'] = (True, False)
+	with pytest.raises(ValueError) as error:
+		engine.metadata.resolve(issue_fields(engine))
+	assert 'Required field' in str(error.value)
+
+def test_refused_issues_are_not_sent(jira, engine):
+	jira.components = {}
+	jira.reset_counts()
+	assert engine.sync()
+	assert engine.metrics.summary()['tasks']['create_failed'] == 1
+	assert 'POST issue/bulk' not in jira.counts_by_endpoint()
+	assert engine.state.queued_retries('') == ['e1']
+	# The metadata is dropped, so a fixed project is seen on the next cycle
+	assert engine.state.get_meta('jira_metadata:P') == ''
+
+def test_issues_are_sent_by_name_when_the_metadata_is_unavailable(engine):
+	class Unavailable(object):
+		def resolve(self, fields):
+			raise ConnectionError('Jira is down')
+	fields = [issue_fields(engine), issue_fields(engine, 'Book the team offsite')]
+	assert PyJiraOut.resolve_issue_fields(Unavailable(), fields) == fields
@@ -0,0 +1,78 @@
+'''
+Purpose - Tests of the mirror of the board's issues kept in the sync state.
+
+'''
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import PyJiraOut
+from issuemirror import IssueMirror
+from syncstate import SyncState
+from tasksource import FakeTaskSource
+from webhooks import CachedIssue
+
+NOON = datetime(2026, 3, 2, 12, 0)
+
+@pytest.fixture
+def state(tmp_path):
+	state = SyncState(str(tmp_path / 'state.db'))
+	yield state
+	state.close()
+
+def issue(key, summary, status='NS'):
+	return CachedIssue({'key': key, 'id': key[2:], 'fields': {'summary': summary, 'status': {'name': status}, 'resolutiondate': None,
+						'updated': '2026-03-02T11:00:00.000+0000'}})
+
+def summaries(mirror):
+	return sorted((issue.key, issue.fields.summary) for issue in mirror.all_issues())
+
+def test_full_search_is_due_until_the_first_and_after_each_reconcile_interval(state):
+	mirror = IssueMirror(state, 'P|bench|OutlookTasks', reconcileInterval=timedelta(hours=24))
+	assert mirror.since(NOON) is None
+	mirror.replace([issue('P-1', 'One')], NOON)
+	assert mirror.since(NOON + timedelta(hours=1)) == NOON
+	mirror.update([], NOON + timedelta(hours=1))
+	assert mirror.since(NOON + timedelta(hours=2)) == NOON + timedelta(hours=1)
+	assert mirror.since(NOON + timedelta(hours=24)) is None
+
+def test_changed_issues_are_applied_and_closed_ones_dropped(state):
+	mirror = IssueMirror(state, 'P|bench|OutlookTasks')
+	mirror.replace([issue('P-1', 'One'), issue('P-2', 'Two')], NOON)
+	assert mirror.update([issue('P-1', 'One renamed', 'WIP'), issue('P-2', 'Two', 'Closed'), issue('P-3', 'Three')], NOON) == 3
+	assert summaries(mirror) == [('P-1', 'One renamed'), ('P-3', 'Three')]
+	# A restarted adapter loads the same issues from the sync state
+	assert summaries(IssueMirror(state, 'P|bench|OutlookTasks')) == summaries(mirror)
+	assert len(IssueMirror(state, 'Q|bench|OutlookTasks')) == 0
+
+def test_restarted_engine_searches_only_the_changed_issues(jira, tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	source = FakeTaskSource()
+	for entryID in ('e1', 'e2', 'e3'):
+		source.add(entryID, 'Task ' + entryID, 'Body', lastModified=datetime.now() - timedelta(hours=1))
+	engine = PyJiraOut.SyncEngine('bench', 'bench', 'bench', 'B', 'P', jira.url, source=source)
+	# The issues created by the first cycle enter the mirror on the second
+	assert engine.sync() and engine.sync()
+	keys = sorted(jira.issues)
+	assert len(engine.mirror) == 3
+	engine.close()
+	jira.set_status(jira.issues[keys[0]], 'Closed')
+	jira.issues[keys[1]]['summary'] = 'Renamed in Jira'
+	jira.touch(jira.issues[keys[1]])
+	# An issue deleted in Jira shows up in no search of changed issues
+	del jira.issues[keys[2]]
+	jira.reset_counts()
+	engine = PyJiraOut.SyncEngine('bench', 'bench', 'bench', 'B', 'P', jira.url, source=source)
+	try:
+		engine.connect()
+		jira.reset_counts()
+		board = engine.board_issues(datetime.now())
+		assert jira.counts_by_endpoint()['GET search'] == 1
+		assert sorted((issue.key, issue.fields.summary) for issue in board) == [(keys[1], 'Renamed in Jira'), (keys[2], 'Task e3')]
+		# Once a day the mirror is replaced by a full search
+		engine.state.set_time('mirror_reconciled:' + engine.mirror.scope, datetime.now() - timedelta(days=2))
+		assert [issue.key for issue in engine.board_issues(datetime.now())] == [keys[1]]
+		assert len(engine.mirror) == 1
+	finally:
+		engine.close()
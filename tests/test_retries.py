@@ -0,0 +1,96 @@
+'''
+Purpose - Tests of the retry queue, which plans tasks that failed to sync again after the watermark passed them.
+
+'''
+
+from datetime import datetime, timedelta
+
+import pytest
+from jira.exceptions import JIRAError
+
+import PyJiraOut
+from retrypolicy import RetryingJira, RetryPolicy
+from tasksource import FakeTaskSource
+
+@pytest.fixture
+def source():
+	source = FakeTaskSource()
+	source.add('e1', 'Renew the build server certificate', 'Body one', lastModified=datetime.now() - timedelta(hours=1))
+	source.add('e2', 'Order keyboards for the support desk', 'Body two', lastModified=datetime.now() - timedelta(hours=1))
+	return source
+
+@pytest.fixture
+def engine(jira, source, tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	engine = PyJiraOut.SyncEngine('bench', 'bench', 'bench', 'B', 'P', jira.url, source=source)
+	yield engine
+	engine.close()
+
+# The next cycle starts later than the failed one, past the overlap of the watermark
+def later(engine):
+	engine.state.set_time('watermark', datetime.now() + timedelta(hours=1))
+
+def summaries(jira):
+	return sorted(issue['summary'] for issue in jira.issues.values())
+
+def test_failed_update_is_retried(jira, source, engine, monkeypatch):
+	assert engine.sync()
+	source.tasks[0] = source.tasks[0]._replace(subject='Renew the build server certificate today', lastModified=datetime.now())
+	updateIssues = PyJiraOut.update_issues
+	monkeypatch.setattr(PyJiraOut, 'update_issues', lambda jira, updates, maxWorkers: [(update, False) for update in updates])
+	assert engine.sync()
+	assert engine.metrics.summary()['tasks']['update_failed'] == 1
+	assert engine.state.queued_retries('') == ['e1']
+	later(engine)
+	monkeypatch.setattr(PyJiraOut, 'update_issues', updateIssues)
+	assert engine.sync()
+	assert engine.metrics.summary()['tasks']['updated'] == 1
+	assert 'Renew the build server certificate today' in summaries(jira)
+	assert engine.state.queued_retries('') == []
+
+def test_failed_create_is_retried(jira, engine, monkeypatch):
+	createIssues = PyJiraOut.create_workitem_tasks_bulk
+	monkeypatch.setattr(PyJiraOut, 'create_workitem_tasks_bulk', lambda jira, project, tasks, *args, **kwargs: [(task, None) for task in tasks])
+	assert engine.sync()
+	assert engine.metrics.summary()['tasks']['create_failed'] == 2
+	assert sorted(engine.state.queued_retries('')) == ['e1', 'e2']
+	later(engine)
+	monkeypatch.setattr(PyJiraOut, 'create_workitem_tasks_bulk', createIssues)
+	assert engine.sync()
+	assert engine.metrics.summary()['tasks']['created'] == 2
+	assert summaries(jira) == ['Order keyboards for the support desk', 'Renew the build server certificate']
+	assert engine.state.queued_retries('') == []
+
+def test_task_whose_lookup_failed_is_retried(jira, engine, monkeypatch):
+	getExisting = PyJiraOut.get_existing_workitem
+	# No index of the board, and the search of each task fails
+	monkeypatch.setattr(engine, 'board_issues', lambda started: None)
+	monkeypatch.setattr(PyJiraOut, 'get_existing_workitem', lambda *args, **kwargs: 'None')
+	assert engine.sync()
+	assert engine.metrics.summary()['tasks']['lookup_failed'] == 2
+	assert summaries(jira) == []
+	assert sorted(engine.state.queued_retries('')) == ['e1', 'e2']
+	later(engine)
+	monkeypatch.setattr(PyJiraOut, 'get_existing_workitem', getExisting)
+	assert engine.sync()
+	assert engine.metrics.summary()['tasks']['created'] == 2
+	assert engine.state.queued_retries('') == []
+
+def test_transition_is_not_repeated_after_a_server_error():
+	calls = []
+	class Client(object):
+		def transition_issue(self, issue, transition):
+			calls.append((issue, transition))
+			raise JIRAError(status_code=503, text='Service Unavailable')
+	jira = RetryingJira(Client(), RetryPolicy(baseDelay=0))
+	with pytest.raises(JIRAError):
+		jira.transition_issue('P-1', '31')
+	assert calls == [('P-1', '31')]
+
+def test_vanished_task_leaves_the_queue(source, engine, monkeypatch):
+	monkeypatch.setattr(PyJiraOut, 'create_workitem_tasks_bulk', lambda jira, project, tasks, *args, **kwargs: [(task, None) for task in tasks])
+	assert engine.sync()
+	del source.tasks[:]
+	later(engine)
+	assert engine.sync()
+	assert engine.state.queued_retries('') == []
@@ -0,0 +1,85 @@
+'''
+Purpose - Tests of the adaptive schedule of the sync cycles.
+
+'''
+
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from scheduler import AdaptiveScheduler, parse_quiet_hours
+
+NOON = datetime(2026, 3, 2, 12, 0)
+
+@pytest.fixture
+def schedule():
+	return AdaptiveScheduler(minInterval=2, baseInterval=10, maxInterval=60, maxBackoff=120, jitter=0, path=None)
+
+def minutes(seconds):
+	return seconds / 60
+
+def test_idle_cycles_stretch_the_interval_up_to_the_maximum(schedule):
+	delays = [minutes(schedule.cycle_done(True, 0, NOON)) for cycle in range(6)]
+	assert delays == [15, 22.5, 33.75, 50.625, 60, 60]
+
+def test_busy_cycles_halve_the_interval_down_to_the_minimum(schedule):
+	delays = [minutes(schedule.cycle_done(True, 3, NOON)) for cycle in range(4)]
+	assert delays == [5, 2.5, 2, 2]
+
+def test_failed_cycles_back_off_up_to_the_maximum_backoff(schedule):
+	delays = [minutes(schedule.cycle_done(False, 0, NOON)) for cycle in range(6)]
+	assert delays == [10, 20, 40, 80, 120, 120]
+	# A cycle that works again goes back to the interval
+	assert minutes(schedule.cycle_done(True, 1, NOON)) == 5
+	assert schedule.failures == 0
+
+def test_cancelled_cycle_keeps_the_interval_and_the_backoff(schedule):
+	schedule.cycle_done(True, 1, NOON)
+	assert minutes(schedule.cycle_cancelled(NOON)) == 5
+	assert schedule.interval == timedelta(minutes=5)
+	schedule.cycle_done(False, 0, NOON)
+	schedule.cycle_done(False, 0, NOON)
+	assert minutes(schedule.cycle_cancelled(NOON)) == 20
+	assert schedule.failures == 2
+
+def test_quiet_hours_wrap_around_midnight(schedule):
+	schedule.quietHours = parse_quiet_hours('20-7')
+	assert [schedule.quiet(NOON.replace(hour=hour)) for hour in (19, 20, 23, 0, 6, 7)] == [False, True, True, True, True, False]
+	# Busy cycles during the quiet hours wait the maximum interval
+	assert minutes(schedule.cycle_done(True, 3, NOON.replace(hour=23))) == 60
+	assert minutes(schedule.cycle_done(True, 3, NOON)) == 2.5
+
+def test_quiet_hours_within_a_day(schedule):
+	schedule.quietHours = parse_quiet_hours('12-14')
+	assert [schedule.quiet(NOON.replace(hour=hour)) for hour in (11, 12, 13, 14)] == [False, True, True, False]
+
+@pytest.mark.parametrize('value', ['20', '25-7', 'night'])
+def test_bad_quiet_hours_are_rejected(value):
+	with pytest.raises(ValueError):
+		parse_quiet_hours(value)
+
+def test_saved_schedule_is_loaded_with_the_interval_clamped(tmp_path):
+	path = str(tmp_path / 'schedule.json')
+	with open(path, 'w') as f:
+		json.dump({'next_run': '2026-03-02T12:30:00', 'interval_seconds': 6 * 3600, 'failures': 2}, f)
+	schedule = AdaptiveScheduler(minInterval=2, baseInterval=10, maxInterval=60, maxBackoff=120, path=path).load()
+	assert schedule.nextRun == datetime(2026, 3, 2, 12, 30)
+	assert schedule.interval == timedelta(minutes=60)
+	assert schedule.failures == 2
+	assert schedule.remaining(NOON) == 30 * 60
+	with open(path, 'w') as f:
+		json.dump({'next_run': None, 'interval_seconds': 1, 'failures': 0}, f)
+	assert AdaptiveScheduler(path=path).load().interval == timedelta(minutes=2)
+
+def test_unreadable_schedule_leaves_the_defaults(tmp_path):
+	path = tmp_path / 'schedule.json'
+	path.write_text('not json')
+	schedule = AdaptiveScheduler(path=str(path)).load()
+	assert schedule.nextRun is None and schedule.interval == timedelta(minutes=10)
+
+def test_schedule_is_saved_after_a_cycle(tmp_path):
+	path = str(tmp_path / 'schedule.json')
+	schedule = AdaptiveScheduler(jitter=0, path=path)
+	schedule.cycle_done(True, 0, NOON)
+	assert AdaptiveScheduler(path=path).load().nextRun == NOON + timedelta(minutes=15)
@@ -0,0 +1,52 @@
+'''
+Purpose - Tests of the local subject matcher, mostly its near misses.
+
+'''
+
+import pytest
+
+from subjectmatch import SubjectMatcher, normalize_subject, subject_numbers
+
+def matcher(*summaries):
+	index = SubjectMatcher()
+	for summary in summaries:
+		index.add(summary, summary)
+	return index
+
+def test_exact_match_ignores_prefixes_case_and_punctuation():
+	index = matcher('Renew the SSL certificate of the build server')
+	assert index.match('RE: FW: renew the SSL certificate, of the build server!') == 'Renew the SSL certificate of the build server'
+
+def test_near_duplicate_is_matched():
+	index = matcher('Renew the SSL certificate of the build server')
+	assert index.match('Renew the SSL certificates of the build server') == 'Renew the SSL certificate of the build server'
+
+@pytest.mark.parametrize('summary, subject', [
+	('Prepare the status report for project Alpha week 41', 'Prepare the status report for project Alpha week 42'),
+	('Q3 budget review with the finance team', 'Q4 budget review with the finance team'),
+	('Upgrade the build agents to release 2.4', 'Upgrade the build agents to release 2.5'),
+	('Monthly patching of server 12 in rack 3', 'Monthly patching of server 13 in rack 3'),
+	('Archive the mailbox of the 2025 interns', 'Archive the mailbox of the interns'),
+])
+def test_recurring_tasks_with_other_numbers_are_not_matched(summary, subject):
+	assert matcher(summary).match(subject) is None
+
+def test_numbers_compare_by_value():
+	index = matcher('Prepare the status report for project Alpha week 07')
+	assert index.match('Prepare the status report for project Alpha week 7') == 'Prepare the status report for project Alpha week 07'
+	assert subject_numbers(normalize_subject('Release 2.4, build 0031')) == (24, 31)
+
+def test_unrelated_subject_is_not_matched():
+	index = matcher('Renew the SSL certificate of the build server')
+	assert index.match('Order new keyboards for the support desk') is None
+
+def test_removed_issue_is_not_matched():
+	index = matcher('Renew the SSL certificate of the build server')
+	index.remove('Renew the SSL certificate of the build server')
+	assert len(index) == 0
+	assert index.match('Renew the SSL certificates of the build server') is None
+
+def test_threshold_of_one_only_matches_exactly():
+	index = SubjectMatcher(threshold=1)
+	index.add('Renew the SSL certificate of the build server', 'issue')
+	assert index.match('Renew the SSL certificates of the build server') is None
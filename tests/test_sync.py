@@ -0,0 +1,50 @@
+'''
+Purpose - Tests of sync cycles against the local Jira stand-in and a fake task source.
+
+'''
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import PyJiraOut
+from tasksource import FakeTaskSource
+
+@pytest.fixture
+def source():
+	source = FakeTaskSource()
+	source.add('e1', 'Renew the build server certificate', 'Body one', lastModified=datetime.now() - timedelta(hours=1))
+	return source
+
+@pytest.fixture
+def engine(jira, source, tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	engine = PyJiraOut.SyncEngine('bench', 'bench', 'bench', 'B', 'P', jira.url, source=source)
+	yield engine
+	engine.close()
+
+def summaries(jira):
+	return sorted(issue['summary'] for issue in jira.issues.values())
+
+def test_edit_made_while_the_cycle_applies_is_synced_next(jira, source, engine, monkeypatch):
+	createIssues = PyJiraOut.create_workitem_tasks_bulk
+	def create_and_edit(*args, **kwargs):
+		results = createIssues(*args, **kwargs)
+		# The user renames the task while its issue is being created. Outlook keeps the time to the second.
+		source.tasks[0] = source.tasks[0]._replace(subject='Renew the build server certificate today', lastModified=datetime.now().replace(microsecond=0))
+		return results
+	monkeypatch.setattr(PyJiraOut, 'create_workitem_tasks_bulk', create_and_edit)
+	assert engine.sync()
+	assert summaries(jira) == ['Renew the build server certificate']
+	monkeypatch.setattr(PyJiraOut, 'create_workitem_tasks_bulk', createIssues)
+	assert engine.sync()
+	assert engine.metrics.summary()['tasks'].get('updated') == 1
+	assert summaries(jira) == ['Renew the build server certificate today']
+
+def test_unchanged_task_is_skipped_by_a_full_sweep(source, engine):
+	assert engine.sync()
+	engine.state.set_time('last_full_sweep', datetime.now() - timedelta(days=2))
+	assert engine.sync()
+	tasks = engine.metrics.summary()['tasks']
+	assert tasks['skipped'] == 1
+	assert 'updated' not in tasks
@@ -0,0 +1,28 @@
+'''
+Purpose - Tests of the transition planner against the local Jira stand-in.
+
+'''
+
+import pytest
+
+import PyJiraOut
+
+@pytest.fixture
+def planner(jira):
+	return PyJiraOut.TransitionPlanner(PyJiraOut.jira_login(jira.url, 'bench', 'bench'))
+
+def test_issue_is_moved_along_the_workflow(jira, planner):
+	issue = jira.add_issue('Renew the certificate', status='NS')
+	assert planner.move(issue['key'], 'Done') == 'Done'
+	assert issue['status'] == 'Done'
+	assert sorted(planner.transitionIDs) == ['NS', 'Ready', 'WIP']
+
+def test_stale_status_does_not_save_the_transitions_under_it(jira, planner):
+	issue = jira.add_issue('Renew the certificate', status='WIP')
+	# The status of a cached issue that was moved in Jira since
+	with pytest.raises(ValueError):
+		planner.move(issue['key'], 'Done', status='NS')
+	assert 'NS' not in planner.transitionIDs
+	assert planner.transitionIDs['WIP'] == {'WIP to Ready': jira.transitionIDs['WIP to Ready']}
+	assert issue['status'] == 'WIP'
+	assert planner.move(issue['key'], 'Done') == 'Done'
@@ -0,0 +1,98 @@
+'''
+Purpose - Tests of the webhook receiver, fed with replayed Jira events.
+
+'''
+
+from urllib.error import HTTPError
+
+import pytest
+
+from webhooks import IssueCache, WebhookReceiver, replay_events, CREATED, UPDATED, DELETED, WEBHOOK_HOST
+
+TOKEN = 'some-secret'
+
+def issue(key, status='To Do', assignee='jdoe', label='adapter', project='10200'):
+	return {'key': key, 'id': key.split('-')[1], 'fields': {
+		'summary': 'Task ' + key,
+		'status': {'name': status},
+		'assignee': {'name': assignee},
+		'labels': [label],
+		'project': {'id': project, 'key': 'OPS'},
+	}}
+
+def event(name, raw):
+	return {'webhookEvent': name, 'issue': raw}
+
+@pytest.fixture
+def receiver():
+	receiver = WebhookReceiver(port=0, token=TOKEN)
+	receiver.start()
+	yield receiver
+	receiver.stop()
+
+@pytest.fixture
+def cache(receiver):
+	cache = IssueCache('10200', 'jdoe', 'adapter')
+	cache.prime([])
+	receiver.register(cache)
+	return cache
+
+def url(receiver, token=TOKEN):
+	return 'http://127.0.0.1:{0}{1}?token={2}'.format(receiver.port, receiver.path, token)
+
+def test_replayed_events_update_the_cache(receiver, cache):
+	replay_events(url(receiver), [
+		event(CREATED, issue('OPS-1')),
+		event(CREATED, issue('OPS-2')),
+		event(UPDATED, issue('OPS-1', status='In Progress')),
+		event(DELETED, issue('OPS-2')),
+	])
+	assert sorted(raw['key'] for raw in cache.issues.values()) == ['OPS-1']
+	assert cache.issues['OPS-1']['fields']['status']['name'] == 'In Progress'
+	assert receiver.events == 4
+
+def test_issues_leaving_the_board_drop_out(receiver, cache):
+	replay_events(url(receiver), [
+		event(CREATED, issue('OPS-1')),
+		event(CREATED, issue('OPS-2')),
+		event(CREATED, issue('OPS-3')),
+		event(UPDATED, issue('OPS-1', status='Archive')),
+		event(UPDATED, issue('OPS-2', assignee='someone')),
+		event(CREATED, issue('OPS-4', project='10300')),
+	])
+	assert list(cache.issues) == ['OPS-3']
+
+def test_events_during_priming_are_applied_on_top(receiver, cache):
+	cache.start_priming()
+	replay_events(url(receiver), [event(UPDATED, issue('OPS-1', status='Done'))])
+	cache.prime([])
+	assert cache.issues['OPS-1']['fields']['status']['name'] == 'Done'
+
+def test_wrong_token_is_refused(receiver, cache):
+	for token in ('wrong', ''):
+		with pytest.raises(HTTPError) as raised:
+			replay_events(url(receiver, token), [event(CREATED, issue('OPS-1'))])
+		assert raised.value.code == 403
+	assert len(cache) == 0
+	assert receiver.events == 0
+
+def test_unreadable_payload_is_refused(receiver, cache):
+	with pytest.raises(HTTPError) as raised:
+		replay_events(url(receiver), [{'webhookEvent': CREATED}])
+	assert raised.value.code == 400
+	assert len(cache) == 0
+
+def test_stopped_receiver_invalidates_its_caches(receiver, cache):
+	assert cache.fresh()
+	receiver.stop()
+	assert not cache.fresh()
+
+def test_listens_on_loopback_by_default():
+	assert WebhookReceiver().host == WEBHOOK_HOST == '127.0.0.1'
+	WebhookReceiver(host='localhost')
+
+@pytest.mark.parametrize('host', ['0.0.0.0', '192.168.1.20', 'jira-adapter.example.com'])
+def test_other_hosts_need_a_token(host):
+	with pytest.raises(ValueError):
+		WebhookReceiver(host=host)
+	assert WebhookReceiver(host=host, token=TOKEN).host == host
@@ -0,0 +1,269 @@
+'''
+Purpose - Local Jira webhook receiver keeping the issue cache of the boards fresh.
+
+A board's IssueCache is primed with the result of the index search. After
+that, Jira's webhook events for created, updated, transitioned and deleted
+issues are applied to it as they come in, so the following sync cycles take
+the board's issues from the cache instead of searching Jira again.
+
+The cache is only used while it can be trusted: the receiver has been running
+without a break since the cache was primed, and the priming is not older than
+the reconciliation interval. Otherwise the next cycle searches Jira and primes
+the cache again. Events arriving during a priming search are applied on top of
+its result.
+
+In Jira, register a webhook for the issue created, updated and deleted events
+pointing at http://<this machine>:<port>/jira-webhook?token=<token>.
+
+Events change what the adapter does in Jira and outlook, so the receiver only
+listens on the loopback interface by default. It refuses to listen on any
+other address without a token.
+
+replay_events posts recorded webhook payloads to a receiver, to test it
+without a Jira server.
+
+'''
+
+import hmac
+import ipaddress
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import urlparse, parse_qs
+from urllib.request import Request, urlopen
+
+# Default address of the receiver, reachable from this machine only
+WEBHOOK_HOST = '127.0.0.1'
+WEBHOOK_PORT = 8090
+WEBHOOK_PATH = '/jira-webhook'
+# The cache is primed again by a search after this long, in case an event was lost
+RECONCILE_INTERVAL = timedelta(hours=24)
+# Statuses of issues left out of the cache, like in the index search
+EXCLUDED_STATUSES = ('Closed', 'Archive')
+# Format of the times in Jira's issue fields
+JIRA_TIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f%z'
+
+CREATED = 'jira:issue_created'
+UPDATED = 'jira:issue_updated'
+DELETED = 'jira:issue_deleted'
+
+# Read-only stand-in for a jira Issue, built from the issue JSON of a search or an event
+class CachedIssue(object):
+	def __init__(self, raw):
+		self.raw = raw
+		self.key = raw['key']
+		self.id = raw.get('id')
+		self.fields = IssueFields(raw.get('fields') or {})
+
+	def __str__(self):
+		return self.key
+
+	def __repr__(self):
+		return '<Cached Issue: key={0!r}>'.format(self.key)
+
+class IssueFields(object):
+	def __init__(self, fields):
+		self.summary = fields.get('summary') or ''
+		status = fields.get('status') or {}
+		self.status = IssueStatus(status.get('name'))
+		self.labels = fields.get('labels') or []
+		self.resolutiondate = fields.get('resolutiondate')
+		self.updated = fields.get('updated')
+
+class IssueStatus(object):
+	def __init__(self, name):
+		self.name = name
+
+	def __str__(self):
+		return self.name or ''
+
+# This function gives the time of a Jira time field, or None
+def parse_jira_time(value):
+	if not value:
+		return None
+	return datetime.strptime(value, JIRA_TIME_FORMAT)
+
+# This class holds the open issues of one board, by key
+class IssueCache(object):
+	def __init__(self, project, assignee, label, reconcileInterval=RECONCILE_INTERVAL):
+		self.project = str(project)
+		self.assignee = assignee
+		self.label = label
+		self.reconcileInterval = reconcileInterval
+		self.issues = {}
+		self.primedAt = None
+		# Events received while a priming search runs, applied on top of its result
+		self.pending = None
+		self.lock = threading.Lock()
+
+	def __len__(self):
+		return len(self.issues)
+
+	# Returns True when the cache can be used instead of a search
+	def fresh(self):
+		with self.lock:
+			return self.primedAt is not None and datetime.now() - self.primedAt < self.reconcileInterval
+
+	def invalidate(self):
+		with self.lock:
+			self.primedAt = None
+			self.pending = None
+
+	def start_priming(self):
+		with self.lock:
+			self.pending = []
+
+	# Replaces the cached issues with the result of a search
+	def prime(self, issues):
+		with self.lock:
+			self.issues = dict((issue.key, issue.raw) for issue in issues if getattr(issue, 'raw', None))
+			for event, raw in self.pending or []:
+				self.apply(event, raw)
+			self.pending = None
+			self.primedAt = datetime.now()
+
+	def all_issues(self):
+		with self.lock:
+			return [CachedIssue(raw) for raw in self.issues.values()]
+
+	# Updates the status of an issue moved by the adapter itself, ahead of its webhook event
+	def set_status(self, key, status):
+		with self.lock:
+			raw = self.issues.get(key)
+			if raw is None:
+				return
+			if status in EXCLUDED_STATUSES:
+				del self.issues[key]
+			else:
+				raw['fields']['status'] = {'name': status}
+
+	# Applies one webhook event. Returns True when the event concerned the cache.
+	def on_event(self, event, raw):
+		with self.lock:
+			if self.pending is not None:
+				self.pending.append((event, raw))
+			return self.apply(event, raw)
+
+	def apply(self, event, raw):
+		key = raw.get('key')
+		if not key:
+			return False
+		if event == DELETED or not self.belongs(raw.get('fields') or {}):
+			return self.issues.pop(key, None) is not None
+		self.issues[key] = raw
+		return True
+
+	# Tells if an issue is part of the board's index search, that is project, assignee, label and status
+	def belongs(self, fields):
+		project = fields.get('project') or {}
+		if self.project not in (str(project.get('id')), str(project.get('key'))):
+			return False
+		assignee = fields.get('assignee') or {}
+		if self.assignee not in (assignee.get('name'), assignee.get('key'), assignee.get('accountId')):
+			return False
+		if self.label not in (fields.get('labels') or []):
+			return False
+		return (fields.get('status') or {}).get('name') not in EXCLUDED_STATUSES
+
+# This function tells if a host name or address only accepts connections from this machine
+def is_loopback(host):
+	if host == 'localhost':
+		return True
+	try:
+		return ipaddress.ip_address(host).is_loopback
+	except ValueError:
+		return False
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+	daemon_threads = True
+
+# This class accepts Jira webhook events over HTTP and hands them to the registered caches
+# Raises ValueError when asked to listen beyond the loopback interface without a token.
+class WebhookReceiver(object):
+	def __init__(self, host=WEBHOOK_HOST, port=WEBHOOK_PORT, token=None, path=WEBHOOK_PATH):
+		if not token and not is_loopback(host):
+			raise ValueError('The webhook receiver needs a token to listen on {0}.'.format(host))
+		self.host = host
+		self.port = port
+		self.token = token
+		self.path = path
+		self.caches = []
+		self.events = 0
+		self.server = None
+		self.thread = None
+		self.lock = threading.Lock()
+
+	@property
+	def running(self):
+		return self.server is not None
+
+	def register(self, cache):
+		with self.lock:
+			if cache not in self.caches:
+				self.caches.append(cache)
+
+	def unregister(self, cache):
+		with self.lock:
+			if cache in self.caches:
+				self.caches.remove(cache)
+
+	def start(self):
+		receiver = self
+		class Handler(BaseHTTPRequestHandler):
+			def do_POST(self):
+				status = receiver.handle(self.path, self.rfile.read(int(self.headers.get('Content-Length') or 0)))
+				self.send_response(status)
+				self.send_header('Content-Length', '0')
+				self.end_headers()
+
+			def log_message(self, format, *args):
+				pass
+		self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+		# Port 0 picks a free port
+		self.port = self.server.server_address[1]
+		self.thread = threading.Thread(target=self.server.serve_forever, name='WebhookReceiver', daemon=True)
+		self.thread.start()
+		logging.getLogger('JiraOutAdapter').info('Listening for Jira webhooks on port %s.', self.port)
+		return 'http://127.0.0.1:{0}{1}'.format(self.port, self.path)
+
+	# Stops the receiver. Events sent meanwhile are lost, so the caches can't be trusted any more.
+	def stop(self):
+		if self.server is not None:
+			self.server.shutdown()
+			self.server.server_close()
+			self.server = None
+		for cache in list(self.caches):
+			cache.invalidate()
+
+	# Handles one request and returns its HTTP status
+	def handle(self, path, body):
+		url = urlparse(path)
+		if url.path != self.path:
+			return 404
+		if self.token and not hmac.compare_digest(parse_qs(url.query).get('token', [''])[0].encode('utf-8'), self.token.encode('utf-8')):
+			return 403
+		try:
+			payload = json.loads(body.decode('utf-8'))
+			event, raw = payload['webhookEvent'], payload['issue']
+		except (ValueError, KeyError, TypeError) as ex:
+			logging.getLogger('JiraOutAdapter').warning('Unreadable Jira webhook - %s', ex)
+			return 400
+		with self.lock:
+			caches = list(self.caches)
+			self.events += 1
+		for cache in caches:
+			cache.on_event(event, raw)
+		return 204
+
+# This function posts recorded webhook payloads to a receiver, one JSON payload per line of a file or a list of dicts
+def replay_events(url, payloads):
+	if isinstance(payloads, str):
+		with open(payloads) as f:
+			payloads = [json.loads(line) for line in f if line.strip()]
+	for payload in payloads:
+		request = Request(url, data=json.dumps(payload).encode('utf-8'), headers={'Content-Type': 'application/json'})
+		urlopen(request).close()
+	return len(payloads)